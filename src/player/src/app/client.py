@@ -1,6 +1,8 @@
 import json
 import os
+import posixpath
 import urllib.error
+import urllib.parse
 import urllib.request
 
 import wget
@@ -16,6 +18,9 @@ TMP_STREAM_DIR = "/tmp/cosound"
 API_BASE_URL = (
     os.environ.get("COSOUND_API_URL", "http://localhost:8000/api").strip().rstrip("/")
 )
+# Fragment the server puts on manifest URLs it has already conditioned for
+# the requested rate (server: core.transcoding.CONDITIONED_FRAGMENT).
+CONDITIONED_FRAGMENT = "conditioned"
 
 
 def _api_get(path: str, api_key: str) -> dict:
@@ -27,9 +32,31 @@ def _api_get(path: str, api_key: str) -> dict:
         return json.loads(response.read().decode("utf-8"))
 
 
-def get_latest_manifest(api_key: str) -> dict:
-    """Fetch the player's sound library: {sound_id: remote_url}."""
-    return _api_get("/manifest", api_key)
+def get_latest_manifest(api_key: str, rate: int | None = None) -> dict:
+    """Fetch the player's sound library: {sound_id: remote_url}.
+
+    With ``rate``, sounds the server has conditioned for that sample rate
+    point at those files instead (see ``is_conditioned``).
+    """
+    query = f"?{urllib.parse.urlencode({'rate': rate})}" if rate else ""
+    return _api_get(f"/manifest{query}", api_key)
+
+
+def is_conditioned(remote_path: str) -> bool:
+    """True if the server already conditioned this manifest entry."""
+    return urllib.parse.urldefrag(remote_path).fragment == CONDITIONED_FRAGMENT
+
+
+def asset_name(sound_id, remote_path) -> str:
+    """Local file name for a manifest entry.
+
+    Server-conditioned files are named after the remote file too (which
+    names its rate), so they never reuse a cached upload or another rate's.
+    """
+    if not is_conditioned(remote_path):
+        return str(sound_id)
+    path = urllib.parse.urlsplit(remote_path).path
+    return f"{sound_id}-{posixpath.basename(path)}"
 
 
 def get_latest_cosound(api_key: str) -> dict:
@@ -68,8 +95,8 @@ def get_player_info(api_key: str) -> dict:
 def get_sound(sound_id, remote_path) -> str:
     # First check if sound_id exists locally:
     os.makedirs(ASSETS_DIR, exist_ok=True)
-    local_path = os.path.join(ASSETS_DIR, str(sound_id))
+    local_path = os.path.join(ASSETS_DIR, asset_name(sound_id, remote_path))
     # Otherwise download from remote url to local path
     if not os.path.exists(local_path):
-        wget.download(remote_path, local_path)
+        wget.download(urllib.parse.urldefrag(remote_path).url, local_path)
     return local_path
@@ -139,16 +139,27 @@ def condition_file(
 
 
 def condition_manifest(
-    manifest: dict, out_dir: str, target_fs: int, target_lufs: float = TARGET_LUFS
+    manifest: dict,
+    out_dir: str,
+    target_fs: int,
+    target_lufs: float = TARGET_LUFS,
+    preconditioned=(),
 ) -> dict:
     """Condition every local file in ``manifest`` ({id: path}); return {id: path}.
 
-    Files that fail to condition fall back to their original path so playback
-    still works.
+    Ids in ``preconditioned`` were conditioned for ``target_fs`` by the server
+    (``client.is_conditioned``) and keep their path: running these stages a
+    second time would shelve the highs twice, shorten the loop again and
+    renormalise. Files that fail to condition fall back to their original
+    path so playback still works.
     """
     out = {}
     for sound_id, src_path in manifest.items():
-        if not src_path or not os.path.exists(src_path):
+        if (
+            not src_path
+            or not os.path.exists(src_path)
+            or sound_id in preconditioned
+        ):
             out[sound_id] = src_path
             continue
         dest = os.path.join(out_dir, f"{sound_id}.wav")
@@ -3,8 +3,10 @@ import json
 import argparse
 from app.player import SoundDevicePlayer
 from app.client import (
+    asset_name,
     get_sound,
     get_latest_manifest,
+    is_conditioned,
 )
 from app.devices import detect_output
 from app.conditioning import condition_manifest
@@ -28,16 +30,21 @@ def list_output_devices() -> None:
 
 def setup(api_key: str, target_fs: int):
 
-    # Get Latest Manifest from Server (DUMMY)
-    manifest = get_latest_manifest(api_key)
+    # Get Latest Manifest from Server, conditioned for our rate where it can
+    manifest = get_latest_manifest(api_key, rate=target_fs)
+    preconditioned = {
+        sound_id for sound_id, remote_path in manifest.items()
+        if is_conditioned(remote_path)
+    }
 
     # Ensure the assets directory exists before reading from it
     os.makedirs(ASSETS_DIR, exist_ok=True)
 
     # Remove downloaded sounds not in Latest Manifest to save space (skip dirs)
+    keep = {asset_name(sound_id, path) for sound_id, path in manifest.items()}
     for sound in os.listdir(ASSETS_DIR):
         path = os.path.join(ASSETS_DIR, sound)
-        if os.path.isfile(path) and sound not in manifest.keys():
+        if os.path.isfile(path) and sound not in keep:
             os.remove(path)
 
     # Download and save all sounds in Latest Manfiest
@@ -48,8 +55,12 @@ def setup(api_key: str, target_fs: int):
 
     # Offline conditioning pass: decode/resample/loudness/loop-fix/de-harsh once
     # so even lossy sources play back cleanly. Manifest now points at the cache.
-    print(f"Conditioning {len(manifest)} sound(s) @ {target_fs} Hz…")
-    manifest = condition_manifest(manifest, CONDITIONED_DIR, target_fs)
+    # Files the server conditioned for this rate are played as they are.
+    pending = len(manifest) - len(preconditioned)
+    print(f"Conditioning {pending} sound(s) @ {target_fs} Hz…")
+    manifest = condition_manifest(
+        manifest, CONDITIONED_DIR, target_fs, preconditioned=preconditioned
+    )
 
     config = {"API_KEY": api_key, "MANIFEST": manifest}
 
@@ -1,43 +1,63 @@
+from asgiref.sync import sync_to_async
 from ninja import NinjaAPI
+from ninja.errors import Throttled
 from ninja.security import APIKeyHeader
 from ninja.throttling import AuthRateThrottle
 
 from core.models import Player, Sound
+from core.transcoding import CONDITIONED_FRAGMENT, PLAYER_RATES, flac_key
 
 api = NinjaAPI()
 
+API_RATE = "10/m"
+
 
 class PlayerTokenAuth(APIKeyHeader):
+    """The player owning the X-API-Key token, limited to API_RATE requests.
+
+    Async like the endpoints, so a player waiting on Postgres doesn't hold
+    a worker thread. The rate limit is applied here rather than with the
+    operations' `throttle=`, which django-ninja checks synchronously on the
+    event loop, where the database cache can't be queried.
+    """
+
     param_name = "X-API-Key"
 
-    def authenticate(self, request, key):
-        try:
-            return Player.objects.get(token=key)
-        except Player.DoesNotExist:
+    async def authenticate(self, request, key):
+        player = (
+            await Player.objects.select_related("manager").filter(token=key).afirst()
+        )
+        if player is None:
             return None
+        request.auth = player  # the throttle keys on it
+        throttle = AuthRateThrottle(API_RATE)  # per request: it keeps state
+        if not await sync_to_async(throttle.allow_request)(request):
+            raise Throttled(wait=throttle.wait())
+        return player
 
 
-@api.get(
-    "/manifest",
-    auth=PlayerTokenAuth(),
-    throttle=[AuthRateThrottle("10/m")],
-)
-def get_manifest(request) -> dict[str, str]:
-    """Return the player's sound library as {sound_id: remote_url}."""
+@api.get("/manifest", auth=PlayerTokenAuth())
+async def get_manifest(request, rate: int | None = None) -> dict[str, str]:
+    """Return the player's sound library as {sound_id: remote_url}.
+
+    With `rate`, sounds transcoded for a player at that sample rate point at
+    their conditioned FLAC (core.transcoding) instead of the upload, with
+    `#conditioned` on the URL so the player doesn't condition it again.
+    """
     player: Player = request.auth
-    return {
-        str(sound.pk): request.build_absolute_uri(sound.file.url)
-        for sound in player.sounds.all()
-        if sound.file
-    }
+    key = flac_key(rate) if rate in PLAYER_RATES else None
+    manifest = {}
+    async for sound in player.sounds.all():
+        if not sound.file:
+            continue
+        url = key and sound.audio_url(key)
+        url = f"{url}#{CONDITIONED_FRAGMENT}" if url else sound.file.url
+        manifest[str(sound.pk)] = request.build_absolute_uri(url)
+    return manifest
 
 
-@api.get(
-    "/cosound",
-    auth=PlayerTokenAuth(),
-    throttle=[AuthRateThrottle("10/m")],
-)
-def get_cosound(request) -> dict[str, float]:
+@api.get("/cosound", auth=PlayerTokenAuth())
+async def get_cosound(request) -> dict[str, float]:
     """Return the player's latest cosound as {sound_id: gain}."""
     player: Player = request.auth
     return {
@@ -46,15 +66,11 @@ def get_cosound(request) -> dict[str, float]:
     }
 
 
-@api.get(
-    "/player",
-    auth=PlayerTokenAuth(),
-    throttle=[AuthRateThrottle("10/m")],
-)
-def get_player(request) -> dict:
+@api.get("/player", auth=PlayerTokenAuth())
+async def get_player(request) -> dict:
     """Return player details and the currently playing cosound layers."""
     player: Player = request.auth
-    sounds = Sound.objects.in_bulk(
+    sounds = await Sound.objects.select_related("artist").ain_bulk(
         [layer.sound_id for layer in player.playing.layers]
     )
     return {
@@ -0,0 +1,103 @@
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.test import SimpleTestCase
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from core.models import Sound
+from core.testing import QueryBudgetTestCase
+
+
+class AppQueryBudgetTests(QueryBudgetTestCase):
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_home_page(self):
+        self.assertQueryBudget(2, "get", reverse("app:home_page"), htmx=False)
+
+    def test_home_initial(self):
+        self.assertQueryBudget(14, "get", reverse("app:home_initial"))
+
+    def test_home_tabs(self):
+        for name, budget in (("app:home_tab_mixer", 9), ("app:home_tab_about", 2)):
+            with self.subTest(name):
+                self.assertQueryBudget(budget, "get", reverse(name))
+
+    def test_artist_details(self):
+        self.assertQueryBudget(
+            8,
+            "get",
+            reverse("app:artist_details"),
+            {"sound_id": self.sounds[0].pk},
+        )
+
+
+class ApiQueryBudgetTests(QueryBudgetTestCase):
+    def get(self, budget, endpoint):
+        response = self.assertQueryBudget(
+            budget,
+            "get",
+            f"/api/{endpoint}",
+            htmx=False,
+            headers={"X-API-Key": self.player.token},
+        )
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_manifest(self):
+        self.assertEqual(len(self.get(10, "manifest").json()), self.LIBRARY)
+
+    def test_manifest_serves_the_variant_for_the_players_rate(self):
+        sound = self.player.sounds.order_by("pk").first()
+        files = {"flac-48000": "variants/sounds/a-flac-48000.flac"}
+        Sound.objects.filter(pk=sound.pk).update(
+            variants={"source": sound.file.name, "files": files}
+        )
+
+        urls = {
+            pk: urlsplit(url)
+            for pk, url in self.get(10, "manifest?rate=48000").json().items()
+        }
+        variant = urls.pop(str(sound.pk))
+        self.assertTrue(variant.path.endswith(files["flac-48000"]))
+        # Marked, so the player doesn't condition it a second time.
+        self.assertEqual(variant.fragment, "conditioned")
+        self.assertFalse(any("/variants/" in url.path for url in urls.values()))
+        self.assertFalse(any(url.fragment for url in urls.values()))
+
+        # No variant at a rate nothing was transcoded for.
+        url = urlsplit(self.get(10, "manifest?rate=22050").json()[str(sound.pk)])
+        self.assertTrue(url.path.endswith(sound.file.name))
+        self.assertEqual(url.fragment, "")
+
+    def test_cosound(self):
+        self.assertEqual(len(self.get(9, "cosound").json()), self.PLAYING_LAYERS)
+
+    def test_player(self):
+        self.assertEqual(
+            len(self.get(10, "player").json()["layers"]), self.PLAYING_LAYERS
+        )
+
+    async def test_async_clients(self):
+        headers = {"X-API-Key": self.player.token}
+        for endpoint in ("manifest", "cosound", "player"):
+            with self.subTest(endpoint):
+                response = await self.async_client.get(
+                    f"/api/{endpoint}", headers=headers
+                )
+                self.assertEqual(response.status_code, 200)
+
+    async def test_unknown_token(self):
+        response = await self.async_client.get(
+            "/api/cosound", headers={"X-API-Key": "not-a-token"}
+        )
+        self.assertEqual(response.status_code, 401)
+
+
+class AsyncMiddlewareTests(SimpleTestCase):
+    def test_every_middleware_can_run_async(self):
+        # One sync-only middleware puts every ASGI request on a thread.
+        for path in settings.MIDDLEWARE:
+            with self.subTest(path):
+                self.assertTrue(getattr(import_string(path), "async_capable", False))
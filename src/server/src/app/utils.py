@@ -1,6 +1,8 @@
 import hashlib
 
+from core.renditions import CARD_WIDTH, COVER_WIDTH, THUMBNAIL_WIDTH
 from core.utils import get_random_avatar_url
+from login.guests import has_account
 
 
 # Stable placeholder bios, picked deterministically from the artist's name so a
@@ -54,8 +56,9 @@ def build_artist_context(user, artist, fallback_name=""):
         seed = artist.pk
         bio = artist.bio.strip() if artist.bio else ""
         url = artist.url or ""
-        avatar_url = artist.avatar.url if artist.avatar else get_random_avatar_url(seed)
-        cover_url = artist.cover.url if artist.cover else ""
+        avatar_url = artist.image_url("avatar", THUMBNAIL_WIDTH)
+        avatar_url = avatar_url or get_random_avatar_url(seed)
+        cover_url = artist.image_url("cover", COVER_WIDTH)
         uploaded_count = artist.sounds.count()
     else:
         seed = int(_seed_hash(name)[:8], 16)
@@ -66,7 +69,7 @@ def build_artist_context(user, artist, fallback_name=""):
         uploaded_count = 0
 
     favourited_count = 0
-    if user and user.is_authenticated and artist is not None:
+    if has_account(user) and artist is not None:
         from core.models import Listener
 
         listener = Listener.objects.filter(user=user).first()
@@ -85,6 +88,13 @@ def build_artist_context(user, artist, fallback_name=""):
     }
 
 
+# Everything serialize_mix reads, for prefetch_related on a SoundMix query.
+MIX_PREFETCH = (
+    "cosound__soundlayer_set__sound__artist",
+    "cosound__soundlayer_set__sound__tags",
+)
+
+
 def serialize_mix(sm):
     layers = []
     for sl in sm.cosound.soundlayer_set.all():
@@ -92,12 +102,15 @@ def serialize_mix(sm):
         layers.append(
             {
                 **sl.sound.asLayer(with_gain=gain),
-                "artwork_url": sl.sound.art.url if sl.sound.art else "",
+                "artwork_url": sl.sound.image_url("art", CARD_WIDTH),
+                "artwork_avif_url": sl.sound.image_url(
+                    "art", CARD_WIDTH, "avif", False
+                ),
                 "mute": False,
                 "isolated": False,
                 "saved": True,
                 "flavor": sl.sound.flavor or "",
-                "tags": " / ".join(sl.sound.tags.names()) or "Unknown",
+                "tags": " / ".join(sl.sound.tag_names) or "Unknown",
                 "gain": int(round(gain * 100)),
             }
         )
@@ -113,12 +126,12 @@ def serialize_mix(sm):
 def serialize_user_mixes(user):
     from mixer.models import SoundMix
 
-    if not user or not user.is_authenticated:
+    if not has_account(user):
         return []
     mixes = (
         SoundMix.objects.filter(creator=user)
         .select_related("cosound")
-        .prefetch_related("cosound__soundlayer_set__sound__tags")
+        .prefetch_related(*MIX_PREFETCH)
         .order_by("-created_at")
     )
     return [serialize_mix(sm) for sm in mixes]
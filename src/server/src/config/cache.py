@@ -0,0 +1,164 @@
+"""Two-tier cache: a per-process LRU in front of the database cache.
+
+Each worker keeps up to LOCAL_MAX_ENTRIES recently used values in memory for
+at most LOCAL_TIMEOUT seconds and reads and writes through to the shared
+django_cache table, so a hot key costs a query once per LOCAL_TIMEOUT per
+worker instead of on every read. A value another worker writes or deletes is
+seen here once the local copy ages out; a copy can likewise outlive its
+database row by up to LOCAL_TIMEOUT.
+
+Keys that every worker must read the same way on every request (rate-limit
+histories, the vote throttle, metrics snapshots, upload offsets) start with
+one of SHARED_KEY_PREFIXES and never enter the local tier. That includes
+any key updated in place, with incr or by rewriting it: a worker holding a
+local copy would carry on from a stale value.
+
+The local tier is versioned by a generation token kept in the table, always
+under the backend's own VERSION. clear() replaces it, and every read that
+reaches the database fetches it too (in the same query, for keys of that
+version), so other workers drop their local entries on their next database
+read instead of serving cleared values for up to LOCAL_TIMEOUT.
+"""
+
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.db import DatabaseCache
+
+from config.timing import TimedDatabaseCache, count_cache_reads
+
+GENERATION_KEY = "cache:generation"
+
+
+class TieredDatabaseCache(TimedDatabaseCache):
+    """TimedDatabaseCache with an in-process LRU tier in front of it."""
+
+    def __init__(self, table, params):
+        super().__init__(table, params)
+        options = params.get("OPTIONS", {})
+        self.local_max_entries = options.get("LOCAL_MAX_ENTRIES", 1000)
+        self.local_timeout = options.get("LOCAL_TIMEOUT", 10)
+        self.shared_prefixes = tuple(options.get("SHARED_KEY_PREFIXES", ()))
+        # made key -> (expiry as a Unix time, pickled value). Pickled, as in
+        # LocMemCache, so callers can't mutate what the next reader gets.
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+
+    def _local_key(self, key, version):
+        if key.startswith(self.shared_prefixes):
+            return None
+        return self.make_key(key, version=version)
+
+    def _remember(self, key, value, version, expires):
+        """Hold `value` locally until `expires`; call with the lock held."""
+        local_key = self._local_key(key, version)
+        if local_key is None:
+            return
+        if expires <= time.time():
+            self._local.pop(local_key, None)
+            return
+        self._local[local_key] = (expires, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        self._local.move_to_end(local_key)
+        while len(self._local) > self.local_max_entries:
+            self._local.popitem(last=False)
+
+    def _store(self, key, value, timeout, version):
+        expires = time.time() + self.local_timeout
+        backend_expires = self.get_backend_timeout(timeout)
+        if backend_expires is not None:
+            expires = min(expires, backend_expires)
+        with self._lock:
+            self._remember(key, value, version, expires)
+
+    def _forget(self, key, version):
+        with self._lock:
+            self._local.pop(self.make_key(key, version=version), None)
+
+    def get_many(self, keys, version=None):
+        found, remote = {}, []
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                local_key = self._local_key(key, version)
+                entry = self._local.get(local_key)
+                if entry is not None and entry[0] > now:
+                    self._local.move_to_end(local_key)
+                    found[key] = pickle.loads(entry[1])
+                else:
+                    remote.append(key)
+        count_cache_reads(hits=len(found), misses=0)
+        if not remote:
+            return found
+
+        # Bypasses TimedDatabaseCache so the generation isn't counted as a read.
+        if version is None or version == self.version:
+            fetched = DatabaseCache.get_many(self, [*remote, GENERATION_KEY])
+            generation = fetched.pop(GENERATION_KEY, None)
+        else:
+            fetched = DatabaseCache.get_many(self, remote, version=version)
+            generation = DatabaseCache.get_many(
+                self, [GENERATION_KEY], version=self.version
+            ).get(GENERATION_KEY)
+        count_cache_reads(hits=len(fetched), misses=len(remote) - len(fetched))
+        expires = time.time() + self.local_timeout
+        with self._lock:
+            if generation != self._generation:
+                self._local.clear()
+                self._generation = generation
+            for key, value in fetched.items():
+                self._remember(key, value, version, expires)
+        found.update(fetched)
+        return found
+
+    def has_key(self, key, version=None):
+        local_key = self._local_key(key, version)
+        with self._lock:
+            entry = self._local.get(local_key)
+            if entry is not None and entry[0] > time.time():
+                return True
+        return super().has_key(key, version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        super().set(key, value, timeout, version)
+        self._store(key, value, timeout, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = super().add(key, value, timeout, version)
+        if added:
+            self._store(key, value, timeout, version)
+        else:
+            # Someone else's value is in the table; read it next time.
+            self._forget(key, version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._forget(key, version)
+        return super().touch(key, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        # Read-modify-write: start from the table's value, not a local copy.
+        self._forget(key, version)
+        return super().incr(key, delta, version)
+
+    def delete(self, key, version=None):
+        self._forget(key, version)
+        return super().delete(key, version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        for key in keys:
+            self._forget(key, version)
+        return super().delete_many(keys, version)
+
+    def clear(self):
+        super().clear()
+        generation = uuid.uuid4().hex
+        DatabaseCache.set(self, GENERATION_KEY, generation, None, version=self.version)
+        with self._lock:
+            self._local.clear()
+            self._generation = generation
@@ -0,0 +1,213 @@
+"""A small metrics registry with Prometheus text exposition.
+
+No client library and no external service: each process (web worker,
+`refresh` scheduler, `db_worker`) records counters, gauges and histograms
+into its own `registry`. At most every FLUSH_INTERVAL seconds, on the next
+thing it records, a process writes its snapshot to the shared cache; the
+/metrics/ endpoint (core.metrics) merges the snapshots of every process seen
+within PROCESS_TTL.
+
+A restarted process starts its counters from zero while its predecessor's
+snapshot ages out, so merged counters can step; rate() treats that as a
+reset, as it would for any restarted exporter.
+"""
+
+import math
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+
+from django.core.cache import cache
+
+FLUSH_INTERVAL = 10
+# A process that hasn't flushed for this long is considered gone. Long, so
+# an idle web worker's counters don't drop out of the totals.
+PROCESS_TTL = 24 * 60 * 60
+PROCESSES_KEY = "metrics:processes"
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+# name -> (type, help). Everything recorded or collected is declared here.
+METRICS = {
+    "cosound_api_request_seconds": (
+        "histogram",
+        "Player API request latency by endpoint.",
+    ),
+    "cosound_api_throttled_total": (
+        "counter",
+        "Player API requests rejected by the rate limit.",
+    ),
+    "cosound_vote_throttled_total": (
+        "counter",
+        "Votes turned away by the per-listener vote throttle.",
+    ),
+    "cosound_task_seconds": (
+        "histogram",
+        "Task run time on the worker; for predictor tasks, prediction duration.",
+    ),
+    "cosound_task_lag_seconds": (
+        "histogram",
+        "Time from enqueue to completion, by task.",
+    ),
+    "cosound_tasks_total": ("counter", "Tasks finished, by task and status."),
+    "cosound_task_queue_depth": ("gauge", "Tasks ready to run, by task."),
+    "cosound_task_oldest_ready_age_seconds": (
+        "gauge",
+        "Age of the oldest task waiting to run.",
+    ),
+    "cosound_scheduler_ticks_total": ("counter", "Refresh scheduler passes."),
+    "cosound_scheduler_enqueued_total": (
+        "counter",
+        "Predictions the refresh scheduler queued.",
+    ),
+    "cosound_scheduler_errors_total": (
+        "counter",
+        "Predictions the refresh scheduler failed to queue.",
+    ),
+    "cosound_scheduler_last_tick_timestamp_seconds": (
+        "gauge",
+        "Unix time of the scheduler's latest pass, by shard.",
+    ),
+    "cosound_player_update_age_seconds": (
+        "gauge",
+        "Seconds since each player's prediction was last written.",
+    ),
+    "cosound_votes_per_second": (
+        "gauge",
+        "Votes inserted per second over the trailing window.",
+    ),
+}
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.gauges = {}
+        # key -> [count per bucket (non-cumulative, +Inf last), sum]
+        self.histograms = {}
+        self._flushed_at = 0.0
+
+    def inc(self, name, amount=1, **labels):
+        with self._lock:
+            self.counters[_key(name, labels)] += amount
+        self.maybe_flush()
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self.gauges[_key(name, labels)] = value
+        self.maybe_flush()
+
+    def observe(self, name, value, **labels):
+        index = next((i for i, le in enumerate(BUCKETS) if value <= le), len(BUCKETS))
+        with self._lock:
+            histogram = self.histograms.setdefault(
+                _key(name, labels), [[0] * (len(BUCKETS) + 1), 0.0]
+            )
+            histogram[0][index] += 1
+            histogram[1] += value
+        self.maybe_flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": [[n, dict(l), v] for (n, l), v in self.counters.items()],
+                "gauges": [[n, dict(l), v] for (n, l), v in self.gauges.items()],
+                "histograms": [
+                    [n, dict(l), list(buckets), total]
+                    for (n, l), (buckets, total) in self.histograms.items()
+                ],
+            }
+
+    def flush(self):
+        """Publish this process's snapshot to the shared cache."""
+        key = f"metrics:process:{socket.gethostname()}:{os.getpid()}"
+        cache.set(key, self.snapshot(), PROCESS_TTL)
+        # Read-modify-write: a concurrent flush can drop another process's
+        # entry, which it re-adds on its next flush.
+        now = time.time()
+        processes = {
+            k: seen
+            for k, seen in (cache.get(PROCESSES_KEY) or {}).items()
+            if now - seen < PROCESS_TTL
+        }
+        processes[key] = now
+        cache.set(PROCESSES_KEY, processes, None)
+
+    def maybe_flush(self):
+        now = time.monotonic()
+        if now - self._flushed_at < FLUSH_INTERVAL:
+            return
+        self._flushed_at = now
+        try:
+            self.flush()
+        except Exception:
+            # Metrics must never fail the request or task that recorded them.
+            pass
+
+
+registry = Registry()
+
+
+def merged_snapshot():
+    """Every live process's snapshot, merged: counters and histograms summed."""
+    processes = cache.get(PROCESSES_KEY) or {}
+    merged = Registry()
+    for snapshot in cache.get_many(list(processes)).values():
+        for name, labels, value in snapshot["counters"]:
+            merged.counters[_key(name, labels)] += value
+        for name, labels, value in snapshot["gauges"]:
+            merged.gauges[_key(name, labels)] = value
+        for name, labels, buckets, total in snapshot["histograms"]:
+            histogram = merged.histograms.setdefault(
+                _key(name, labels), [[0] * (len(BUCKETS) + 1), 0.0]
+            )
+            histogram[0] = [a + b for a, b in zip(histogram[0], buckets)]
+            histogram[1] += total
+    return merged.snapshot()
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels, **extra):
+    labels = {**labels, **extra}
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+def _number(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshot):
+    """Prometheus text exposition (version 0.0.4) for a snapshot."""
+    series = defaultdict(list)
+    for name, labels, value in snapshot["counters"] + snapshot["gauges"]:
+        series[name].append(f"{name}{_labels(labels)} {_number(value)}")
+    for name, labels, buckets, total in snapshot["histograms"]:
+        cumulative = 0
+        for le, count in zip([*BUCKETS, math.inf], buckets):
+            cumulative += count
+            le = "+Inf" if math.isinf(le) else repr(float(le))
+            series[name].append(f"{name}_bucket{_labels(labels, le=le)} {cumulative}")
+        series[name].append(f"{name}_sum{_labels(labels)} {_number(float(total))}")
+        series[name].append(f"{name}_count{_labels(labels)} {cumulative}")
+
+    lines = []
+    for name in sorted(series):
+        kind, help_text = METRICS.get(name, ("untyped", ""))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(series[name])
+    return "\n".join(lines) + "\n"
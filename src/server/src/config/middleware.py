@@ -1,11 +1,35 @@
-"""Host-based URLconf switching.
+"""Host-based URLconf switching and per-request timing.
 
-Lets a subdomain serve a different URL tree at its root without affecting any
-other host. Map a Host prefix to a urlconf module below; every other host —
-including ``localhost`` under ``make server`` — keeps the default
-``config.urls``, so local dev and the apex/www site stay unchanged.
+SubdomainURLConf lets a subdomain serve a different URL tree at its root
+without affecting any other host. Map a Host prefix to a urlconf module below;
+every other host — including ``localhost`` under ``make server`` — keeps the
+default ``config.urls``, so local dev and the apex/www site stay unchanged.
+
+RequestTiming measures where each request's time goes (see config.timing).
+
+All three run sync or async, whichever the chain around them is. Under ASGI
+a single sync-only middleware would have Django give every request a worker
+thread for its whole lifetime, and the async player API would gain nothing.
 """
 
+import json
+import logging
+import random
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from config.metrics import registry
+from config.timing import RequestMetrics, current_metrics, record_query
+
+logger = logging.getLogger(__name__)
+
+# Queries listed in a slow request's log line, in execution order.
+SLOW_QUERY_DUMP_LIMIT = 100
+
 # Host prefix -> URLconf that mounts that app at the subdomain root.
 SUBDOMAIN_URLCONFS = {
     "admin.": "config.urls_admin",    # admin.*  -> Django admin at /
@@ -14,7 +38,53 @@ SUBDOMAIN_URLCONFS = {
 }
 
 
-class SubdomainURLConf:
+class SyncAndAsyncMiddleware:
+    """Base for middleware that runs in whichever mode its chain does.
+
+    Subclasses implement ``__call__`` for sync and ``__acall__`` for async.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+
+class StaticFiles(WhiteNoiseMiddleware):
+    """WhiteNoiseMiddleware, also able to run async.
+
+    WhiteNoise 6 is sync-only. Async, the file lookup (a dict lookup unless
+    autorefreshing) stays on the event loop and only serving a hit goes to a
+    thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class SubdomainURLConf(SyncAndAsyncMiddleware):
     """Swap ``request.urlconf`` based on the request Host.
 
     Runs before CommonMiddleware so the urlconf is set before URL resolution
@@ -22,13 +92,118 @@ class SubdomainURLConf:
     ROOT_URLCONF.
     """
 
-    def __init__(self, get_response):
-        self.get_response = get_response
-
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self.set_urlconf(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self.set_urlconf(request)
+        return await self.get_response(request)
+
+    @staticmethod
+    def set_urlconf(request):
         host = request.get_host().split(":")[0].lower()
         for prefix, urlconf in SUBDOMAIN_URLCONFS.items():
             if host.startswith(prefix):
                 request.urlconf = urlconf
                 break
-        return self.get_response(request)
+
+
+class RequestTiming(SyncAndAsyncMiddleware):
+    """Wall, DB, cache and template time per request.
+
+    Adds a ``Server-Timing`` header (shown in the browser's network panel)
+    in DEBUG and for staff users. Logs one JSON line for a sample of
+    requests (REQUEST_TIMING_SAMPLE_RATE), and at WARNING, with the queries
+    it ran, for every request slower than REQUEST_TIMING_SLOW_MS.
+
+    First in MIDDLEWARE, so the other middleware's time is included.
+    """
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            with ExitStack() as stack:
+                self.wrap_connections(stack)
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        # The async ORM queries from the request's thread-sensitive sync
+        # thread, on that thread's connections, so wrap those; finish() logs,
+        # may flush metrics and may load request.user, so it runs there too.
+        stack = ExitStack()
+        await sync_to_async(self.wrap_connections)(stack)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            current_metrics.reset(token)
+        return await sync_to_async(self.finish)(request, response, metrics)
+
+    @staticmethod
+    def wrap_connections(stack):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(record_query))
+
+    def finish(self, request, response, metrics):
+        elapsed_ms = metrics.elapsed * 1000
+        match = request.resolver_match
+        if match is not None and match.app_name == "ninja":
+            registry.observe(
+                "cosound_api_request_seconds", elapsed_ms / 1000, endpoint=match.url_name
+            )
+            if response.status_code == 429:
+                registry.inc("cosound_api_throttled_total", endpoint=match.url_name)
+        user = getattr(request, "user", None)
+        if settings.DEBUG or getattr(user, "is_staff", False):
+            response["Server-Timing"] = self.server_timing(metrics, elapsed_ms)
+
+        slow = elapsed_ms >= settings.REQUEST_TIMING_SLOW_MS
+        if slow or random.random() < settings.REQUEST_TIMING_SAMPLE_RATE:
+            self.log(request, response, metrics, elapsed_ms, slow)
+        return response
+
+    @staticmethod
+    def server_timing(metrics, elapsed_ms):
+        queries = f"{len(metrics.queries)} queries"
+        cache = f"{metrics.cache_hits} hits {metrics.cache_misses} misses"
+        return ", ".join(
+            [
+                f"total;dur={elapsed_ms:.1f}",
+                f'db;dur={metrics.db_seconds * 1000:.1f};desc="{queries}"',
+                f"tpl;dur={metrics.template_seconds * 1000:.1f}",
+                f'cache;desc="{cache}"',
+            ]
+        )
+
+    @staticmethod
+    def log(request, response, metrics, elapsed_ms, slow):
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "ms": round(elapsed_ms, 1),
+            "db_ms": round(metrics.db_seconds * 1000, 1),
+            "queries": len(metrics.queries),
+            "cache_hits": metrics.cache_hits,
+            "cache_misses": metrics.cache_misses,
+            "template_ms": round(metrics.template_seconds * 1000, 1),
+        }
+        if slow:
+            record["slow_queries"] = [
+                {"ms": round(seconds * 1000, 2), "sql": sql}
+                for sql, seconds in metrics.queries[:SLOW_QUERY_DUMP_LIMIT]
+            ]
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
@@ -142,8 +142,22 @@ LOGGING = {
             "level": "INFO",
             "propagate": False,
         },
+        "config.middleware": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
     },
 }
+
+# config.middleware.RequestTiming: log this fraction of requests (0–1), and
+# every request slower than REQUEST_TIMING_SLOW_MS along with its queries.
+REQUEST_TIMING_SAMPLE_RATE = float(os.environ.get("REQUEST_TIMING_SAMPLE_RATE", "0"))
+REQUEST_TIMING_SLOW_MS = float(os.environ.get("REQUEST_TIMING_SLOW_MS", "1000"))
+
+# /metrics/ answers local scrapes; set this to also allow
+# "Authorization: Bearer <token>" from elsewhere.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
 INSTALLED_APPS = [
     "import_export",
     "unfold",
@@ -180,8 +194,11 @@ INSTALLED_APPS = [
     "allauth.account",
 ]
 MIDDLEWARE = [
+    # Per-request wall/DB/cache/template timing; first so it covers the rest.
+    "config.middleware.RequestTiming",
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    # WhiteNoise, able to run async (see config.middleware).
+    "config.middleware.StaticFiles",
     # Host-based URLconf switch (admin/api subdomains -> app at root). Must
     # precede CommonMiddleware so request.urlconf is set before URL resolution.
     "config.middleware.SubdomainURLConf",
@@ -189,6 +206,8 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    # request.user for guests who haven't needed an account yet.
+    "login.guests.GuestMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "django_htmx.middleware.HtmxMiddleware",
@@ -197,7 +216,8 @@ MIDDLEWARE = [
 ROOT_URLCONF = "config.urls"
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates, timing renders for config.middleware.RequestTiming.
+        "BACKEND": "config.timing.TimedDjangoTemplates",
         "DIRS": [],
         "APP_DIRS": False,
         "OPTIONS": {
@@ -303,7 +323,6 @@ AUTHENTICATION_BACKENDS = [
     "django.contrib.auth.backends.ModelBackend",
     "allauth.account.auth_backends.AuthenticationBackend",
 ]
-EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 
 ANYMAIL = {
     "AMAZON_SES_CLIENT_PARAMS": {
@@ -313,7 +332,16 @@ ANYMAIL = {
     },
 }
 
-EMAIL_BACKEND = "anymail.backends.amazon_ses.EmailBackend"
+# Login codes go out through core.tasks.send_auth_email_task, so in
+# development they print in the db_worker's output. EMAIL_BACKEND overrides.
+EMAIL_BACKEND = os.environ.get(
+    "EMAIL_BACKEND",
+    (
+        "django.core.mail.backends.console.EmailBackend"
+        if DEBUG
+        else "anymail.backends.amazon_ses.EmailBackend"
+    ),
+)
 DEFAULT_FROM_EMAIL = "auth@cosound.ca"
 
 # Database configuration
@@ -332,8 +360,27 @@ DATABASES = {
 # See: https://github.com/mbraak/django-file-form/issues/574
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        # DatabaseCache behind a per-process LRU, counting hits/misses for
+        # config.middleware.RequestTiming.
+        "BACKEND": "config.cache.TieredDatabaseCache",
         "LOCATION": "django_cache",
+        "OPTIONS": {
+            "LOCAL_MAX_ENTRIES": 1000,
+            "LOCAL_TIMEOUT": 10,
+            # Read from the table every time, so every worker agrees: API and
+            # allauth rate limits, the vote throttle, the metrics snapshots,
+            # the refresh scheduler's job leases and django-file-form's
+            # chunked-upload state (its offset is advanced with incr by
+            # whichever worker gets each chunk).
+            "SHARED_KEY_PREFIXES": [
+                "throttle_",
+                "allauth:rl:",
+                "vote:",
+                "metrics:",
+                "refresh:",
+                "tus-uploads/",
+            ],
+        },
     }
 }
 
@@ -348,6 +395,12 @@ IMPORT_EXPORT_TMP_STORAGE_CLASS = "import_export.tmp_storages.CacheStorage"
 # Vote app
 # Seconds a listener must wait between consecutive votes.
 VOTE_THROTTLE_SECONDS = int(os.environ.get("VOTE_THROTTLE_SECONDS", 60))
+# Days raw votes stay in the Vote table before `archive_votes` moves them to
+# gzipped files in storage (their counts live on in the vote rollups).
+VOTE_RETENTION_DAYS = int(os.environ.get("VOTE_RETENTION_DAYS", 90))
+
+# Anonymous accounts unused for this long are removed by `prune_anonymous`.
+GUEST_RETENTION_DAYS = int(os.environ.get("GUEST_RETENTION_DAYS", 30))
 
 UNFOLD = {
     "SITE_TITLE": "Management Panel",
@@ -388,6 +441,11 @@ UNFOLD = {
                         "icon": "library_music",
                         "link": reverse_lazy("admin:core_sound_changelist"),
                     },
+                    {
+                        "title": _("Sound imports"),
+                        "icon": "upload_file",
+                        "link": reverse_lazy("admin:core_soundimport_changelist"),
+                    },
                     {
                         "title": _("Listeners"),
                         "icon": "ear_sound",
@@ -400,3 +458,10 @@ UNFOLD = {
 }
 
 # COSOUND_CORE_PREDICTOR = "app.predict.predictor_v1"
+# Matrix scoring over the whole room and library, downvotes included:
+# COSOUND_CORE_PREDICTOR = "core.predict.scoring_predictor"
+# Audio-feature embeddings (needs librosa on the task worker: `uv sync --extra
+# classifier`):
+# COSOUND_SOUND_CLASSIFIER = "core.classify.audio_feature_classifier"
+# COSOUND_SOUND_BATCH_CLASSIFIER = "core.classify.audio_feature_batch_classifier"
+# COSOUND_SOUND_MODEL = BASE_DIR / "model_linear_ridge.npz"
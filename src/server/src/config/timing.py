@@ -0,0 +1,107 @@
+"""Per-request performance counters.
+
+RequestTiming (config.middleware) opens a RequestMetrics for each request
+and makes it current; the pieces below add to whichever one is current:
+
+- the DB execute wrapper times every query, on every connection
+- TimedDatabaseCache (and config.cache.TieredDatabaseCache) count cache
+  hits and misses
+- TimedDjangoTemplates times top-level template renders (includes and
+  partials render inside them and are not counted twice)
+
+Outside a request (tasks, management commands) there is no current metrics
+object and all of them cost one ContextVar lookup.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from django.core.cache.backends.db import DatabaseCache
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+current_metrics: ContextVar["RequestMetrics | None"] = ContextVar(
+    "current_metrics", default=None
+)
+
+
+@dataclass
+class RequestMetrics:
+    started: float = field(default_factory=time.perf_counter)
+    queries: list[tuple[str, float]] = field(default_factory=list)
+    db_seconds: float = 0.0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    template_seconds: float = 0.0
+    _template_depth: int = 0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @contextmanager
+    def rendering(self):
+        self._template_depth += 1
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._template_depth -= 1
+            if not self._template_depth:
+                self.template_seconds += time.perf_counter() - began
+
+
+def record_query(execute, sql, params, many, context):
+    """connection.execute_wrapper that adds each query to the current metrics."""
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    began = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - began
+        metrics.queries.append((sql, seconds))
+        metrics.db_seconds += seconds
+
+
+def count_cache_reads(hits, misses):
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+class TimedDatabaseCache(DatabaseCache):
+    """DatabaseCache that counts hits and misses into the current request."""
+
+    # DatabaseCache.get is get_many of one key, so this sees every read.
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = super().get_many(keys, version=version)
+        count_cache_reads(hits=len(found), misses=len(keys) - len(found))
+        return found
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return super().render(context, request)
+        with metrics.rendering():
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render time counted per request."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
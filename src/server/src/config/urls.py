@@ -12,5 +12,6 @@ urlpatterns = [
     path("vote/", include("vote.urls")),
     path("studio/", include("studio.urls")),
     path("admin/", admin.site.urls, name="admin"),
+    path("metrics/", include("core.urls")),
     path("upload/", include("django_file_form.urls")),
 ]
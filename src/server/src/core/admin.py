@@ -1,3 +1,4 @@
+import copy
 import secrets
 
 from import_export.admin import ImportExportModelAdmin
@@ -7,9 +8,19 @@ import json
 from django.contrib import admin, messages
 from django.apps import apps as django_apps
 from django.core.exceptions import PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
+from django.core.paginator import Paginator
 from django.db import transaction
-from django.http import HttpResponseNotAllowed, HttpResponseRedirect
+from django.http import (
+    HttpRequest,
+    HttpResponseNotAllowed,
+    HttpResponseRedirect,
+    QueryDict,
+    StreamingHttpResponse,
+)
 from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.html import escape
 from django.utils.safestring import mark_safe
 from django.template.loader import render_to_string
 from django_file_form.model_admin import FileFormAdmin
@@ -20,8 +31,88 @@ from unfold.contrib.filters.admin import FieldTextFilter
 from unfold.forms import AdminPasswordChangeForm, UserChangeForm, UserCreationForm
 from taggit.models import Tag
 
-from core.models import Manager, User, Sound, Player, Listener, Cosound, Artist, Set
+from core.models import (
+    Artist,
+    Cosound,
+    Listener,
+    Manager,
+    Player,
+    Set,
+    Sound,
+    SoundImport,
+    User,
+)
 from core.forms import SoundForm
+from core.exporting import FORMATS, aexport_lines, export_lines
+from core.tasks import export_sounds, import_sounds
+
+
+# Rows per page in the relationship panels on change pages.
+PANEL_PAGE_SIZE = 25
+
+
+def paginated_panel(request, queryset, param, render_row, empty_label):
+    """Render one page of `queryset` as an admin panel list.
+
+    The page comes from `?<param>=<n>` on the change page, so each panel
+    costs a COUNT and a LIMIT/OFFSET query however large the related set
+    is. `render_row` turns one object into an <li>.
+    """
+    page = Paginator(queryset, PANEL_PAGE_SIZE).get_page(
+        request.GET.get(param) if request else None
+    )
+    if not page.paginator.count:
+        return mark_safe(
+            '<div class="text-sm text-font-subtle-light dark:text-font-subtle-dark">'
+            f"{empty_label}"
+            "</div>"
+        )
+    html = (
+        '<ul class="rounded-default border border-base-200 dark:border-base-800 px-4 bg-white dark:bg-base-900 list-none m-0">'
+        + "".join(render_row(obj) for obj in page)
+        + "</ul>"
+    )
+    if page.paginator.num_pages > 1:
+        links = []
+        for label, number, enabled in (
+            ("&lsaquo; Previous", page.number - 1, page.has_previous()),
+            ("Next &rsaquo;", page.number + 1, page.has_next()),
+        ):
+            if not enabled:
+                links.append(f'<span class="opacity-50">{label}</span>')
+                continue
+            query = request.GET.copy()
+            query[param] = number
+            links.append(
+                f'<a href="?{query.urlencode()}" class="font-medium hover:underline">{label}</a>'
+            )
+        html += (
+            '<div class="flex items-center gap-4 mt-2 text-xs text-font-subtle-light dark:text-font-subtle-dark">'
+            f"<span>Page {page.number} of {page.paginator.num_pages} &middot; {page.paginator.count} total</span>"
+            + "".join(links)
+            + "</div>"
+        )
+    return mark_safe(html)
+
+
+class RequestBoundAdmin:
+    """Render each change form on a copy of the admin bound to its request.
+
+    A ModelAdmin is shared by every request, so display methods that need the
+    request (panel paging, absolute URLs) read `self.request` from this
+    per-request copy rather than from state left on the shared instance.
+    """
+
+    request = None
+
+    def changeform_view(
+        self, request, object_id=None, form_url="", extra_context=None
+    ):
+        bound = copy.copy(self)
+        bound.request = request
+        return super(RequestBoundAdmin, bound).changeform_view(
+            request, object_id, form_url, extra_context
+        )
 
 
 class ListenerInline(StackedInline):
@@ -174,7 +265,11 @@ class SoundAdmin(FileFormAdmin, ModelAdmin, ImportExportModelAdmin):  # type: ig
     import_form_class = ImportForm
     export_form_class = ExportForm
 
-    list_display = ["title", "artist", "created_at", "updated_at"]
+    list_display = ["title", "artist", "embedding_status", "created_at", "updated_at"]
+    list_filter = ["embedding_status"]
+    list_select_related = ["artist"]
+    search_fields = ["title", "artist__name"]
+    actions = ["stream_csv_export", "stream_jsonl_export", "background_csv_export"]
     compressed_fields = True
     fieldsets = [
         (
@@ -200,12 +295,113 @@ class SoundAdmin(FileFormAdmin, ModelAdmin, ImportExportModelAdmin):  # type: ig
         ),
     ]
 
+    def changelist_sounds(self, user, query):
+        """The changelist's sounds for `query` (its query string) as `user` sees it.
+
+        Rebuilds a "select all" selection off the request, for export_sounds.
+        """
+        request = HttpRequest()
+        request.method = "GET"
+        request.GET = QueryDict(query)
+        request.user = user
+        return self.get_changelist_instance(request).get_queryset(request)
+
+    def _stream_export(self, request, queryset, fmt):
+        # ASGI reads a sync iterator to the end before sending a byte of it.
+        lines = aexport_lines if isinstance(request, ASGIRequest) else export_lines
+        response = StreamingHttpResponse(lines(fmt, queryset), content_type=FORMATS[fmt])
+        response["Content-Disposition"] = (
+            f'attachment; filename="sounds-{timezone.now():%Y%m%d-%H%M%S}.{fmt}"'
+        )
+        return response
+
+    @admin.action(description="Export selected sounds (CSV, streamed)")
+    def stream_csv_export(self, request, queryset):
+        return self._stream_export(request, queryset, "csv")
+
+    @admin.action(description="Export selected sounds (JSON Lines, streamed)")
+    def stream_jsonl_export(self, request, queryset):
+        return self._stream_export(request, queryset, "jsonl")
+
+    @admin.action(description="Export selected sounds to storage in the background")
+    def background_csv_export(self, request, queryset):
+        name = f"exports/sounds-{timezone.now():%Y%m%d-%H%M%S}.csv"
+        if request.POST.get("select_across") == "1":
+            changelist = {"user": request.user.pk, "query": request.GET.urlencode()}
+            export_sounds.enqueue(name, "csv", changelist=changelist)
+        else:
+            export_sounds.enqueue(
+                name, "csv", pks=list(queryset.values_list("pk", flat=True))
+            )
+        messages.success(
+            request,
+            f"Exporting {queryset.count()} sounds in the background to {name}.",
+        )
+
+
+@admin.register(SoundImport)
+class SoundImportAdmin(ModelAdmin):
+    """Background bulk import for catalogues too large for the import page.
+
+    Takes the same columns as the Sound import/export resource. Saving the
+    upload queues core.tasks.import_sounds; reload the page for progress.
+    """
+
+    list_display = ["__str__", "status", "progress_display", "created_by", "created_at"]
+    list_filter = ["status"]
+    readonly_fields = [
+        "status",
+        "progress_display",
+        "errors_display",
+        "created_by",
+        "created_at",
+        "updated_at",
+    ]
+
+    def get_fields(self, request, obj=None):
+        if obj is None:
+            return ["file"]
+        return ["file", *self.readonly_fields]
+
+    def has_change_permission(self, request, obj=None):
+        # An import can't be edited once queued, only watched.
+        return False
+
+    def save_model(self, request, obj, form, change):
+        obj.created_by = request.user
+        super().save_model(request, obj, form, change)
+        transaction.on_commit(lambda: import_sounds.enqueue(obj.pk))
+
+    @admin.display(description="Progress")
+    def progress_display(self, obj):
+        return mark_safe(
+            '<div class="flex items-center gap-3">'
+            '<div class="w-32 h-2 rounded-full bg-base-200 dark:bg-base-800 overflow-hidden">'
+            f'<div class="h-full bg-primary-600" style="width: {obj.percent_done}%"></div>'
+            "</div>"
+            f'<span class="text-xs">{obj.processed_rows}/{obj.total_rows} rows'
+            f" &middot; {obj.created_count} created &middot; {obj.updated_count} updated"
+            f" &middot; {obj.error_count} errors</span>"
+            "</div>"
+        )
+
+    @admin.display(description="Row errors")
+    def errors_display(self, obj):
+        if not obj.errors:
+            return "None"
+        rows = "".join(
+            f"<li>Row {error['row']}: {escape(error['error'])}</li>"
+            for error in obj.errors
+        )
+        return mark_safe(f'<ul class="list-none m-0 text-sm">{rows}</ul>')
+
 
 @admin.register(Player)
-class PlayerAdmin(ModelAdmin):
+class PlayerAdmin(RequestBoundAdmin, ModelAdmin):
     list_display = ["name", "manager"]
     list_filter = [("name", FieldTextFilter)]
-    filter_horizontal = ["sounds"]
+    # Search-as-you-type instead of an <option> for every sound in the catalogue.
+    autocomplete_fields = ["sounds"]
     readonly_fields = ["playing_display", "token_display"]
     compressed_fields = True
     fieldsets = [
@@ -237,10 +433,6 @@ class PlayerAdmin(ModelAdmin):
             kwargs["label"] = "Sound library"
         return super().formfield_for_manytomany(db_field, request, **kwargs)
 
-    def get_form(self, request, obj=None, change=False, **kwargs):
-        self._current_request = request
-        return super().get_form(request, obj, change, **kwargs)
-
     def get_urls(self):
         urls = super().get_urls()
         custom = [
@@ -417,7 +609,7 @@ class SetAdmin(ModelAdmin):
 
 
 @admin.register(Listener)
-class ListenerAdmin(ModelAdmin):
+class ListenerAdmin(RequestBoundAdmin, ModelAdmin):
     list_display = ["user", "created_at"]
     readonly_fields = ["collection_display", "created_at", "updated_at"]
     change_form_outer_after_template = "admin/listener_test_point.html"
@@ -507,26 +699,26 @@ class ListenerAdmin(ModelAdmin):
 
     @admin.display(description="Saved sounds")
     def collection_display(self, obj):
-        sounds = list(obj.collection.all().order_by("title")) if obj else []
-        if not sounds:
-            return mark_safe(
-                '<div class="text-sm text-font-subtle-light dark:text-font-subtle-dark">'
-                "Empty collection"
-                "</div>"
-            )
-        rows = []
-        for s in sounds:
+        def row(s):
             url = reverse("admin:core_sound_change", args=[s.pk])
-            rows.append(
+            return (
                 f'<li class="py-2 border-b border-base-200 dark:border-base-800 last:border-0">'
                 f'<a href="{url}" class="font-medium text-font-default-light dark:text-font-default-dark hover:underline">{s.title}</a>'
                 f'<span class="text-xs text-font-subtle-light dark:text-font-subtle-dark"> &middot; {s.artist_name} &middot; #{s.pk}</span>'
                 f"</li>"
             )
-        return mark_safe(
-            '<ul class="rounded-default border border-base-200 dark:border-base-800 px-4 bg-white dark:bg-base-900 list-none m-0">'
-            + "".join(rows)
-            + "</ul>"
+
+        sounds = (
+            obj.collection.select_related("artist").order_by("title", "pk")
+            if obj
+            else Sound.objects.none()
+        )
+        return paginated_panel(
+            self.request,
+            sounds,
+            "collection_page",
+            row,
+            "Empty collection",
         )
 
 
@@ -1,8 +1,24 @@
+import hashlib
 import random
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
 import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
 
 sound_dimension = 5
 
+# Order of the vector stored in Sound.embeddings. A tag the model wasn't
+# trained on is left at 0.0.
+SOUND_TAGS = ["rain", "sea_waves", "thunderstorm", "wind", "crackling_fire"]
+
+# Bump when extract_features changes so stale cached features are ignored.
+FEATURE_VERSION = 1
+FEATURE_CACHE_TIMEOUT = None  # content-addressed, so never stale
+
 
 def random_sound_classifier(
     sound_id: int,
@@ -13,3 +29,152 @@ def random_sound_classifier(
     for i in range(sound_dimension):
         vector[i] = random.uniform(0, 1)
     return vector.tolist()
+
+
+def each_sound_classifier(sound_ids, *args, **kwargs) -> dict[int, list[float]]:
+    """Default batch classifier: the configured classifier, one sound at a time."""
+    from core.utils import _get_sound_classifier
+
+    classifier = _get_sound_classifier()
+    return {sound_id: classifier(sound_id) for sound_id in sound_ids}
+
+
+# --- Audio feature classifier -------------------------------------------------
+#
+# The learn/ project's ridge model over librosa MFCC, spectral and chroma
+# features. Enable it with
+#
+#     COSOUND_SOUND_CLASSIFIER = "core.classify.audio_feature_classifier"
+#     COSOUND_SOUND_BATCH_CLASSIFIER = "core.classify.audio_feature_batch_classifier"
+#     COSOUND_SOUND_MODEL = "/path/to/model_linear_ridge.npz"
+#
+# librosa is only needed where these run (the task worker), so it is imported
+# on first use rather than at module load.
+
+
+def extract_features(path, sr_target=22050) -> np.ndarray:
+    """Feature vector for one audio file. Must match learn/src/app/train_linear.py."""
+    try:
+        import librosa
+    except ImportError as e:
+        raise ImproperlyConfigured(
+            "core.classify.audio_feature_classifier needs librosa "
+            "(uv sync --extra classifier)."
+        ) from e
+
+    y, sr = librosa.load(path, sr=sr_target, mono=True)
+    min_len = sr * 5
+    if len(y) < min_len:
+        y = np.pad(y, (0, min_len - len(y)))
+
+    mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=20)
+    mfcc_mean = mfcc.mean(axis=1)
+    mfcc_std = mfcc.std(axis=1)
+
+    sc = librosa.feature.spectral_centroid(y=y, sr=sr).mean()
+    sroff = librosa.feature.spectral_rolloff(y=y, sr=sr, roll_percent=0.85).mean()
+    flat = librosa.feature.spectral_flatness(y=y).mean()
+    zcr = librosa.feature.zero_crossing_rate(y).mean()
+
+    chroma = librosa.feature.chroma_cqt(y=y, sr=sr).mean(axis=1)
+
+    return np.concatenate(
+        [mfcc_mean, mfcc_std, [sc, sroff, flat, zcr], chroma]
+    ).astype(np.float32)
+
+
+@lru_cache(maxsize=1)
+def _load_model():
+    """Ridge model weights, read once per worker process."""
+    path = getattr(settings, "COSOUND_SOUND_MODEL", None)
+    if not path:
+        raise ImproperlyConfigured(
+            "Set COSOUND_SOUND_MODEL to the trained model_linear_ridge.npz."
+        )
+    model = np.load(path, allow_pickle=True)
+    return model["mean"], model["scale"], model["W"], list(model["tags"])
+
+
+def _weights_from_features(features) -> list[float]:
+    mean, scale, W, model_tags = _load_model()
+    xz = (np.asarray(features, dtype=np.float32) - mean) / (scale + 1e-8)
+    weights = dict(zip(model_tags, np.clip(xz @ W, 0.0, 1.0).tolist()))
+    return [float(weights.get(tag, 0.0)) for tag in SOUND_TAGS]
+
+
+def _feature_cache_key(digest):
+    return f"classify:features:v{FEATURE_VERSION}:{digest}"
+
+
+def _spool_sound(sound, chunk_size=1024 * 1024):
+    """Stream a sound's file from storage to a temp file, hashing as it goes.
+
+    Returns (sha256 hex digest, temp file). The caller closes the temp file,
+    which deletes it.
+    """
+    digest = hashlib.sha256()
+    spooled = tempfile.NamedTemporaryFile(suffix=f"-{sound.pk}")
+    with sound.file.open("rb") as source:
+        for chunk in source.chunks(chunk_size):
+            digest.update(chunk)
+            spooled.write(chunk)
+    spooled.flush()
+    return digest.hexdigest(), spooled
+
+
+def audio_feature_batch_classifier(
+    sound_ids, processes=None, *args, **kwargs
+) -> dict[int, list[float]]:
+    """Embeddings for many sounds, extracting uncached features in a process pool.
+
+    Files are streamed and hashed here; only the CPU-bound librosa work runs
+    in the pool, so the workers never touch the database or storage. Features
+    are cached by content hash, so re-uploads and recomputes of the same
+    audio skip extraction entirely.
+    """
+    from core.models import Sound
+
+    features = {}
+    # digest -> (temp file, ids of the sounds with that content)
+    pending = {}
+    try:
+        for sound in Sound.objects.filter(pk__in=sound_ids).only("pk", "file"):
+            digest, spooled_file = _spool_sound(sound)
+            cached = cache.get(_feature_cache_key(digest))
+            if cached is not None:
+                spooled_file.close()
+                features[sound.pk] = cached
+            elif digest in pending:
+                spooled_file.close()
+                pending[digest][1].append(sound.pk)
+            else:
+                pending[digest] = (spooled_file, [sound.pk])
+
+        paths = [spooled_file.name for spooled_file, _ in pending.values()]
+        if len(paths) > 1 and processes != 1:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                extracted = list(pool.map(extract_features, paths))
+        else:
+            extracted = [extract_features(path) for path in paths]
+    finally:
+        for spooled_file, _ in pending.values():
+            spooled_file.close()
+
+    for (digest, (_, ids)), vector in zip(pending.items(), extracted):
+        vector = vector.tolist()
+        cache.set(_feature_cache_key(digest), vector, FEATURE_CACHE_TIMEOUT)
+        for sound_id in ids:
+            features[sound_id] = vector
+
+    return {
+        sound_id: _weights_from_features(vector)
+        for sound_id, vector in features.items()
+    }
+
+
+def audio_feature_classifier(sound_id: int, *args, **kwargs) -> list[float]:
+    """Embeddings for one sound from its audio. See audio_feature_batch_classifier."""
+    embeddings = audio_feature_batch_classifier([sound_id], processes=1)
+    if sound_id not in embeddings:
+        raise ValueError(f"Sound {sound_id} does not exist.")
+    return embeddings[sound_id]
@@ -0,0 +1,125 @@
+"""Streaming Sound catalogue export, the inverse of core.importing.
+
+Rows come from a server-side cursor (QuerySet.iterator) with artists joined
+and tags prefetched one chunk at a time, and are encoded line by line, so
+memory stays flat however large the catalogue is. The columns match what
+the bulk import and SoundResource accept, so an export can be re-imported.
+
+Under ASGI, Django reads a sync iterator to the end before sending any of
+it, so responses there stream aexport_lines instead.
+"""
+
+import csv
+import json
+import tempfile
+from itertools import islice
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+from core.models import Sound
+
+CHUNK_SIZE = 1000
+COLUMNS = ["id", "title", "artist", "tags", "embeddings", "flavor", "file", "art"]
+FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+
+
+def iter_sound_rows(sounds=None, chunk_size=CHUNK_SIZE):
+    """Yield one dict per sound, with embeddings as a list of floats."""
+    if sounds is None:
+        sounds = Sound.objects.all()
+    sounds = (
+        sounds.select_related("artist")
+        .prefetch_related("tags")
+        .order_by("pk")
+        .iterator(chunk_size=chunk_size)
+    )
+    for sound in sounds:
+        yield {
+            "id": sound.pk,
+            "title": sound.title,
+            "artist": sound.artist_name,
+            "tags": sound.tag_names,
+            "embeddings": _embeddings(sound.embeddings),
+            "flavor": sound.flavor or "",
+            "file": sound.file.name,
+            "art": sound.art.name if sound.art else "",
+        }
+
+
+def _embeddings(vector):
+    # pgvector stores float32; the shortest float32 repr round-trips exactly
+    # and keeps 0.1 from exporting as 0.10000000149011612.
+    if vector is None:
+        return None
+    return [float(str(value)) for value in np.asarray(vector, dtype=np.float32)]
+
+
+class _Line:
+    """File-like sink that hands csv.writer's output straight back."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        embeddings = row["embeddings"]
+        yield writer.writerow(
+            [
+                row["id"],
+                row["title"],
+                row["artist"],
+                ", ".join(row["tags"]),
+                "" if embeddings is None else "[" + " ".join(map(str, embeddings)) + "]",
+                row["flavor"],
+                row["file"],
+                row["art"],
+            ]
+        )
+
+
+def _jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+
+def export_lines(fmt, sounds=None, chunk_size=CHUNK_SIZE):
+    """Encoded export, one line (str) at a time."""
+    rows = iter_sound_rows(sounds, chunk_size=chunk_size)
+    if fmt == "csv":
+        return _csv_lines(rows)
+    if fmt == "jsonl":
+        return _jsonl_lines(rows)
+    raise ValueError(f"Unknown export format {fmt!r}; expected one of {list(FORMATS)}.")
+
+
+async def aexport_lines(fmt, sounds=None, chunk_size=CHUNK_SIZE):
+    """export_lines for ASGI responses, `chunk_size` lines per piece.
+
+    Each piece is read on the request's sync thread, which holds the cursor,
+    and sent before the next is read.
+    """
+    lines = export_lines(fmt, sounds, chunk_size=chunk_size)
+    read = sync_to_async(lambda: "".join(islice(lines, chunk_size)))
+    try:
+        while piece := await read():
+            yield piece
+    finally:
+        await sync_to_async(lines.close)()
+
+
+def export_to_storage(name, fmt, sounds=None, chunk_size=CHUNK_SIZE):
+    """Write an export to default storage through a temp file; return its name."""
+    with tempfile.TemporaryFile() as spool:
+        for line in export_lines(fmt, sounds, chunk_size=chunk_size):
+            spool.write(line.encode())
+        spool.seek(0)
+        return default_storage.save(name, File(spool, name=name))
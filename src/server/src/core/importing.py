@@ -0,0 +1,272 @@
+"""Bulk Sound catalogue import, run by core.tasks.import_sounds.
+
+The interactive SoundResource import saves row by row: Sound.save, an artist
+get_or_create and a tags.set per row. This path takes the same columns
+(id, title, artist, tags, embeddings, flavor, file, art) but
+
+  1. streams the file once to count rows and collect every artist and tag
+     name, and resolves them all with a handful of queries;
+  2. streams it again, writing sounds in chunks with bulk_create /
+     bulk_update and their tags with one TaggedItem bulk_create per chunk;
+  3. queues embed_sound for rows that arrive without embeddings instead of
+     classifying inline, transcode_sound for rows with a new file and
+     render_images for rows with new art.
+
+Each chunk commits on its own and bumps SoundImport.processed_rows, which is
+what the admin shows as progress. A row with an id updates that sound, or
+creates it under that id when there is none (as SoundResource does, so an
+export loads into an empty database); any other row creates one. Blank cells
+on an update leave the field unchanged. A row naming a tag whose slug is
+already taken by another tag is rejected.
+"""
+
+import csv
+import io
+import os
+from itertools import islice
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+from taggit.models import Tag, TaggedItem
+
+from core.models import Artist, Sound, SoundImport
+from core.tasks import embed_sound, render_images, transcode_sound
+
+CHUNK_SIZE = 500
+# Row errors kept on the SoundImport; the rest are only counted.
+MAX_REPORTED_ERRORS = 100
+UPDATABLE_FIELDS = ["title", "artist", "embeddings", "flavor", "file", "art"]
+
+
+def _split_tags(raw):
+    return [tag.strip() for tag in str(raw or "").split(",") if tag.strip()]
+
+
+def _parse_embeddings(raw):
+    raw = str(raw or "").strip().strip("[]")
+    if not raw:
+        return None
+    return [float(value) for value in raw.replace(",", " ").split()]
+
+
+def iter_rows(file):
+    """Yield each row of an uploaded catalogue as a dict of stripped strings.
+
+    CSV is read incrementally. Other formats import-export understands
+    (xlsx, json, ...) are loaded whole through tablib.
+    """
+    extension = os.path.splitext(file.name)[1].lstrip(".").lower()
+    with file.storage.open(file.name, "rb") as handle:
+        if extension == "csv":
+            text = io.TextIOWrapper(handle, encoding="utf-8-sig", newline="")
+            for row in csv.DictReader(text):
+                yield {
+                    (key or "").strip(): (value or "").strip()
+                    for key, value in row.items()
+                }
+        else:
+            import tablib
+
+            dataset = tablib.Dataset().load(handle.read(), format=extension)
+            for row in dataset.dict:
+                yield {
+                    str(key).strip(): "" if value is None else str(value).strip()
+                    for key, value in row.items()
+                }
+
+
+def _resolve_artists(names):
+    """Map each artist name to an Artist, creating the missing ones."""
+    artists = {}
+    for artist in Artist.objects.filter(name__in=names).order_by("-pk"):
+        artists[artist.name] = artist  # lowest pk wins, like get_or_create
+    missing = [name for name in names if name not in artists]
+    for artist in Artist.objects.bulk_create(
+        [Artist(name=name) for name in missing]
+    ):
+        artists[artist.name] = artist
+    return artists
+
+
+def _resolve_tags(names):
+    """Map each tag name to a Tag id, creating the missing ones.
+
+    A name whose slug another tag already has is left out of the map.
+    """
+    tags = dict(Tag.objects.filter(name__in=names).values_list("name", "pk"))
+    missing = [name for name in names if name not in tags]
+    if missing:
+        new_tags = []
+        for name in missing:
+            tag = Tag(name=name)
+            tag.slug = tag.slugify(name)
+            new_tags.append(tag)
+        # Slug collisions are skipped here and reported per row; re-read by name.
+        Tag.objects.bulk_create(new_tags, ignore_conflicts=True)
+        tags.update(Tag.objects.filter(name__in=missing).values_list("name", "pk"))
+    return tags
+
+
+class _Progress:
+    def __init__(self, sound_import):
+        self.sound_import = sound_import
+        self.processed = self.created = self.updated = 0
+        self.errors = []
+        self.error_count = 0
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": line, "error": message})
+
+    def save(self, **fields):
+        SoundImport.objects.filter(pk=self.sound_import.pk).update(
+            processed_rows=self.processed,
+            created_count=self.created,
+            updated_count=self.updated,
+            error_count=self.error_count,
+            errors=self.errors,
+            updated_at=timezone.now(),
+            **fields,
+        )
+
+
+def _write_chunk(rows, artists, tags, progress):
+    """Create or update one chunk of (line number, row) pairs."""
+    sound_type = ContentType.objects.get_for_model(Sound)
+    ids = [int(row["id"]) for _, row in rows if row.get("id", "").isdigit()]
+    existing = Sound.objects.only(*UPDATABLE_FIELDS, "variants").in_bulk(ids)
+    now = timezone.now()
+
+    to_create, to_create_with_id, to_update, tag_rows = [], {}, [], []
+    for line, row in rows:
+        try:
+            embeddings = _parse_embeddings(row.get("embeddings"))
+        except ValueError:
+            progress.error(line, "embeddings is not a list of numbers")
+            continue
+        taken = [name for name in _split_tags(row.get("tags")) if name not in tags]
+        if taken:
+            progress.error(line, f"slug taken by another tag: {', '.join(taken)}")
+            continue
+
+        sound_id = row.get("id", "")
+        if sound_id and not sound_id.isdigit():
+            progress.error(line, f"id {sound_id} is not a number")
+            continue
+        sound_id = int(sound_id) if sound_id else None
+        sound = existing.get(sound_id) or to_create_with_id.get(sound_id)
+        if sound is None:
+            if not row.get("title") or not row.get("file"):
+                progress.error(line, "new sounds need a title and a file")
+                continue
+            sound = Sound(pk=sound_id)
+            if sound_id is None:
+                to_create.append(sound)
+            else:
+                to_create_with_id[sound_id] = sound
+        elif sound_id not in to_create_with_id:
+            to_update.append(sound)
+
+        for field in ("title", "flavor", "file", "art"):
+            if row.get(field):
+                setattr(sound, field, row[field])
+        if row.get("artist"):
+            sound.artist = artists[row["artist"]]
+        if embeddings is not None:
+            sound.embeddings = embeddings
+        sound.embedding_status = (
+            Sound.EmbeddingStatus.PENDING
+            if sound.embeddings is None
+            else Sound.EmbeddingStatus.READY
+        )
+        sound.updated_at = now
+        if "tags" in row:
+            tag_rows.append((sound, _split_tags(row["tags"])))
+
+    to_create_with_id = list(to_create_with_id.values())
+    with transaction.atomic():
+        # bulk_create skips Sound.save, so nothing is classified inline.
+        if to_create_with_id:
+            Sound.objects.bulk_create(to_create_with_id, batch_size=CHUNK_SIZE)
+            # Move the id sequence past them before any sound takes a new id,
+            # as loaddata does.
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), [Sound]):
+                    cursor.execute(sql)
+        Sound.objects.bulk_create(to_create, batch_size=CHUNK_SIZE)
+        Sound.objects.bulk_update(
+            to_update,
+            UPDATABLE_FIELDS + ["embedding_status", "updated_at"],
+            batch_size=CHUNK_SIZE,
+        )
+        TaggedItem.objects.filter(
+            content_type=sound_type,
+            object_id__in=[sound.pk for sound, _ in tag_rows],
+        ).delete()
+        TaggedItem.objects.bulk_create(
+            [
+                TaggedItem(content_type=sound_type, object_id=sound.pk, tag_id=tag_id)
+                for sound, names in tag_rows
+                for tag_id in {tags[name] for name in names if name in tags}
+            ],
+            batch_size=CHUNK_SIZE,
+        )
+        to_create += to_create_with_id
+        progress.processed += len(rows)
+        progress.created += len(to_create)
+        progress.updated += len(to_update)
+        progress.save()
+
+        unembedded = [
+            sound.pk for sound in to_create + to_update if sound.embeddings is None
+        ]
+        if unembedded:
+            transaction.on_commit(
+                lambda: [embed_sound.enqueue(sound_id) for sound_id in unembedded]
+            )
+        untranscoded = [
+            sound.pk
+            for sound in to_create + to_update
+            if sound.file_changed("file") and sound.stale_variants()
+        ]
+        if untranscoded:
+            transaction.on_commit(
+                lambda: [transcode_sound.enqueue(sound_id) for sound_id in untranscoded]
+            )
+        unrendered = [
+            sound.pk
+            for sound in to_create + to_update
+            if sound.file_changed("art") and sound.stale_renditions()
+        ]
+        if unrendered:
+            label = Sound._meta.label
+            transaction.on_commit(
+                lambda: [render_images.enqueue(label, sound_id) for sound_id in unrendered]
+            )
+
+
+def run_sound_import(sound_import, chunk_size=CHUNK_SIZE):
+    progress = _Progress(sound_import)
+
+    total = 0
+    artist_names, tag_names = set(), set()
+    for row in iter_rows(sound_import.file):
+        total += 1
+        if row.get("artist"):
+            artist_names.add(row["artist"])
+        tag_names.update(_split_tags(row.get("tags")))
+    progress.save(status=SoundImport.Status.RUNNING, total_rows=total)
+
+    artists = _resolve_artists(sorted(artist_names))
+    tags = _resolve_tags(sorted(tag_names))
+
+    # Line 1 is the header.
+    rows = enumerate(iter_rows(sound_import.file), start=2)
+    while chunk := list(islice(rows, chunk_size)):
+        _write_chunk(chunk, artists, tags, progress)
+
+    progress.save(status=SoundImport.Status.DONE)
+    return progress
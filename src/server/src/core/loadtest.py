@@ -0,0 +1,184 @@
+"""Local load generator: simulated phones and players against a dev server.
+
+Each phone is a thread with its own cookie jar. It signs in anonymously,
+then loops through the htmx vote and mixer endpoints the way the app
+drives them: open the vote card, vote, open the mixer, keep a sound, swap.
+Each player is a thread polling the player API with its token, as the
+venue hardware does. Every request's latency and status are recorded per
+endpoint, and summary() turns them into throughput and percentiles.
+
+Only loopback hosts are accepted, so this can't be pointed at a deployment.
+"""
+
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urlsplit
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+import numpy as np
+
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+TIMEOUT = 30
+
+
+def check_local(base_url):
+    host = urlsplit(base_url).hostname
+    if host not in LOCAL_HOSTS:
+        raise ValueError(
+            f"{base_url} is not a local server ({', '.join(sorted(LOCAL_HOSTS))})."
+        )
+
+
+class Stats:
+    """Per-endpoint latencies and statuses, shared by every thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, endpoint, seconds, status):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status] += 1
+
+    def summary(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        rows = []
+        for endpoint in sorted(self.latencies):
+            latencies_ms = np.array(self.latencies[endpoint]) * 1000
+            p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+            statuses = self.statuses[endpoint]
+            # 0 = no response at all (refused, timed out).
+            errors = sum(n for s, n in statuses.items() if s == 0 or s >= 500)
+            rows.append(
+                {
+                    "endpoint": endpoint,
+                    "requests": len(latencies_ms),
+                    "rps": len(latencies_ms) / elapsed,
+                    "p50_ms": float(p50),
+                    "p95_ms": float(p95),
+                    "p99_ms": float(p99),
+                    "max_ms": float(latencies_ms.max()),
+                    "errors": errors,
+                    "statuses": dict(sorted(statuses.items())),
+                }
+            )
+        return rows
+
+
+class Client:
+    """One simulated device: a cookie jar and a recording request method."""
+
+    def __init__(self, base_url, stats, headers=None):
+        self.base_url = base_url.rstrip("/")
+        self.stats = stats
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies))
+        self.headers = headers or {}
+
+    def cookie(self, name):
+        return next((c.value for c in self.cookies if c.name == name), None)
+
+    def request(self, endpoint, path, *, data=None, htmx=False):
+        headers = dict(self.headers)
+        if htmx:
+            headers["HX-Request"] = "true"
+        body = None
+        if data is not None:
+            body = urlencode(data).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+            headers["X-CSRFToken"] = self.cookie("csrftoken") or ""
+        request = Request(self.base_url + path, data=body, headers=headers)
+        began = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=TIMEOUT) as response:
+                response.read()
+                status = response.status
+        except HTTPError as e:
+            status = e.code
+        except (URLError, TimeoutError, ConnectionError):
+            status = 0
+        self.stats.record(endpoint, time.perf_counter() - began, status)
+        return status
+
+
+def _pause(seconds, deadline):
+    time.sleep(max(0.0, min(seconds, deadline - time.monotonic())))
+
+
+def phone(base_url, stats, token, sound_ids, deadline, think, rng):
+    client = Client(base_url, stats)
+    client.request("home", "/")  # sets the csrftoken cookie
+    client.request("login_anonymously", "/login/anonymous/", data={}, htmx=True)
+    query = urlencode({"player": token})
+    while time.monotonic() < deadline:
+        client.request("vote_initial", f"/vote/initial/?{query}", htmx=True)
+        # Two ups to a down; the phone UI sends 0 for a downvote.
+        choice = rng.choice(["1", "1", "0"])
+        client.request(
+            "submit_vote",
+            f"/vote/submit_vote/?{query}&{urlencode({'choice': choice})}",
+            htmx=True,
+        )
+        client.request("mixer_index", "/mixer/", htmx=True)
+        if sound_ids:
+            client.request(
+                "mixer_keep_sound",
+                "/mixer/keep-sound/",
+                data={"sound_id": rng.choice(sound_ids)},
+                htmx=True,
+            )
+        client.request("mixer_swap", "/mixer/swap/", htmx=True)
+        _pause(rng.uniform(0, 2 * think), deadline)
+
+
+def player(base_url, stats, token, deadline, poll):
+    client = Client(base_url, stats, headers={"X-API-Key": token})
+    client.request("api_manifest", "/api/manifest")
+    while time.monotonic() < deadline:
+        client.request("api_cosound", "/api/cosound")
+        client.request("api_player", "/api/player")
+        _pause(poll, deadline)
+
+
+def run(base_url, players, phones, duration, think=5.0, poll=15.0, seed=None):
+    """Drive `phones` phones spread over `players` for `duration` seconds.
+
+    `players` is [(token, [library sound ids])]; each also gets a polling
+    player thread. Returns the Stats.
+    """
+    check_local(base_url)
+    rng = random.Random(seed)
+    stats = Stats()
+    deadline = time.monotonic() + duration
+    with ThreadPoolExecutor(max_workers=phones + len(players)) as pool:
+        futures = [
+            pool.submit(player, base_url, stats, token, deadline, poll)
+            for token, _ in players
+        ]
+        for n in range(phones):
+            token, sound_ids = players[n % len(players)]
+            futures.append(
+                pool.submit(
+                    phone,
+                    base_url,
+                    stats,
+                    token,
+                    sound_ids,
+                    deadline,
+                    think,
+                    random.Random(rng.random()),
+                )
+            )
+        for future in futures:
+            future.result()
+    stats.finished = time.perf_counter()
+    return stats
@@ -0,0 +1,106 @@
+"""Queue embedding jobs for sounds that don't have embeddings yet.
+
+Sounds are read in primary-key batches and one `core.tasks.embed_sound` job is
+enqueued per sound, so a large catalogue never sits in memory at once and the
+work spreads across however many task workers are running.
+
+Idempotent: a queued job skips any sound that already has embeddings, so it is
+safe to re-run while an earlier backfill is still draining.
+
+Usage:
+    uv run src/main.py embed_sounds              # missing embeddings only
+    uv run src/main.py embed_sounds --failed     # also retry failed sounds
+    uv run src/main.py embed_sounds --all        # recompute every sound
+    uv run src/main.py embed_sounds --sync       # classify in this process
+
+With --sync each batch goes to COSOUND_SOUND_BATCH_CLASSIFIER in one call,
+which lets core.classify.audio_feature_batch_classifier spread feature
+extraction over --processes worker processes.
+"""
+
+from django.core.management.base import BaseCommand
+
+from core.models import Sound
+from core.tasks import embed_sound, store_embeddings
+from core.utils import _get_sound_batch_classifier
+
+
+class Command(BaseCommand):
+    help = "Queue (or run) embedding computation for sounds missing embeddings."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recompute embeddings for every sound, not just missing ones.",
+        )
+        parser.add_argument(
+            "--failed",
+            action="store_true",
+            help="Include sounds whose earlier embedding attempts all failed.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Sounds read per query (default 500).",
+        )
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help="Run the classifier here instead of enqueueing tasks.",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=None,
+            help="Worker processes for --sync feature extraction (default: CPUs).",
+        )
+
+    def handle(self, *args, **options):
+        force = options["all"]
+        batch_size = options["batch_size"]
+
+        sounds = Sound.objects.all()
+        if not force:
+            statuses = [Sound.EmbeddingStatus.PENDING]
+            if options["failed"]:
+                statuses.append(Sound.EmbeddingStatus.FAILED)
+            sounds = sounds.filter(
+                embeddings__isnull=True, embedding_status__in=statuses
+            )
+        sound_ids = sounds.order_by("pk").values_list("pk", flat=True)
+
+        verb = "processed" if options["sync"] else "queued"
+        total = 0
+        last_pk = 0
+        while True:
+            batch = list(sound_ids.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            if options["failed"] and not force:
+                Sound.objects.filter(
+                    pk__in=batch, embedding_status=Sound.EmbeddingStatus.FAILED
+                ).update(embedding_status=Sound.EmbeddingStatus.PENDING)
+            if options["sync"]:
+                self.embed_batch(batch, options["processes"])
+            else:
+                for sound_id in batch:
+                    embed_sound.enqueue(sound_id, force=force)
+            total += len(batch)
+            last_pk = batch[-1]
+            self.stdout.write(f"  {total} sounds {verb}…")
+
+        if total == 0:
+            self.stdout.write(self.style.SUCCESS("Nothing to do — every sound has embeddings."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Done: {total} sounds {verb}."))
+
+    def embed_batch(self, sound_ids, processes):
+        try:
+            embeddings = _get_sound_batch_classifier()(sound_ids, processes=processes)
+        except Exception as e:
+            self.stderr.write(f"  Sounds {sound_ids[0]}–{sound_ids[-1]} failed: {e}")
+            return
+        for sound_id, vector in embeddings.items():
+            store_embeddings(Sound.objects.filter(pk=sound_id), vector)
@@ -0,0 +1,54 @@
+"""Stream the Sound catalogue, embeddings included, as CSV or JSON Lines.
+
+Rows are read through a server-side cursor in chunks, so memory use doesn't
+grow with the catalogue. The output re-imports through SoundImport.
+
+Usage:
+    uv run src/main.py export_sounds > sounds.csv
+    uv run src/main.py export_sounds --format jsonl --output sounds.jsonl
+    uv run src/main.py export_sounds --background   # task writes to storage
+"""
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.exporting import CHUNK_SIZE, FORMATS, export_lines
+from core.tasks import export_sounds
+
+
+class Command(BaseCommand):
+    help = "Stream every sound and its embeddings as CSV or JSON Lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=list(FORMATS), default="csv")
+        parser.add_argument(
+            "--output",
+            help="File to write to (default: stdout).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=CHUNK_SIZE,
+            help=f"Sounds fetched per cursor round trip (default {CHUNK_SIZE}).",
+        )
+        parser.add_argument(
+            "--background",
+            action="store_true",
+            help="Queue a task that writes the export to media storage instead.",
+        )
+
+    def handle(self, *args, **options):
+        fmt = options["format"]
+        if options["background"]:
+            name = f"exports/sounds-{timezone.now():%Y%m%d-%H%M%S}.{fmt}"
+            export_sounds.enqueue(name, fmt)
+            self.stdout.write(self.style.SUCCESS(f"Queued export to {name}."))
+            return
+
+        lines = export_lines(fmt, chunk_size=options["chunk_size"])
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as out:
+                out.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
@@ -0,0 +1,77 @@
+"""Fill the database with synthetic artists, sounds, venues and audience.
+
+For load tests (`loadtest`) and predictor benchmarks (`replay_predictor`)
+without production data. Volumes default to a mid-size deployment and
+scale together with --scale; each can also be set on its own. Run
+`rollup_votes` afterwards so predictors that read the rollups see the
+generated votes. --purge removes everything this command created.
+
+Usage:
+    uv run src/main.py generate_synthetic
+    uv run src/main.py generate_synthetic --scale 10 --seed 1
+    uv run src/main.py generate_synthetic --listeners 20000 --votes 1000000
+    uv run src/main.py generate_synthetic --purge
+"""
+
+from dataclasses import fields
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.synthetic import Scale, generate, purge
+
+
+class Command(BaseCommand):
+    help = "Generate (or --purge) a synthetic dataset for load and predictor testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale",
+            type=float,
+            default=1.0,
+            help="Multiply every default volume by this (default 1).",
+        )
+        for field in fields(Scale):
+            parser.add_argument(
+                f"--{field.name}",
+                type=int,
+                default=None,
+                help=f"Override {field.name} (default {field.default}).",
+            )
+        parser.add_argument(
+            "--seed", type=int, default=None, help="Seed for a repeatable dataset."
+        )
+        parser.add_argument(
+            "--purge",
+            action="store_true",
+            help="Delete previously generated synthetic data instead.",
+        )
+
+    def handle(self, *args, **options):
+        if options["purge"]:
+            deleted = purge()
+            for model, count in sorted(deleted.items()):
+                self.stdout.write(f"  {model}: {count}")
+            self.stdout.write(self.style.SUCCESS("Synthetic data purged."))
+            return
+
+        if not settings.DEBUG:
+            raise CommandError(
+                "Refusing to generate synthetic data with DEBUG off; "
+                "point this at a local database."
+            )
+        scale = Scale()
+        for field in fields(Scale):
+            value = options[field.name]
+            # Volumes scale; the span votes are spread over doesn't.
+            if value is None and field.name != "days":
+                value = max(1, round(field.default * options["scale"]))
+            if value is not None:
+                setattr(scale, field.name, value)
+        self.stdout.write("Generating synthetic data…")
+        created = generate(scale, seed=options["seed"])
+        for name, count in created.items():
+            self.stdout.write(f"  {name}: {count}")
+        self.stdout.write(
+            self.style.SUCCESS("Done. Run `rollup_votes` to fold in the votes.")
+        )
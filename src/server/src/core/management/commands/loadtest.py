@@ -0,0 +1,132 @@
+"""Load-test a local server with simulated phones and players.
+
+Start the server first (`make server`, or gunicorn/uvicorn for numbers
+closer to production) against a database filled by `generate_synthetic`.
+This command reads player tokens and libraries from the same database and
+then drives the htmx vote and mixer endpoints with --phones concurrent
+phones and the player API with one poller per player, for --duration
+seconds. It reports throughput and latency percentiles per endpoint. Only
+localhost URLs are accepted.
+
+The player API is throttled to 10 requests a minute per player, so a
+--poll below 12 seconds shows up as 429s rather than load.
+
+Usage:
+    uv run src/main.py loadtest
+    uv run src/main.py loadtest --phones 200 --players 10 --duration 120
+    uv run src/main.py loadtest --url http://127.0.0.1:8080
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.loadtest import check_local, run
+from core.models import Player
+from core.synthetic import SYNTHETIC_EMAIL_DOMAIN
+
+COLUMNS = [
+    ("endpoint", "{}"),
+    ("requests", "{}"),
+    ("rps", "{:.1f}"),
+    ("p50_ms", "{:.1f}"),
+    ("p95_ms", "{:.1f}"),
+    ("p99_ms", "{:.1f}"),
+    ("max_ms", "{:.1f}"),
+    ("errors", "{}"),
+]
+
+
+class Command(BaseCommand):
+    help = "Drive a local server with simulated phones and players and report latency."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            default="http://127.0.0.1:8000",
+            help="Local server to load (default http://127.0.0.1:8000).",
+        )
+        parser.add_argument(
+            "--phones", type=int, default=50, help="Concurrent phones (default 50)."
+        )
+        parser.add_argument(
+            "--players",
+            type=int,
+            default=5,
+            help="Players the phones are spread over (default 5).",
+        )
+        parser.add_argument(
+            "--duration", type=float, default=60, help="Seconds to run (default 60)."
+        )
+        parser.add_argument(
+            "--think",
+            type=float,
+            default=5,
+            help="Mean seconds a phone pauses between rounds (default 5).",
+        )
+        parser.add_argument(
+            "--poll",
+            type=float,
+            default=15,
+            help="Seconds between player API polls (default 15).",
+        )
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        try:
+            check_local(options["url"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        # Synthetic venues first, so a dev database's real players are only
+        # loaded when there is nothing else.
+        players = list(
+            Player.objects.filter(
+                manager__user__email__endswith=f"@{SYNTHETIC_EMAIL_DOMAIN}"
+            ).order_by("pk")[: options["players"]]
+        ) or list(Player.objects.order_by("pk")[: options["players"]])
+        if not players:
+            raise CommandError("No players; run `generate_synthetic` first.")
+        libraries = {player.pk: [] for player in players}
+        for player_id, sound_id in Player.sounds.through.objects.filter(
+            player__in=players
+        ).values_list("player_id", "sound_id"):
+            libraries[player_id].append(sound_id)
+
+        self.stdout.write(
+            f"Loading {options['url']} with {options['phones']} phones over "
+            f"{len(players)} players for {options['duration']:g}s…"
+        )
+        stats = run(
+            options["url"],
+            [(player.token, libraries[player.pk]) for player in players],
+            options["phones"],
+            options["duration"],
+            think=options["think"],
+            poll=options["poll"],
+            seed=options["seed"],
+        )
+        rows = stats.summary()
+        if not rows:
+            self.stdout.write(self.style.WARNING("No requests were made."))
+            return
+        self._table(rows)
+        for row in rows:
+            unexpected = {
+                status: count
+                for status, count in row["statuses"].items()
+                if status != 200
+            }
+            if unexpected:
+                self.stdout.write(
+                    self.style.WARNING(f"{row['endpoint']}: statuses {unexpected}")
+                )
+
+    def _table(self, rows):
+        cells = [[name for name, _ in COLUMNS]]
+        cells += [[fmt.format(row[name]) for name, fmt in COLUMNS] for row in rows]
+        widths = [max(len(row[i]) for row in cells) for i in range(len(COLUMNS))]
+        for number, row in enumerate(cells):
+            line = "  ".join(
+                cell.ljust(width) if i == 0 else cell.rjust(width)
+                for i, (cell, width) in enumerate(zip(row, widths))
+            )
+            self.stdout.write(self.style.MIGRATE_HEADING(line) if number == 0 else line)
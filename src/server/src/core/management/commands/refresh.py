@@ -1,14 +1,54 @@
+"""Scheduler that queues a prediction for every player every interval.
+
+Several instances can run at once. Each player belongs to one of `--shards`
+shards (player pk modulo the shard count) and an instance started with
+`--shard K` refreshes shard K's players. Before queueing a prediction the
+instance claims the player with a conditional UPDATE on Player.refreshed_at,
+so exactly one instance wins each interval even if shards are misassigned.
+Players whose claim is older than FAILOVER_INTERVALS intervals are also
+picked up by any other instance, so a dead instance's shard keeps playing.
+Each tick only loads the players it may claim.
+
+Once per interval one instance also queues the vote rollups, and once per
+ARCHIVE_INTERVAL the archiving of votes past the retention window. Whichever
+instance first takes the job's lease (a shared cache key that expires with
+the interval) queues it, so the jobs carry on while any instance is running.
+
+Usage:
+    uv run src/main.py refresh                          # one instance
+    uv run src/main.py refresh --shards 3 --shard 0     # one of three
+
+REFRESH_SHARDS / REFRESH_SHARD set the same from the environment.
+"""
+
+import os
 import time
 import sys
 import logging
+from datetime import timedelta
 from typing import cast, Any
-from django.core.management.base import BaseCommand
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.db.models.functions import Mod
+from django.utils import timezone
 from django.utils.module_loading import import_string
+from config.metrics import registry
 from core.models import Cosound, Player
 from django.conf import settings
+from vote.archive import ARCHIVE_INTERVAL, archive_expired_votes
+from vote.rollups import roll_up_votes
 
 
 REFRESH_INTERVAL_SECONDS = 30
+# Another shard's player is taken over once its last claim is this many
+# intervals old.
+FAILOVER_INTERVALS = 3
+
+
+def _take_lease(job, seconds) -> bool:
+    """True for the one instance that may queue `job` for the next `seconds`."""
+    return cache.add(f"refresh:{job}", True, timeout=seconds)
 
 
 def _get_predictor() -> Any:
@@ -29,26 +69,97 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument("args", nargs="*")
+        parser.add_argument(
+            "--shards",
+            type=int,
+            default=int(os.environ.get("REFRESH_SHARDS", 1)),
+            help="Scheduler instances sharing the players (default $REFRESH_SHARDS or 1).",
+        )
+        parser.add_argument(
+            "--shard",
+            type=int,
+            default=int(os.environ.get("REFRESH_SHARD", 0)),
+            help="This instance's shard, 0 to --shards - 1 (default $REFRESH_SHARD or 0).",
+        )
+
+    @staticmethod
+    def due_players(shards=1, shard=0, now=None, running_since=None):
+        """Players this instance might claim now; claim() still decides."""
+        now = now or timezone.now()
+        interval = timedelta(seconds=REFRESH_INTERVAL_SECONDS)
+        own_stale = now - interval / 2
+        failover_stale = now - interval * FAILOVER_INTERVALS
+        due = Q(refresh_shard=shard) & (
+            Q(refreshed_at__isnull=True) | Q(refreshed_at__lte=own_stale)
+        )
+        due |= Q(refreshed_at__lte=failover_stale)
+        if running_since is not None and running_since <= failover_stale:
+            due |= Q(refreshed_at__isnull=True)
+        return (
+            Player.objects.annotate(refresh_shard=Mod("pk", shards))
+            .filter(due)
+            .only("name", "refreshed_at")
+            .order_by("pk")
+        )
+
+    @staticmethod
+    def claim(player, shards=1, shard=0, now=None, running_since=None):
+        """Claim `player` for this interval; False if another instance has it.
+
+        A player never claimed before is left to its own shard until this
+        instance has itself been running for the failover window.
+        """
+        now = now or timezone.now()
+        interval = timedelta(seconds=REFRESH_INTERVAL_SECONDS)
+        unclaimed = Q(refreshed_at__isnull=True)
+        if player.pk % shards == shard:
+            # Half an interval: tolerates tick drift, never two per interval.
+            stale = now - interval / 2
+        else:
+            stale = now - interval * FAILOVER_INTERVALS
+            if running_since is None or running_since > stale:
+                unclaimed = Q(pk__in=[])
+        if player.refreshed_at and player.refreshed_at > stale:
+            return False  # skip the UPDATE; the row only gets fresher
+        return bool(
+            Player.objects.filter(unclaimed | Q(refreshed_at__lte=stale), pk=player.pk)
+            .update(refreshed_at=now)
+        )
 
     def handle(self, *args, **options):
+        shards = options.get("shards", 1)
+        shard = options.get("shard", 0)
+        if not 0 <= shard < shards:
+            raise CommandError(f"--shard must be between 0 and {shards - 1}.")
         self.stdout.write(
             self.style.SUCCESS("Initializing Cosound Generation Scheduler...")
         )
         predictor = _get_predictor()
+        running_since = timezone.now()
 
         try:
             while True:
                 self.stdout.write(
-                    self.style.SUCCESS(f"\033[1mRefreshing All Players\033[22m")
+                    self.style.SUCCESS(
+                        f"\033[1mRefreshing Players (shard {shard + 1} of {shards})\033[22m"
+                    )
+                )
+                players = self.due_players(
+                    shards, shard, running_since=running_since
                 )
-                players = Player.objects.all()
                 if players:
                     for player in players:
+                        if not self.claim(
+                            player, shards, shard, running_since=running_since
+                        ):
+                            continue
                         try:
                             prediction = predictor.enqueue(
                                 player_id=player.pk,
                             )
+                            registry.inc("cosound_scheduler_enqueued_total")
                         except (ValueError, Exception) as e:
+                            registry.inc("cosound_scheduler_errors_total")
                             # Log the error but continue processing other players
                             self.stdout.write(
                                 self.style.ERROR(
@@ -58,6 +169,31 @@ class Command(BaseCommand):
                             continue
                 else:
                     self.stdout.write(self.style.WARNING("No Active Players Found."))
+                for job, task, seconds in [
+                    ("rollups", roll_up_votes, REFRESH_INTERVAL_SECONDS),
+                    (
+                        "archive",
+                        archive_expired_votes,
+                        ARCHIVE_INTERVAL.total_seconds(),
+                    ),
+                ]:
+                    try:
+                        if _take_lease(job, seconds):
+                            task.enqueue()
+                    except Exception as e:
+                        self.stdout.write(
+                            self.style.ERROR(f"Failed to queue vote {job}: {str(e)}")
+                        )
+                registry.inc("cosound_scheduler_ticks_total", shard=shard)
+                registry.set(
+                    "cosound_scheduler_last_tick_timestamp_seconds",
+                    time.time(),
+                    shard=shard,
+                )
+                try:
+                    registry.flush()
+                except Exception:
+                    pass  # metrics never stop the scheduler
                 time.sleep(REFRESH_INTERVAL_SECONDS)
 
         except KeyboardInterrupt:
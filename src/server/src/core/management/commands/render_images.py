@@ -0,0 +1,72 @@
+"""Queue rendition jobs for uploaded images that don't have renditions yet.
+
+New uploads are rendered when they're saved (core.models.HasRenditions);
+this catches up on images uploaded before that, or whose job was lost. One
+`core.tasks.render_images` job is enqueued per row with a stale image, and
+until it runs the original keeps being served.
+
+Idempotent: a queued job only renders images whose renditions are missing
+or were made from a different upload, so it is safe to re-run.
+
+Usage:
+    uv run src/main.py render_images
+    uv run src/main.py render_images --dry-run
+"""
+
+from functools import reduce
+from operator import or_
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.models import Artist, Player, Set, Sound, User
+from core.tasks import render_images
+
+MODELS = (Sound, Artist, Set, Player, User)
+
+
+class Command(BaseCommand):
+    help = "Queue WebP/AVIF renditions for images that don't have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Rows read per query (default 500).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report how many rows would be queued without queueing them.",
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for model in MODELS:
+            with_images = reduce(
+                or_, (Q(**{f"{field}__gt": ""}) for field in model.IMAGE_FIELDS)
+            )
+            rows = (
+                model.objects.filter(with_images)
+                .only("pk", "renditions", *model.IMAGE_FIELDS)
+                .order_by("pk")
+                .iterator(chunk_size=options["batch_size"])
+            )
+            queued = 0
+            for instance in rows:
+                if instance.stale_renditions():
+                    if not options["dry_run"]:
+                        render_images.enqueue(model._meta.label, instance.pk)
+                    queued += 1
+            if queued:
+                verb = "would be queued" if options["dry_run"] else "queued"
+                self.stdout.write(f"  {model._meta.verbose_name_plural}: {queued} {verb}")
+            total += queued
+
+        if total == 0:
+            self.stdout.write(self.style.SUCCESS("Nothing to do — every image is rendered."))
+        elif options["dry_run"]:
+            self.stdout.write(f"Would queue {total} rendition jobs.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Done: {total} rendition jobs queued."))
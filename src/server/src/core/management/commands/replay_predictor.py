@@ -0,0 +1,147 @@
+"""Replay a vote stream against predictors and report speed and behaviour.
+
+Runs offline against the database without changing it (see core.replay):
+the votes of each refresh tick are replayed for a scratch copy of the
+player, every predictor predicts once per tick, and everything is rolled
+back. Predictors are dotted paths, as for COSOUND_CORE_PREDICTOR; the
+first one is the baseline the others' agreement is measured against.
+
+Usage:
+    uv run src/main.py replay_predictor 3
+    uv run src/main.py replay_predictor 3 --hours 72 \\
+        --predictor core.predict.random_predictor \\
+        --predictor core.predict.scoring_predictor
+    uv run src/main.py replay_predictor 3 --synthetic 5000 --listeners 200
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.management.commands.refresh import REFRESH_INTERVAL_SECONDS, _get_predictor
+from core.models import Player
+from core.replay import recorded_votes, replay, synthetic_votes
+
+COLUMNS = [
+    ("predictor", "{}"),
+    ("ticks", "{}"),
+    ("written", "{}"),
+    ("p50_ms", "{:.1f}"),
+    ("p95_ms", "{:.1f}"),
+    ("p99_ms", "{:.1f}"),
+    ("max_ms", "{:.1f}"),
+    ("queries", "{:.1f}"),
+    ("layers", "{:.2f}"),
+    ("tags", "{:.2f}"),
+    ("agreement", "{:.2f}"),
+]
+
+
+class Command(BaseCommand):
+    help = "Replay recorded or synthetic votes against predictors and benchmark them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("player", type=int, help="Player whose library is used.")
+        parser.add_argument(
+            "--predictor",
+            action="append",
+            dest="predictors",
+            default=[],
+            help="Dotted path of a predictor; repeat to compare "
+            "(default: COSOUND_CORE_PREDICTOR).",
+        )
+        parser.add_argument(
+            "--hours",
+            type=float,
+            default=24,
+            help="Span of votes to replay, ending now (default 24).",
+        )
+        parser.add_argument(
+            "--synthetic",
+            type=int,
+            default=0,
+            metavar="VOTES",
+            help="Replay this many random votes instead of recorded ones.",
+        )
+        parser.add_argument(
+            "--listeners",
+            type=int,
+            default=50,
+            help="Listeners casting the synthetic votes (default 50).",
+        )
+        parser.add_argument(
+            "--step",
+            type=float,
+            default=REFRESH_INTERVAL_SECONDS,
+            help=f"Simulated seconds per tick (default {REFRESH_INTERVAL_SECONDS}).",
+        )
+        parser.add_argument(
+            "--limit", type=int, default=None, help="Stop after this many ticks."
+        )
+        parser.add_argument(
+            "--seed", type=int, default=None, help="Seed for repeatable runs."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            player = Player.objects.get(pk=options["player"])
+        except Player.DoesNotExist:
+            raise CommandError(f"Player {options['player']} does not exist.")
+        predictors = {}
+        for path in options["predictors"]:
+            try:
+                predictors[path] = import_string(path)
+            except ImportError as e:
+                raise CommandError(f"Can't import predictor {path!r}: {e}")
+        if not predictors:
+            predictor = _get_predictor()
+            predictors[getattr(predictor, "name", repr(predictor))] = predictor
+
+        span = timedelta(hours=options["hours"])
+        with transaction.atomic():
+            if options["synthetic"]:
+                votes = synthetic_votes(
+                    player,
+                    options["synthetic"],
+                    span,
+                    listeners=options["listeners"],
+                    seed=options["seed"],
+                )
+            else:
+                votes = recorded_votes(player, timezone.now() - span)
+            self.stdout.write(f"Replaying {len(votes)} votes…")
+            results = replay(
+                player,
+                votes,
+                predictors,
+                step=timedelta(seconds=options["step"]),
+                limit=options["limit"],
+                seed=options["seed"],
+            )
+            # Synthetic cosounds included: leave the database as it was.
+            transaction.set_rollback(True)
+
+        if not results:
+            self.stdout.write(self.style.WARNING("No votes to replay."))
+            return
+        self._table(results)
+
+    def _table(self, results):
+        rows = [[name for name, _ in COLUMNS]]
+        for result in results:
+            rows.append(
+                [
+                    "-" if result[name] is None else fmt.format(result[name])
+                    for name, fmt in COLUMNS
+                ]
+            )
+        widths = [max(len(row[i]) for row in rows) for i in range(len(COLUMNS))]
+        for number, row in enumerate(rows):
+            line = "  ".join(
+                cell.ljust(width) if i == 0 else cell.rjust(width)
+                for i, (cell, width) in enumerate(zip(row, widths))
+            )
+            self.stdout.write(self.style.MIGRATE_HEADING(line) if number == 0 else line)
@@ -0,0 +1,61 @@
+"""Queue transcoding jobs for sounds whose file has no current variants.
+
+New uploads are transcoded when they're saved (Sound.save) or imported; this
+catches up on sounds uploaded before that, whose job was lost, or whose
+variants were made by an older core.transcoding.VERSION (say, before
+waveform peaks were added). Sounds are read in primary-key batches and one
+`core.tasks.transcode_sound` job is enqueued per sound; until it runs, the
+upload (or its older variants) keeps being served.
+
+Idempotent: a queued job skips any sound whose current file already has
+variants from this VERSION, so it is safe to re-run while an earlier
+backfill is still draining.
+
+Usage:
+    uv run src/main.py transcode_sounds
+    uv run src/main.py transcode_sounds --dry-run
+"""
+
+from django.core.management.base import BaseCommand
+
+from core.models import Sound
+from core.tasks import transcode_sound
+
+
+class Command(BaseCommand):
+    help = "Queue web and player variants for sounds that don't have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Sounds read per query (default 500).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report how many sounds would be queued without queueing them.",
+        )
+
+    def handle(self, *args, **options):
+        sounds = (
+            Sound.objects.exclude(file="")
+            .only("pk", "file", "variants")
+            .order_by("pk")
+            .iterator(chunk_size=options["batch_size"])
+        )
+        total = 0
+        for sound in sounds:
+            if not sound.stale_variants():
+                continue
+            if not options["dry_run"]:
+                transcode_sound.enqueue(sound.pk)
+            total += 1
+
+        if total == 0:
+            self.stdout.write(self.style.SUCCESS("Nothing to do — every sound is transcoded."))
+        elif options["dry_run"]:
+            self.stdout.write(f"Would queue {total} transcoding jobs.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Done: {total} transcoding jobs queued."))
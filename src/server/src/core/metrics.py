@@ -0,0 +1,117 @@
+"""The /metrics/ endpoint and the metrics read from the database.
+
+Recorded as they happen (config.metrics.registry):
+- task run time, enqueue-to-completion lag and outcomes, from the
+  django_tasks signals on the worker
+- player API latency and throttle rejections (config.middleware)
+- vote throttle rejections (vote.views)
+- scheduler passes and enqueues (the `refresh` command)
+
+Read from the database on each scrape, so they are right whichever process
+is up: task queue depth and oldest waiting task, each player's prediction
+age, and the vote insert rate.
+
+The endpoint answers loopback requests that didn't come through the proxy,
+or requests bearing METRICS_TOKEN, so a local Prometheus (or curl) can
+scrape it while it stays closed to the internet.
+"""
+
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Min
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils import timezone
+from django_tasks.backends.database.models import DBTaskResult
+from django_tasks.signals import task_finished
+
+from config.metrics import merged_snapshot, registry, render
+from core.models import Player
+from vote.models import Vote
+
+VOTE_RATE_WINDOWS = (60, 300)
+LOCAL_ADDRESSES = {"127.0.0.1", "::1"}
+
+
+@receiver(task_finished)
+def record_task(sender, task_result, **kwargs):
+    task = task_result.task.module_path
+    registry.inc("cosound_tasks_total", task=task, status=task_result.status)
+    if task_result.started_at and task_result.finished_at:
+        registry.observe(
+            "cosound_task_seconds",
+            (task_result.finished_at - task_result.started_at).total_seconds(),
+            task=task,
+        )
+    if task_result.enqueued_at and task_result.finished_at:
+        registry.observe(
+            "cosound_task_lag_seconds",
+            (task_result.finished_at - task_result.enqueued_at).total_seconds(),
+            task=task,
+        )
+
+
+def collect():
+    """Gauges read from the database, as a snapshot to render."""
+    now = timezone.now()
+    gauges = []
+
+    ready = DBTaskResult.objects.ready()
+    for row in ready.values("task_path").annotate(depth=Count("pk")):
+        labels = {"task": row["task_path"]}
+        gauges.append(["cosound_task_queue_depth", labels, row["depth"]])
+    oldest = ready.aggregate(oldest=Min("enqueued_at"))["oldest"]
+    gauges.append(
+        [
+            "cosound_task_oldest_ready_age_seconds",
+            {},
+            (now - oldest).total_seconds() if oldest else 0.0,
+        ]
+    )
+
+    for pk, name, predicted_at in Player.objects.values_list(
+        "pk", "name", "predicted_at"
+    ):
+        if predicted_at is not None:
+            gauges.append(
+                [
+                    "cosound_player_update_age_seconds",
+                    {"player": pk, "name": name},
+                    (now - predicted_at).total_seconds(),
+                ]
+            )
+
+    for seconds in VOTE_RATE_WINDOWS:
+        votes = Vote.objects.filter(created_at__gte=now - timedelta(seconds=seconds))
+        labels = {"window": f"{seconds}s"}
+        gauges.append(["cosound_votes_per_second", labels, votes.count() / seconds])
+    return {"counters": [], "gauges": gauges, "histograms": []}
+
+
+def _allowed(request):
+    token = settings.METRICS_TOKEN
+    if token and secrets.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return True
+    return (
+        request.META.get("REMOTE_ADDR") in LOCAL_ADDRESSES
+        and "X-Forwarded-For" not in request.headers
+    )
+
+
+def metrics(request):
+    if not _allowed(request):
+        return HttpResponseForbidden()
+    registry.flush()  # this process's latest numbers, not its last flush
+    recorded = merged_snapshot()
+    collected = collect()
+    snapshot = {
+        kind: recorded[kind] + collected[kind]
+        for kind in ("counters", "gauges", "histograms")
+    }
+    return HttpResponse(
+        render(snapshot), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
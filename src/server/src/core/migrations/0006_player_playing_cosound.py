@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-19 05:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_artist_set_sound_artist_fk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='playing_cosound',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.cosound'),
+        ),
+    ]
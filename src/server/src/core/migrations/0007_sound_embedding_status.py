@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-19 05:21
+
+from django.db import migrations, models
+
+
+def mark_embedded_sounds_ready(apps, schema_editor):
+    Sound = apps.get_model("core", "Sound")
+    Sound.objects.filter(embeddings__isnull=False).update(embedding_status="ready")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_player_playing_cosound'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sound',
+            name='embedding_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', editable=False, max_length=16),
+        ),
+        migrations.RunPython(mark_embedded_sounds_ready, migrations.RunPython.noop),
+    ]
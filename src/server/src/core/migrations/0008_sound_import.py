@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-19 05:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_sound_embedding_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SoundImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='imports/')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', editable=False, max_length=16)),
+                ('total_rows', models.PositiveIntegerField(default=0, editable=False)),
+                ('processed_rows', models.PositiveIntegerField(default=0, editable=False)),
+                ('created_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('updated_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('error_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('errors', models.JSONField(blank=True, default=list, editable=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 05:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_sound_import'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='refreshed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
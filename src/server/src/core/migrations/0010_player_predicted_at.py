@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 05:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_player_refreshed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='predicted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 06:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sound',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
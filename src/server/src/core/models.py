@@ -13,15 +13,105 @@ from pgvector.django import VectorField
 from pydantic import BaseModel, Field
 from taggit.managers import TaggableManager
 
+from core.renditions import THUMBNAIL_WIDTH
+from core.renditions import url as rendition_url
+from core.transcoding import PEAKS_KEY, STREAM_VARIANTS
+from core.transcoding import VERSION as TRANSCODE_VERSION
 from core.utils import (
-    _get_sound_classifier,
     _get_sound_dimension,
     generate_layers_string,
     get_random_avatar_url,
 )
 
 
-class Sound(DjangoDB.Model):
+class HasRenditions(DjangoDB.Model):
+    """Keeps resized copies of the model's IMAGE_FIELDS; see core.renditions."""
+
+    IMAGE_FIELDS = ()
+
+    # field name -> {"source": the image name rendered, "widths": [...]},
+    # written by core.tasks.render_images.
+    renditions = DjangoDB.JSONField(default=dict, blank=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_files()
+        return instance
+
+    def _remember_files(self, fields=None):
+        """Note the file names as stored, for file_changed."""
+        names = getattr(self, "_file_names", {})
+        deferred = self.get_deferred_fields()
+        for field in self._meta.concrete_fields:
+            if (
+                isinstance(field, DjangoDB.FileField)
+                and field.attname not in deferred
+                and (fields is None or field.attname in fields)
+            ):
+                names[field.attname] = getattr(self, field.attname).name
+        self._file_names = names
+
+    def file_changed(self, field) -> bool:
+        """True if `field` holds another file than when loaded or last saved.
+
+        Background work is queued on a change only, so saving an unchanged
+        row (an admin edit, Player.update) doesn't queue it again.
+        """
+        if field in self.get_deferred_fields():
+            return False
+        value = getattr(self, field)
+        names = getattr(self, "_file_names", {})
+        if field not in names:  # a new row, or one loaded after a deferral
+            return bool(value)
+        return value.name != names[field] or not value._committed
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        changed = [
+            field
+            for field in self.IMAGE_FIELDS
+            if (update_fields is None or field in update_fields)
+            and self.file_changed(field)
+        ]
+        super().save(*args, **kwargs)
+        if changed and self.stale_renditions():
+            self.queue_renditions()
+        self._remember_files(update_fields)
+
+    def stale_renditions(self) -> list[str]:
+        """Image fields holding an image their renditions weren't made from."""
+        return [
+            field
+            for field in self.IMAGE_FIELDS
+            if getattr(self, field)
+            and self.renditions.get(field, {}).get("source")
+            != getattr(self, field).name
+        ]
+
+    def queue_renditions(self):
+        """Render the images in a background task once this save commits."""
+        from core.tasks import render_images
+
+        label, pk = self._meta.label, self.pk
+        transaction.on_commit(lambda: render_images.enqueue(label, pk))
+
+    def image_url(self, field, width, fmt="webp", fallback=True):
+        """URL of `field`'s image at `width` pixels or wider, or ""."""
+        return rendition_url(
+            getattr(self, field), self.renditions.get(field), width, fmt, fallback
+        )
+
+
+class Sound(HasRenditions):
+    class EmbeddingStatus(DjangoDB.TextChoices):
+        PENDING = "pending", "Pending"
+        READY = "ready", "Ready"
+        FAILED = "failed", "Failed"
+
     file = DjangoDB.FileField(upload_to="sounds/")
     title = DjangoDB.CharField(max_length=255)
     artist = DjangoDB.ForeignKey(
@@ -49,9 +139,21 @@ class Sound(DjangoDB.Model):
     )
     flavor = DjangoDB.TextField(blank=True, null=True, max_length=200)
     embeddings = VectorField(null=True, dimensions=_get_sound_dimension())
+    # Embeddings are computed off the request by core.tasks.embed_sound.
+    embedding_status = DjangoDB.CharField(
+        max_length=16,
+        choices=EmbeddingStatus.choices,
+        default=EmbeddingStatus.PENDING,
+        editable=False,
+    )
+    # {"source": the file name transcoded, "version": ..., "files": {variant
+    # key: name}}, written by core.tasks.transcode_sound; see core.transcoding.
+    variants = DjangoDB.JSONField(default=dict, blank=True, editable=False)
     created_at = DjangoDB.DateTimeField(auto_now_add=True)
     updated_at = DjangoDB.DateTimeField(auto_now=True)
 
+    IMAGE_FIELDS = ("art",)
+
     def __str__(self):
         return self.title
 
@@ -62,22 +164,122 @@ class Sound(DjangoDB.Model):
             return self.artist.name
         return self.artist_legacy or ""
 
+    @property
+    def tag_names(self) -> list[str]:
+        """Tag names, read from prefetched tags when the query prefetched them.
+
+        `tags.names()` always runs its own query, prefetch or not.
+        """
+        return [tag.name for tag in self.tags.all()]
+
     def save(self, *args, **kwargs):
-        if self.embeddings is None:
-            classifier = _get_sound_classifier()
-            self.embeddings = classifier(self.pk)
+        update_fields = kwargs.get("update_fields")
+        file_changed = (
+            update_fields is None or "file" in update_fields
+        ) and self.file_changed("file")
+        embed = self._state.adding or file_changed
+        if self.embeddings is not None:
+            self.embedding_status = self.EmbeddingStatus.READY
+        elif self.embedding_status == self.EmbeddingStatus.READY:
+            self.embedding_status = self.EmbeddingStatus.PENDING
+            embed = True  # the embeddings were just cleared
+        # HasRenditions.save notes the new file names, so check first.
         super().save(*args, **kwargs)
+        if embed and self.embedding_status == self.EmbeddingStatus.PENDING:
+            self.queue_embedding()
+        if file_changed and self.stale_variants():
+            self.queue_transcode()
+
+    def queue_embedding(self, force=False):
+        """Compute embeddings in a background task once this save commits."""
+        from core.tasks import embed_sound
+
+        sound_id = self.pk
+        transaction.on_commit(lambda: embed_sound.enqueue(sound_id, force=force))
+
+    def stale_variants(self) -> bool:
+        """True if the file has no variants, or ones made by an older VERSION."""
+        return bool(self.file) and (
+            self.variants.get("source") != self.file.name
+            or self.variants.get("version") != TRANSCODE_VERSION
+        )
+
+    def queue_transcode(self):
+        """Transcode the file in a background task once this save commits."""
+        from core.tasks import transcode_sound
+
+        sound_id = self.pk
+        transaction.on_commit(lambda: transcode_sound.enqueue(sound_id))
+
+    def audio_url(self, key) -> str:
+        """URL of the file's `key` variant (see core.transcoding), or ""."""
+        # An older VERSION's files still play until they're replaced.
+        if not self.file or self.variants.get("source") != self.file.name:
+            return ""
+        name = self.variants.get("files", {}).get(key)
+        return self.file.storage.url(name) if name else ""
 
     def asLayer(self, with_gain=1.0):
         return {
             "sound_id": self.pk,
             "sound_file": self.file.url,
+            # Opus streams the web mixer prefers over sound_file; empty until
+            # transcode_sound has run.
+            "sound_streams": {
+                key: url
+                for key in STREAM_VARIANTS
+                if (url := self.audio_url(key))
+            },
+            # Precomputed waveform the studio draws instead of decoding.
+            "sound_peaks_url": self.audio_url(PEAKS_KEY),
             "sound_gain": with_gain,
             "sound_title": self.title,
             "sound_artist": self.artist_name,
         }
 
 
+class SoundImport(DjangoDB.Model):
+    """A catalogue file bulk-imported by core.tasks.import_sounds."""
+
+    class Status(DjangoDB.TextChoices):
+        QUEUED = "queued", "Queued"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    file = DjangoDB.FileField(upload_to="imports/")
+    created_by = DjangoDB.ForeignKey(
+        "User",
+        on_delete=DjangoDB.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+    )
+    status = DjangoDB.CharField(
+        max_length=16,
+        choices=Status.choices,
+        default=Status.QUEUED,
+        editable=False,
+    )
+    total_rows = DjangoDB.PositiveIntegerField(default=0, editable=False)
+    processed_rows = DjangoDB.PositiveIntegerField(default=0, editable=False)
+    created_count = DjangoDB.PositiveIntegerField(default=0, editable=False)
+    updated_count = DjangoDB.PositiveIntegerField(default=0, editable=False)
+    error_count = DjangoDB.PositiveIntegerField(default=0, editable=False)
+    errors = DjangoDB.JSONField(default=list, blank=True, editable=False)
+    created_at = DjangoDB.DateTimeField(auto_now_add=True)
+    updated_at = DjangoDB.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.file.name
+
+    @property
+    def percent_done(self) -> int:
+        if not self.total_rows:
+            return 100 if self.status == self.Status.DONE else 0
+        return int(100 * self.processed_rows / self.total_rows)
+
+
 class SoundLayer(DjangoDB.Model):
     sound = DjangoDB.ForeignKey(Sound, on_delete=DjangoDB.CASCADE)
     mix = DjangoDB.ForeignKey("Cosound", on_delete=DjangoDB.CASCADE)
@@ -106,24 +308,27 @@ class Cosound(DjangoDB.Model):
         return normalized
 
     @staticmethod
-    def compute_hashid(layers):
-        normalized = Cosound.normalize_layers(layers)
+    def _hashes(normalized):
+        """(hashid, hashset) for layers already passed through normalize_layers."""
         key = generate_layers_string(normalized)
-        hashid = hashlib.sha256(key.encode()).hexdigest()
-        return hashid
+        set_key = generate_layers_string(normalized, with_gain=False)
+        return (
+            hashlib.sha256(key.encode()).hexdigest(),
+            hashlib.sha256(set_key.encode()).hexdigest(),
+        )
+
+    @staticmethod
+    def compute_hashid(layers):
+        return Cosound._hashes(Cosound.normalize_layers(layers))[0]
 
     @staticmethod
     def compute_hashset(layers):
-        normalized = Cosound.normalize_layers(layers)
-        key = generate_layers_string(normalized, with_gain=False)
-        hashset = hashlib.sha256(key.encode()).hexdigest()
-        return hashset
+        return Cosound._hashes(Cosound.normalize_layers(layers))[1]
 
     @classmethod
     def get_or_create_from_layers(cls, layers):
-        hashid = cls.compute_hashid(layers)
-        hashset = cls.compute_hashset(layers)
         normalized = cls.normalize_layers(layers)
+        hashid, hashset = cls._hashes(normalized)
         with transaction.atomic():
             cosound, created = cls.objects.get_or_create(
                 hashid=hashid, defaults={"hashset": hashset}
@@ -137,6 +342,54 @@ class Cosound(DjangoDB.Model):
                 )
         return cosound
 
+    @classmethod
+    def bulk_get_or_create_from_layers(cls, layer_sets, batch_size=500):
+        """get_or_create_from_layers for many layer lists, in a few queries.
+
+        Returns one Cosound per entry of `layer_sets`, in order; duplicate
+        entries share a Cosound. Existing cosounds are found with one IN query,
+        and the missing ones are inserted with batched bulk_creates.
+
+        Safe alongside concurrent callers: the cosound insert skips rows another
+        transaction already holds (waiting on the unique hashid until it
+        commits), and layers are only written for cosounds that still have none
+        afterwards, i.e. the ones this call inserted.
+        """
+        keyed = []
+        wanted = {}
+        for layers in layer_sets:
+            normalized = cls.normalize_layers(layers)
+            hashid, hashset = cls._hashes(normalized)
+            keyed.append(hashid)
+            wanted.setdefault(hashid, (hashset, normalized))
+
+        found = cls.objects.in_bulk(list(wanted), field_name="hashid")
+        missing = [hashid for hashid in wanted if hashid not in found]
+        if missing:
+            with transaction.atomic():
+                cls.objects.bulk_create(
+                    [cls(hashid=hashid, hashset=wanted[hashid][0]) for hashid in missing],
+                    batch_size=batch_size,
+                    ignore_conflicts=True,
+                )
+                inserted = cls.objects.in_bulk(missing, field_name="hashid")
+                layered = set(
+                    SoundLayer.objects.filter(mix__in=inserted.values())
+                    .values_list("mix_id", flat=True)
+                    .distinct()
+                )
+                SoundLayer.objects.bulk_create(
+                    [
+                        SoundLayer(sound_id=sid, mix=cosound, gain=g)
+                        for hashid, cosound in inserted.items()
+                        if cosound.pk not in layered
+                        for sid, g in wanted[hashid][1]
+                    ],
+                    batch_size=batch_size,
+                )
+            found.update(inserted)
+        return [found[hashid] for hashid in keyed]
+
     @classmethod
     def with_sound_set(cls, sound_ids):
         """Cosounds whose layer sound set exactly matches `sound_ids` (gain-agnostic)."""
@@ -151,7 +404,7 @@ class Cosound(DjangoDB.Model):
     def __str__(self):
         layers = []
         for layer in self.soundlayer_set.all():  # type: ignore
-            layers.append(tuple([layer.sound.pk, layer.gain]))
+            layers.append(tuple([layer.sound_id, layer.gain]))
         return generate_layers_string(layers)
 
 
@@ -170,23 +423,30 @@ class Prediction(BaseModel):
     def add_layer(self, sound_id: int, gain: float = 1.0) -> None:
         self.layers.append(PredictionLayer(sound_id=sound_id, sound_gain=gain))
 
+    def as_layers(self) -> list[tuple[int, float]]:
+        """The (sound_id, gain) pairs Cosound.get_or_create_from_layers takes."""
+        return [(layer.sound_id, layer.sound_gain) for layer in self.layers]
+
     def __bool__(self) -> bool:
         return bool(self.layers)
 
     def summary(self):
         from core.models import Sound
 
+        sounds = Sound.objects.select_related("artist").in_bulk(
+            [layer.sound_id for layer in self.layers]
+        )
         response = "Prediction Summary:\n"
         for layer in self.layers:
-            try:
-                sound = Sound.objects.get(pk=layer.sound_id)
+            sound = sounds.get(layer.sound_id)
+            if sound is not None:
                 response += f"- {sound.title} by {sound.artist_name} at gain {layer.sound_gain}\n"
-            except Sound.DoesNotExist:
+            else:
                 response += f"- Sound ID {layer.sound_id} not found at gain {layer.sound_gain}\n"
         return response
 
 
-class User(AbstractUser):
+class User(AbstractUser, HasRenditions):
     email = DjangoDB.EmailField(unique=True)
     username = DjangoDB.CharField(max_length=255, unique=True)
     avatar = DjangoDB.ImageField(
@@ -197,11 +457,12 @@ class User(AbstractUser):
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username"]
+    IMAGE_FIELDS = ("avatar",)
 
     @property
     def avatar_url(self):
         if self.avatar:
-            return self.avatar.url
+            return self.image_url("avatar", THUMBNAIL_WIDTH)
         return get_random_avatar_url(self.pk)
 
     @property
@@ -236,7 +497,7 @@ class Manager(DjangoDB.Model):
         return self.name
 
 
-class Artist(DjangoDB.Model):
+class Artist(HasRenditions):
     user = DjangoDB.ForeignKey(User, on_delete=DjangoDB.SET_NULL, null=True, blank=True)
     name = DjangoDB.CharField(max_length=255)
     bio = DjangoDB.TextField(blank=True)
@@ -250,6 +511,8 @@ class Artist(DjangoDB.Model):
     created_at = DjangoDB.DateTimeField(auto_now_add=True)
     updated_at = DjangoDB.DateTimeField(auto_now=True)
 
+    IMAGE_FIELDS = ("avatar", "cover")
+
     def __str__(self):
         return self.name
 
@@ -258,7 +521,7 @@ class Artist(DjangoDB.Model):
         return list(self.sounds.filter(set__isnull=True))
 
 
-class Set(DjangoDB.Model):
+class Set(HasRenditions):
     artist = DjangoDB.ForeignKey(
         Artist, on_delete=DjangoDB.CASCADE, related_name="sets"
     )
@@ -270,13 +533,30 @@ class Set(DjangoDB.Model):
     created_at = DjangoDB.DateTimeField(auto_now_add=True)
     updated_at = DjangoDB.DateTimeField(auto_now=True)
 
+    IMAGE_FIELDS = ("cover",)
+
     def __str__(self):
         return self.name
 
 
-class Player(DjangoDB.Model):
+class Player(HasRenditions):
     sounds = DjangoDB.ManyToManyField(Sound, blank=True)
     playing: Prediction = SchemaField(default=Prediction)
+    # The Cosound `playing` hashes to, resolved once when a prediction is
+    # written so votes can reference it without re-hashing the layers.
+    playing_cosound = DjangoDB.ForeignKey(
+        Cosound,
+        on_delete=DjangoDB.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="+",
+    )
+    # When a refresh scheduler instance last claimed this player; the claim
+    # is what keeps several `refresh` instances from predicting it twice.
+    refreshed_at = DjangoDB.DateTimeField(null=True, blank=True, editable=False)
+    # When `update` last wrote a prediction; its age is how stale the venue is.
+    predicted_at = DjangoDB.DateTimeField(null=True, blank=True, editable=False)
     manager = DjangoDB.ForeignKey(Manager, on_delete=DjangoDB.CASCADE)
     token = DjangoDB.CharField(max_length=64, unique=True, editable=False)
     name = DjangoDB.CharField(max_length=255)
@@ -286,6 +566,8 @@ class Player(DjangoDB.Model):
     bio = DjangoDB.TextField(blank=True, max_length=200)
     location = DjangoDB.CharField(max_length=255, blank=True)
 
+    IMAGE_FIELDS = ("photo",)
+
     def __str__(self):
         return self.name
 
@@ -298,9 +580,30 @@ class Player(DjangoDB.Model):
         return list(self.sounds.all())
 
     def update(self, prediction: Prediction) -> None:
+        if prediction != self.playing or self.playing_cosound_id is None:
+            self.playing_cosound = Cosound.get_or_create_from_layers(
+                prediction.as_layers()
+            )
         self.playing = prediction
+        self.predicted_at = datetime.now(timezone.utc)
         self.save()
 
+    def playing_cosound_pk(self) -> int:
+        """Pk of the Cosound for `playing`, resolved and stored on first use.
+
+        `update` fills it in whenever the predictor writes; this covers a player
+        whose prediction predates the field or was set without `update`.
+        """
+        if self.playing_cosound_id is None:
+            self.playing_cosound = Cosound.get_or_create_from_layers(
+                self.playing.as_layers()
+            )
+            # Only fill a gap: a prediction written meanwhile stays untouched.
+            Player.objects.filter(pk=self.pk, playing_cosound__isnull=True).update(
+                playing_cosound=self.playing_cosound
+            )
+        return self.playing_cosound_id
+
     def announce(self, prediction: Prediction) -> None:
         print(f"New Prediction for \033[1m{self.name}\033[22m:")
         print(prediction.summary())
@@ -1,10 +1,15 @@
 import random
 from collections import Counter, defaultdict
 
+import numpy as np
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import prefetch_related_objects
 from django.tasks import task
+from taggit.models import TaggedItem
 
-from core.models import Player, Prediction, Sound
-from vote.models import Vote
+from core.models import Listener, Player, Prediction, Sound
+from vote.models import ListenerTagRollup, RollupWatermark, Vote
+from vote.rollups import WATERMARK, cosound_tags
 
 
 def _predict_for_player(player_id: int) -> int:
@@ -18,6 +23,7 @@ def _predict_for_player(player_id: int) -> int:
         Vote.get_listeners(recent_votes),
         key=lambda listener: listener.pk,
     )
+    prefetch_related_objects(active_listeners, "collection__tags")
     next_prediction = Prediction.new()
     selected_sound_ids: set[int] = set()
 
@@ -28,7 +34,7 @@ def _predict_for_player(player_id: int) -> int:
 
     for listener in active_listeners:
         tag_counts: Counter[int] = Counter()
-        for sound in listener.collection.prefetch_related("tags"):
+        for sound in listener.collection.all():
             tag_counts.update(tag.pk for tag in sound.tags.all())
 
         if not tag_counts:
@@ -70,3 +76,148 @@ def random_predictor(
     **kwargs,
 ) -> int:
     return _predict_for_player(player_id)
+
+
+# Scoring predictor: every listener in the room against every library sound
+# at once, as tag-space matrices.
+#
+#   listener × tag  affinity = share of the listener's collection carrying
+#                   each tag + VOTE_WEIGHT × their net (up - down) votes on
+#                   cosounds carrying it, from ListenerTagRollup plus any
+#                   votes the rollups have not reached yet
+#   sound × tag     1 where the library sound has the tag, rows scaled by
+#                   1/sqrt(tags) so heavily tagged sounds don't win by volume
+#
+# One matrix product gives every listener's score for every sound. Layers are
+# then picked greedily for the room as a whole: each pick is the sound that
+# most raises the sum over listeners of their best-liked layer so far, so a
+# second layer only lands if it serves someone the first did not. A layer's
+# gain is its marginal value relative to the first pick.
+
+VOTE_WEIGHT = 0.5
+MAX_LAYERS = 6
+MIN_GAIN = 0.25
+
+
+def _library_and_collection_tags(player, listener_ids):
+    """(library sound ids, {sound_id: tag ids}, [(listener_id, sound_id)])."""
+    library_ids = sorted(player.sounds.values_list("pk", flat=True))
+    collected = list(
+        Listener.collection.through.objects.filter(
+            listener_id__in=listener_ids
+        ).values_list("listener_id", "sound_id")
+    )
+    tags_by_sound: dict[int, list[int]] = defaultdict(list)
+    for sound_id, tag_id in TaggedItem.objects.filter(
+        content_type=ContentType.objects.get_for_model(Sound),
+        object_id__in={*library_ids, *(sound_id for _, sound_id in collected)},
+    ).values_list("object_id", "tag_id"):
+        tags_by_sound[sound_id].append(tag_id)
+    return library_ids, tags_by_sound, collected
+
+
+def _unrolled_vote_tags(votes):
+    """[(listener_id, +1 or -1, tag ids)] for votes newer than the rollups."""
+    watermark = (
+        RollupWatermark.objects.filter(name=WATERMARK)
+        .values_list("last_vote_id", flat=True)
+        .first()
+    ) or 0
+    votes = [vote for vote in votes if vote.pk > watermark]
+    if not votes:
+        return []
+    tags = cosound_tags({vote.cosound_id for vote in votes})
+    # As the rollups count them: submit_vote stores a downvote as 0.
+    return [
+        (vote.voter_id, 1 if vote.value > 0 else -1, tags.get(vote.cosound_id, ()))
+        for vote in votes
+    ]
+
+
+def score_sounds(affinity, sound_tags, k=MAX_LAYERS):
+    """Pick up to `k` diverse sounds; return [(sound_index, gain)].
+
+    `affinity` is listeners × tags, `sound_tags` is sounds × tags.
+    """
+    if not affinity.size or not sound_tags.size:
+        return []
+    tag_counts = sound_tags.sum(axis=1, keepdims=True)
+    sound_tags = sound_tags / np.sqrt(np.maximum(tag_counts, 1))
+    scores = affinity @ sound_tags.T  # listeners × sounds
+
+    picks: list[tuple[int, float]] = []
+    best = np.zeros(scores.shape[0])
+    available = np.ones(scores.shape[1], dtype=bool)
+    first_gain = None
+    for _ in range(min(k, scores.shape[1])):
+        marginal = np.maximum(scores - best[:, None], 0).sum(axis=0)
+        marginal[~available] = 0
+        index = int(marginal.argmax())
+        if marginal[index] <= 0:
+            break
+        first_gain = first_gain or marginal[index]
+        gain = max(MIN_GAIN, min(1.0, float(marginal[index] / first_gain)))
+        picks.append((index, round(gain * 20) / 20))
+        best = np.maximum(best, scores[:, index])
+        available[index] = False
+    return picks
+
+
+def _score_for_player(player_id: int, k: int = MAX_LAYERS) -> int:
+    player = Player.objects.get(pk=player_id)
+    recent_votes = Vote.recent(player, minutes=5)
+    if not recent_votes:
+        player.update(Prediction.new())
+        return 0
+
+    listener_ids = sorted({vote.voter_id for vote in recent_votes})
+    library_ids, tags_by_sound, collected = _library_and_collection_tags(
+        player, listener_ids
+    )
+    tag_ids = sorted({tag_id for tags in tags_by_sound.values() for tag_id in tags})
+    if not library_ids or not tag_ids:
+        return 0
+    tag_index = {tag_id: i for i, tag_id in enumerate(tag_ids)}
+    listener_index = {listener_id: i for i, listener_id in enumerate(listener_ids)}
+
+    sound_tags = np.zeros((len(library_ids), len(tag_ids)))
+    for row, sound_id in enumerate(library_ids):
+        sound_tags[row, [tag_index[t] for t in tags_by_sound[sound_id]]] = 1
+
+    collection = np.zeros((len(listener_ids), len(tag_ids)))
+    for listener_id, sound_id in collected:
+        for tag_id in tags_by_sound[sound_id]:
+            collection[listener_index[listener_id], tag_index[tag_id]] += 1
+    collection /= np.maximum(collection.sum(axis=1, keepdims=True), 1)
+
+    votes = np.zeros((len(listener_ids), len(tag_ids)))
+    for listener_id, tags in ListenerTagRollup.scores(listener_ids).items():
+        for tag_id, net in tags.items():
+            if tag_id in tag_index:
+                votes[listener_index[listener_id], tag_index[tag_id]] += net
+    for listener_id, value, tags in _unrolled_vote_tags(recent_votes):
+        for tag_id in tags:
+            if tag_id in tag_index:
+                votes[listener_index[listener_id], tag_index[tag_id]] += value
+    # Squash to (-1, 1) per listener so a prolific voter counts once.
+    votes /= np.abs(votes).sum(axis=1, keepdims=True) + 1
+
+    picks = score_sounds(collection + VOTE_WEIGHT * votes, sound_tags, k)
+    if not picks:
+        return 0
+
+    next_prediction = Prediction.new()
+    for index, gain in picks:
+        next_prediction.add_layer(sound_id=library_ids[index], gain=gain)
+    player.update(next_prediction)
+    player.announce(next_prediction)
+    return 1
+
+
+@task
+def scoring_predictor(
+    player_id: int,
+    *args,
+    **kwargs,
+) -> int:
+    return _score_for_player(player_id)
@@ -0,0 +1,87 @@
+"""Resized WebP and AVIF copies of uploaded images.
+
+Uploads are served as they came in: a phone photo of a venue or a full-size
+album cover can be several megabytes, shown in a 40px thumbnail. Models that
+mix in core.models.HasRenditions queue core.tasks.render_images when one of
+their IMAGE_FIELDS changes; it writes a copy of the image at each of WIDTHS
+narrower than the original, in each of FORMATS, next to the originals under
+renditions/, and records on the row which upload it rendered.
+
+url() picks the smallest rendition at least as wide as asked for. Until the
+task has run (or when the original is the closer fit) it returns the
+original's URL, so serializers never wait on the task or ask the storage
+what exists. Serializers hand out the WebP URL, which every browser we
+support decodes, and the AVIF one alongside for c-core-image's <picture>.
+
+Replacing an image leaves its old renditions behind, as it does the old
+original.
+"""
+
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# Rendered widths, in pixels: list thumbnails, carousel cards, and covers.
+THUMBNAIL_WIDTH = 160
+CARD_WIDTH = 640
+COVER_WIDTH = 1280
+WIDTHS = (THUMBNAIL_WIDTH, CARD_WIDTH, COVER_WIDTH)
+
+# format -> Pillow save options.
+FORMATS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 6},
+    "avif": {"format": "AVIF", "quality": 55},
+}
+
+
+def rendition_name(name, width, fmt):
+    """Storage name of the `width` pixel `fmt` copy of the image `name`."""
+    stem, _ = posixpath.splitext(name)
+    return f"renditions/{stem}-{width}w.{fmt}"
+
+
+def render(image):
+    """Write the renditions of an image field file; return the widths written.
+
+    Raises whatever Pillow does for a file it can't read.
+    """
+    with image.open("rb") as f:
+        original = ImageOps.exif_transpose(Image.open(f))
+        original.load()
+    has_alpha = original.mode in ("RGBA", "LA", "PA") or "transparency" in original.info
+    original = original.convert("RGBA" if has_alpha else "RGB")
+
+    widths = [width for width in WIDTHS if width < original.width]
+    for width in widths:
+        height = max(1, round(original.height * width / original.width))
+        resized = original.resize((width, height), Image.Resampling.LANCZOS)
+        for fmt, options in FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, **options)
+            name = rendition_name(image.name, width, fmt)
+            # Keep the name deterministic: url() builds it rather than storing it.
+            if image.storage.exists(name):
+                image.storage.delete(name)
+            image.storage.save(name, ContentFile(buffer.getvalue()))
+    return widths
+
+
+def url(image, rendered, width, fmt="webp", fallback=True):
+    """URL of the image at `width` pixels or more, or "" if there's no image.
+
+    `rendered` is the entry HasRenditions recorded for the field, if any.
+    Where no rendition fits, that's the original's URL, or "" without
+    `fallback` (for a <source> the browser should skip).
+    """
+    if not image:
+        return ""
+    original = image.url if fallback else ""
+    if not rendered or rendered.get("source") != image.name:
+        return original
+    fitting = [w for w in rendered["widths"] if w >= width]
+    if not fitting:
+        # Every rendition is narrower than asked for; the original is closer.
+        return original
+    return image.storage.url(rendition_name(image.name, min(fitting), fmt))
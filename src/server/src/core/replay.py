@@ -0,0 +1,256 @@
+"""Offline predictor replay: run predictors against a vote stream, off-venue.
+
+A stream is a time-ordered list of ReplayVote, either recorded (a player's
+Vote rows, plus archived ones) or synthetic. A simulated clock steps through
+it one refresh interval at a time; at each tick the votes of the predictor
+window before the tick are written for a scratch copy of the player, shifted
+so they look that recent, and every predictor runs once, inside a savepoint
+that is rolled back afterwards. The whole replay runs in a transaction that
+is rolled back too, so nothing it writes survives.
+
+Per predictor, the report has latency percentiles, queries per prediction,
+how often a prediction was written, mean layers and distinct tags per
+prediction (diversity), and the mean Jaccard overlap of its sound set with
+the first predictor's at the same tick (agreement).
+
+Rollups (ListenerTagRollup) are read as they are now, so a recorded replay
+lets predictors that use them see votes cast after the simulated tick.
+"""
+
+import contextlib
+import io
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.models import Cosound, Listener, Player, Sound
+from core.synthetic import backdate
+from vote.archive import iter_archived_votes
+from vote.models import Vote, VoteArchive
+
+# What Vote.recent looks back over in the predictors.
+WINDOW = timedelta(minutes=5)
+STEP = timedelta(seconds=30)
+
+
+@dataclass(frozen=True)
+class ReplayVote:
+    voter_id: int
+    cosound_id: int
+    value: int
+    created_at: datetime
+
+
+@dataclass
+class PredictorRun:
+    name: str
+    latencies: list[float] = field(default_factory=list)  # seconds
+    queries: list[int] = field(default_factory=list)
+    predictions: list[frozenset[int]] = field(default_factory=list)
+    written: int = 0
+
+    def summary(self, tags_by_sound, baseline=None):
+        latencies_ms = np.array(self.latencies) * 1000
+        p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+        layers = [len(sounds) for sounds in self.predictions if sounds]
+        tags = [
+            len(set().union(*(tags_by_sound.get(s, set()) for s in sounds)))
+            for sounds in self.predictions
+            if sounds
+        ]
+        summary = {
+            "predictor": self.name,
+            "ticks": len(self.latencies),
+            "written": self.written,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": float(latencies_ms.max()),
+            "queries": float(np.mean(self.queries)),
+            "layers": float(np.mean(layers)) if layers else 0.0,
+            "tags": float(np.mean(tags)) if tags else 0.0,
+            "agreement": None,
+        }
+        if baseline is not None:
+            summary["agreement"] = float(
+                np.mean(
+                    [
+                        _jaccard(ours, theirs)
+                        for ours, theirs in zip(self.predictions, baseline.predictions)
+                    ]
+                )
+            )
+        return summary
+
+
+def _jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def recorded_votes(player, since, until=None):
+    """The player's votes cast in [since, until), archived ones included."""
+    until = until or timezone.now()
+    votes = [
+        ReplayVote(*row)
+        for row in Vote.objects.filter(
+            player=player, created_at__gte=since, created_at__lt=until
+        ).values_list("voter_id", "cosound_id", "value", "created_at")
+    ]
+    for vote_archive in VoteArchive.objects.filter(
+        day__gte=since.date(), day__lte=until.date()
+    ):
+        votes.extend(
+            ReplayVote(
+                vote["voter_id"], vote["cosound_id"], vote["value"], vote["created_at"]
+            )
+            for vote in iter_archived_votes(vote_archive)
+            if vote["player_id"] == player.pk and since <= vote["created_at"] < until
+        )
+    # Voters or cosounds deleted since can't be replayed.
+    listeners = set(
+        Listener.objects.filter(
+            pk__in={vote.voter_id for vote in votes}
+        ).values_list("pk", flat=True)
+    )
+    cosounds = set(
+        Cosound.objects.filter(
+            pk__in={vote.cosound_id for vote in votes}
+        ).values_list("pk", flat=True)
+    )
+    return sorted(
+        (v for v in votes if v.voter_id in listeners and v.cosound_id in cosounds),
+        key=lambda vote: vote.created_at,
+    )
+
+
+def synthetic_votes(player, count, span, listeners=50, upvote_rate=0.7, seed=None):
+    """`count` votes over `span` from up to `listeners` collecting listeners.
+
+    Each vote is for a cosound of one to three of the player's sounds.
+    """
+    rng = random.Random(seed)
+    library = list(player.sounds.order_by("pk").values_list("pk", flat=True))
+    collectors = list(
+        Listener.objects.filter(collection__isnull=False)
+        .distinct()
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+    voters = rng.sample(collectors, min(listeners, len(collectors)))
+    if not library or not voters:
+        return []
+    most = min(3, len(library))
+    layer_sets = [
+        [(sound_id, 1.0) for sound_id in rng.sample(library, rng.randint(1, most))]
+        for _ in range(min(count, 20))
+    ]
+    cosounds = [c.pk for c in Cosound.bulk_get_or_create_from_layers(layer_sets)]
+    start = timezone.now() - span
+    return sorted(
+        (
+            ReplayVote(
+                rng.choice(voters),
+                rng.choice(cosounds),
+                Vote.UPVOTE if rng.random() < upvote_rate else Vote.DOWNVOTE,
+                start + span * rng.random(),
+            )
+            for _ in range(count)
+        ),
+        key=lambda vote: vote.created_at,
+    )
+
+
+def _scratch_player(player):
+    scratch = Player.objects.create(
+        manager_id=player.manager_id, name=f"{player.name} (replay)"
+    )
+    scratch.sounds.set(player.sounds.all())
+    return scratch
+
+
+def _write_window(scratch, votes, tick):
+    """Insert `votes` for `scratch` as if the clock read `tick` now."""
+    offset = timezone.now() - tick
+    created = Vote.objects.bulk_create(
+        [
+            Vote(
+                voter_id=vote.voter_id,
+                player=scratch,
+                cosound_id=vote.cosound_id,
+                value=vote.value,
+            )
+            for vote in votes
+        ]
+    )
+    backdate(Vote, created, [vote.created_at + offset for vote in votes])
+
+
+def _call(predictor, player_id):
+    # Task objects run synchronously through .call(); plain functions as-is.
+    return getattr(predictor, "call", predictor)(player_id)
+
+
+def replay(player, votes, predictors, step=STEP, limit=None, seed=None):
+    """Replay `votes` against {name: predictor}; return the summary dicts."""
+    runs = {name: PredictorRun(name) for name in predictors}
+    if not votes:
+        return []
+    tags_by_sound = defaultdict(set)
+    for sound in Sound.objects.filter(player=player).prefetch_related("tags"):
+        tags_by_sound[sound.pk] = {tag.name for tag in sound.tags.all()}
+
+    with transaction.atomic():
+        scratch = _scratch_player(player)
+        tick = votes[0].created_at + step
+        end = votes[-1].created_at + WINDOW
+        start = 0
+        ticks = 0
+        while tick <= end and (limit is None or ticks < limit):
+            # Strictly inside the window: a vote exactly WINDOW old would
+            # have aged out by the time the predictor reads it.
+            while start < len(votes) and votes[start].created_at <= tick - WINDOW:
+                start += 1
+            window = [v for v in votes[start:] if v.created_at < tick]
+            if window:
+                ticks += 1
+                for name, predictor in predictors.items():
+                    _run_tick(runs[name], predictor, scratch, window, tick, seed)
+            tick += step
+        transaction.set_rollback(True)
+
+    first = next(iter(runs.values()))
+    return [
+        run.summary(tags_by_sound, baseline=None if run is first else first)
+        for run in runs.values()
+    ]
+
+
+def _run_tick(run, predictor, scratch, window, tick, seed):
+    savepoint = transaction.savepoint()
+    try:
+        _write_window(scratch, window, tick)
+        if seed is not None:
+            random.seed(seed)
+            np.random.seed(seed)
+        # Predictors announce to stdout; keep the report readable.
+        with CaptureQueriesContext(connection) as queries, contextlib.redirect_stdout(
+            io.StringIO()
+        ):
+            began = time.perf_counter()
+            written = _call(predictor, scratch.pk)
+            run.latencies.append(time.perf_counter() - began)
+        run.queries.append(len(queries))
+        run.written += bool(written)
+        playing = Player.objects.only("playing").get(pk=scratch.pk).playing
+        run.predictions.append(frozenset(layer.sound_id for layer in playing.layers))
+    finally:
+        transaction.savepoint_rollback(savepoint)
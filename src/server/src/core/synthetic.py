@@ -0,0 +1,336 @@
+"""Synthetic catalogue, venues and audience for load and predictor testing.
+
+generate() fills the database with realistic volumes of artists, sets,
+tagged and embedded sounds, players with libraries, listeners with
+collections, votes spread over the past days and saved sound mixes. Tastes
+are correlated rather than uniform: every listener favours a couple of
+tags, collects mostly sounds carrying them and upvotes cosounds that share
+them, so predictors have signal to find.
+
+Everything is written with bulk_create in batches and is marked so purge()
+can remove it again: users under SYNTHETIC_EMAIL_DOMAIN (taking listeners,
+managers, players, votes and mixes with them), artists named
+"Synthetic ..." and sounds stored under synthetic/.
+"""
+
+import random
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Case, When
+from django.utils import timezone
+from taggit.models import Tag, TaggedItem
+
+from core.classify import SOUND_TAGS
+from core.models import (
+    Artist,
+    Cosound,
+    Listener,
+    Manager,
+    Player,
+    Prediction,
+    Set,
+    Sound,
+    SoundLayer,
+    User,
+)
+from core.utils import _get_sound_dimension
+from mixer.models import SoundMix
+from vote.models import Vote
+
+BATCH_SIZE = 1000
+SYNTHETIC_EMAIL_DOMAIN = "synthetic.cosound.invalid"
+SYNTHETIC_FILE_PREFIX = "synthetic/"
+TAGS = [
+    *SOUND_TAGS,
+    "birdsong",
+    "forest",
+    "cafe",
+    "city",
+    "train",
+    "drone",
+    "piano",
+    "strings",
+    "lofi",
+    "chimes",
+    "brown_noise",
+    "river",
+    "night",
+    "market",
+    "choir",
+]
+
+
+@dataclass
+class Scale:
+    artists: int = 50
+    sounds: int = 1000
+    players: int = 20
+    library: int = 100  # sounds per player
+    listeners: int = 2000
+    collection: int = 20  # sounds per listener
+    votes: int = 50000
+    mixes: int = 5000
+    days: int = 30  # votes are spread over this many days
+
+
+def backdate(model, rows, stamps, field="created_at"):
+    """Set `field` per row; bulk_create lets auto_now_add stamp them "now"."""
+    for start in range(0, len(rows), BATCH_SIZE):
+        chunk = rows[start : start + BATCH_SIZE]
+        model.objects.filter(pk__in=[row.pk for row in chunk]).update(
+            **{
+                field: Case(
+                    *(
+                        When(pk=row.pk, then=stamp)
+                        for row, stamp in zip(chunk, stamps[start:])
+                    )
+                )
+            }
+        )
+
+
+def _users(prefix, count):
+    password = make_password(None)
+    return User.objects.bulk_create(
+        [
+            User(
+                username=f"synthetic-{prefix}-{n}",
+                email=f"synthetic-{prefix}-{n}@{SYNTHETIC_EMAIL_DOMAIN}",
+                password=password,
+            )
+            for n in range(count)
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def _catalogue(scale, rng, tags):
+    artists = Artist.objects.bulk_create(
+        [Artist(name=f"Synthetic Artist {n}") for n in range(scale.artists)],
+        batch_size=BATCH_SIZE,
+    )
+    sets = Set.objects.bulk_create(
+        [
+            Set(artist=artist, name=f"{artist.name} Set {n}")
+            for artist in artists
+            for n in range(rng.randint(0, 2))
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    sets_by_artist = {}
+    for sound_set in sets:
+        sets_by_artist.setdefault(sound_set.artist_id, []).append(sound_set)
+
+    dimension = _get_sound_dimension()
+    embeddings = np.random.default_rng(rng.getrandbits(64)).random(
+        (scale.sounds, dimension)
+    )
+    sounds, sound_tags = [], []
+    for n in range(scale.sounds):
+        artist = rng.choice(artists)
+        sound_set = rng.choice([None, *sets_by_artist.get(artist.pk, [])])
+        sounds.append(
+            Sound(
+                file=f"{SYNTHETIC_FILE_PREFIX}sound-{n}.mp3",
+                title=f"Synthetic Sound {n}",
+                artist=artist,
+                set=sound_set,
+                flavor=f"Synthetic sound {n}.",
+                embeddings=embeddings[n].tolist(),
+                embedding_status=Sound.EmbeddingStatus.READY,
+            )
+        )
+        sound_tags.append(rng.sample(tags, rng.randint(1, 4)))
+    sounds = Sound.objects.bulk_create(sounds, batch_size=BATCH_SIZE)
+
+    content_type = ContentType.objects.get_for_model(Sound)
+    TaggedItem.objects.bulk_create(
+        [
+            TaggedItem(content_type=content_type, object_id=sound.pk, tag=tag)
+            for sound, chosen in zip(sounds, sound_tags)
+            for tag in chosen
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    return artists, sounds, {
+        sound.pk: {tag.pk for tag in chosen} for sound, chosen in zip(sounds, sound_tags)
+    }
+
+
+def _players(scale, rng, sounds):
+    (manager_user,) = _users("manager", 1)
+    manager = Manager.objects.create(user=manager_user, name="Synthetic Venues")
+    players = []
+    for n in range(scale.players):
+        player = Player(manager=manager, name=f"Synthetic Player {n}")
+        player.save()  # generates the token
+        players.append(player)
+    library_size = min(scale.library, len(sounds))
+    Player.sounds.through.objects.bulk_create(
+        [
+            Player.sounds.through(player_id=player.pk, sound_id=sound.pk)
+            for player in players
+            for sound in rng.sample(sounds, library_size)
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    return players
+
+
+def _listeners(scale, rng, sounds, tags_by_sound, tags):
+    users = _users("listener", scale.listeners)
+    listeners = Listener.objects.bulk_create(
+        [Listener(user=user) for user in users], batch_size=BATCH_SIZE
+    )
+    sounds_by_tag = {}
+    for sound in sounds:
+        for tag_id in tags_by_sound[sound.pk]:
+            sounds_by_tag.setdefault(tag_id, []).append(sound)
+
+    favourites, collected = {}, []
+    for listener in listeners:
+        favourite = {tag.pk for tag in rng.sample(tags, rng.randint(1, 2))}
+        favourites[listener.pk] = favourite
+        liked = [s for t in favourite for s in sounds_by_tag.get(t, [])]
+        picks = set()
+        for _ in range(scale.collection):
+            # Mostly favourites, some discovery.
+            pool = liked if liked and rng.random() < 0.8 else sounds
+            picks.add(rng.choice(pool).pk)
+        collected.extend((listener.pk, sound_id) for sound_id in picks)
+    Listener.collection.through.objects.bulk_create(
+        [
+            Listener.collection.through(listener_id=listener_id, sound_id=sound_id)
+            for listener_id, sound_id in collected
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    return listeners, favourites
+
+
+def _random_layers(rng, sound_ids, most=4, gains=(0.5, 0.75, 1.0)):
+    picked = rng.sample(sound_ids, rng.randint(1, min(most, len(sound_ids))))
+    return [(sound_id, rng.choice(gains)) for sound_id in picked]
+
+
+def _votes(scale, rng, players, listeners, favourites, tags_by_sound):
+    libraries = defaultdict(list)
+    for player_id, sound_id in Player.sounds.through.objects.filter(
+        player__in=players
+    ).values_list("player_id", "sound_id"):
+        libraries[player_id].append(sound_id)
+    players = [player for player in players if libraries[player.pk]]
+    if not players or not listeners:
+        return 0
+    cosounds_by_player = {
+        player.pk: Cosound.bulk_get_or_create_from_layers(
+            [_random_layers(rng, libraries[player.pk]) for _ in range(20)]
+        )
+        for player in players
+    }
+
+    layers = defaultdict(list)
+    for layer in SoundLayer.objects.filter(
+        mix__in={c for cosounds in cosounds_by_player.values() for c in cosounds}
+    ).order_by("sound_id"):
+        layers[layer.mix_id].append(layer)
+    layer_tags = {
+        cosound_id: set().union(*(tags_by_sound[layer.sound_id] for layer in mix))
+        for cosound_id, mix in layers.items()
+    }
+
+    # Each venue has a regular crowd.
+    crowd_size = min(len(listeners), 200)
+    crowds = {player.pk: rng.sample(listeners, crowd_size) for player in players}
+    now = timezone.now()
+    span = timedelta(days=scale.days).total_seconds()
+    votes, stamps = [], []
+    for _ in range(scale.votes):
+        player = rng.choice(players)
+        voter = rng.choice(crowds[player.pk])
+        cosound = rng.choice(cosounds_by_player[player.pk])
+        likes = bool(favourites[voter.pk] & layer_tags[cosound.pk])
+        upvote = rng.random() < (0.85 if likes else 0.3)
+        value = Vote.UPVOTE if upvote else Vote.DOWNVOTE
+        votes.append(Vote(voter=voter, player=player, cosound=cosound, value=value))
+        stamps.append(now - timedelta(seconds=rng.random() * span))
+    votes = Vote.objects.bulk_create(votes, batch_size=BATCH_SIZE)
+    backdate(Vote, votes, stamps)
+
+    for player in players:
+        cosound = cosounds_by_player[player.pk][0]
+        player.playing = Prediction.new()
+        for layer in layers[cosound.pk]:
+            player.playing.add_layer(layer.sound_id, gain=float(layer.gain))
+        player.playing_cosound = cosound
+    Player.objects.bulk_update(players, ["playing", "playing_cosound"])
+    return len(votes)
+
+
+def _mixes(scale, rng, listeners):
+    if not listeners or not scale.mixes:
+        return 0
+    collections = {}
+    for listener_id, sound_id in Listener.collection.through.objects.filter(
+        listener__in=listeners
+    ).values_list("listener_id", "sound_id"):
+        collections.setdefault(listener_id, []).append(sound_id)
+    creators = [listener for listener in listeners if collections.get(listener.pk)]
+    if not creators:
+        return 0
+    mixes, seen = [], set()
+    chosen = [rng.choice(creators) for _ in range(scale.mixes)]
+    cosounds = Cosound.bulk_get_or_create_from_layers(
+        [
+            _random_layers(rng, collections[listener.pk], most=3, gains=(1.0,))
+            for listener in chosen
+        ]
+    )
+    for n, (listener, cosound) in enumerate(zip(chosen, cosounds)):
+        if (listener.user_id, cosound.pk) in seen:
+            continue
+        seen.add((listener.user_id, cosound.pk))
+        mixes.append(
+            SoundMix(creator_id=listener.user_id, cosound=cosound, title=f"Mix {n}")
+        )
+    return len(SoundMix.objects.bulk_create(mixes, batch_size=BATCH_SIZE))
+
+
+def generate(scale=None, seed=None):
+    """Generate a synthetic dataset; return {model name: rows created}."""
+    scale = scale or Scale()
+    rng = random.Random(seed)
+    with transaction.atomic():
+        tags = [Tag.objects.get_or_create(name=name)[0] for name in TAGS]
+        artists, sounds, tags_by_sound = _catalogue(scale, rng, tags)
+        players = _players(scale, rng, sounds)
+        listeners, favourites = _listeners(scale, rng, sounds, tags_by_sound, tags)
+        votes = _votes(scale, rng, players, listeners, favourites, tags_by_sound)
+        mixes = _mixes(scale, rng, listeners)
+    return {
+        "artists": len(artists),
+        "sounds": len(sounds),
+        "players": len(players),
+        "listeners": len(listeners),
+        "votes": votes,
+        "mixes": mixes,
+    }
+
+
+def purge():
+    """Delete everything generate() created; return rows deleted per model."""
+    deleted = Counter()
+    with transaction.atomic():
+        for queryset in (
+            Sound.objects.filter(file__startswith=SYNTHETIC_FILE_PREFIX),
+            Artist.objects.filter(name__startswith="Synthetic "),
+            User.objects.filter(email__endswith=f"@{SYNTHETIC_EMAIL_DOMAIN}"),
+        ):
+            deleted.update(queryset.delete()[1])
+    return dict(deleted)
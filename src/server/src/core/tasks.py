@@ -1,9 +1,41 @@
+import logging
+from datetime import timedelta
+
+from django.apps import apps
 from django.core.mail import EmailMultiAlternatives
+from django.utils import timezone
 from django_tasks import task
 
+from core.models import Sound, SoundImport
+from core.renditions import render
+from core.transcoding import VERSION as TRANSCODE_VERSION
+from core.transcoding import TooLong, transcode
+from core.utils import _get_sound_classifier
+
+logger = logging.getLogger(__name__)
+
+# A classifier failure is retried this many times in total, backing off
+# EMBEDDING_RETRY_DELAY * attempt seconds between tries, before the sound is
+# marked failed.
+EMBEDDING_MAX_ATTEMPTS = 3
+EMBEDDING_RETRY_DELAY = 30
+
+# Same for a failed email send, with short delays: a login code is only worth
+# a few minutes, and the listener is waiting for it.
+EMAIL_MAX_ATTEMPTS = 3
+EMAIL_RETRY_DELAY = 5
+
+
+def _enqueue_retry(task, delay, *args, **kwargs):
+    """Enqueue `task` again, `delay` seconds out where the backend can defer."""
+    if task.get_backend().supports_defer:
+        task = task.using(run_after=timezone.now() + timedelta(seconds=delay))
+    task.enqueue(*args, **kwargs)
+
 
 @task()
-def send_auth_email_task(subject, body, to_email, html_content=None):
+def send_auth_email_task(subject, body, to_email, html_content=None, attempt=1):
+    """Send a login-code email off the request, retrying failed deliveries."""
     email = EmailMultiAlternatives(
         subject=subject,
         body=body,
@@ -12,4 +44,175 @@ def send_auth_email_task(subject, body, to_email, html_content=None):
     )
     if html_content:
         email.attach_alternative(html_content, "text/html")
-    email.send()
+    try:
+        email.send()
+    except Exception:
+        if attempt < EMAIL_MAX_ATTEMPTS:
+            logger.warning(
+                "Sending auth email failed (attempt %s), retrying",
+                attempt,
+                exc_info=True,
+            )
+            _enqueue_retry(
+                send_auth_email_task,
+                EMAIL_RETRY_DELAY * attempt,
+                subject,
+                body,
+                to_email,
+                html_content=html_content,
+                attempt=attempt + 1,
+            )
+        raise
+
+
+@task()
+def embed_sound(sound_id, force=False, attempt=1):
+    """Run the configured sound classifier and store the sound's embeddings.
+
+    Skips sounds that already have embeddings unless `force` is set, so
+    enqueueing the same sound twice is harmless.
+    """
+    sounds = Sound.objects.filter(pk=sound_id)
+    if not force:
+        sounds = sounds.filter(embeddings__isnull=True)
+    if not sounds.exists():
+        return False
+
+    classifier = _get_sound_classifier()
+    try:
+        embeddings = classifier(sound_id)
+    except Exception:
+        if attempt < EMBEDDING_MAX_ATTEMPTS:
+            logger.warning(
+                "Embedding sound %s failed (attempt %s), retrying",
+                sound_id,
+                attempt,
+                exc_info=True,
+            )
+            _enqueue_retry(
+                embed_sound,
+                EMBEDDING_RETRY_DELAY * attempt,
+                sound_id,
+                force=force,
+                attempt=attempt + 1,
+            )
+        else:
+            sounds.update(embedding_status=Sound.EmbeddingStatus.FAILED)
+        raise
+
+    store_embeddings(sounds, embeddings)
+    return True
+
+
+def store_embeddings(sounds, embeddings):
+    # update() rather than save(): save() would queue embed_sound again.
+    return sounds.update(
+        embeddings=embeddings,
+        embedding_status=Sound.EmbeddingStatus.READY,
+        updated_at=timezone.now(),
+    )
+
+
+@task()
+def import_sounds(sound_import_id):
+    """Bulk-import a catalogue file; see core.importing."""
+    from core.importing import run_sound_import  # imports this module
+
+    sound_import = SoundImport.objects.get(pk=sound_import_id)
+    try:
+        progress = run_sound_import(sound_import)
+    except Exception:
+        SoundImport.objects.filter(pk=sound_import_id).update(
+            status=SoundImport.Status.FAILED, updated_at=timezone.now()
+        )
+        raise
+    return {
+        "created": progress.created,
+        "updated": progress.updated,
+        "errors": progress.error_count,
+    }
+
+
+@task()
+def export_sounds(name, fmt, pks=None, changelist=None):
+    """Write a catalogue export to storage; returns the stored file name.
+
+    An admin selection arrives as plain data: the selected `pks`, or for
+    "select all" the `changelist` it was made on, {"user": pk, "query": its
+    query string}, which SoundAdmin.changelist_sounds filters again here.
+    Exporting every page of a search so stays a small argument.
+    """
+    from django.contrib import admin
+    from django.contrib.auth import get_user_model
+
+    from core.exporting import export_to_storage
+
+    sounds = None
+    if pks is not None:
+        sounds = Sound.objects.filter(pk__in=pks).order_by("pk")
+    elif changelist is not None:
+        user = get_user_model().objects.get(pk=changelist["user"])
+        sounds = admin.site.get_model_admin(Sound).changelist_sounds(
+            user, changelist["query"]
+        )
+    return export_to_storage(name, fmt, sounds)
+
+
+@task()
+def render_images(model_label, pk):
+    """Write renditions of an instance's changed images; see core.renditions.
+
+    An image Pillow can't read is recorded with no widths, so it's served as
+    uploaded and not retried until it's replaced.
+    """
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return {}
+    rendered = {}
+    for field in instance.stale_renditions():
+        image = getattr(instance, field)
+        try:
+            widths = render(image)
+        except OSError:
+            logger.warning(
+                "Rendering %s %s.%s failed", model_label, pk, field, exc_info=True
+            )
+            widths = []
+        rendered[field] = {"source": image.name, "widths": widths}
+    if rendered:
+        # update() rather than save(): save() would queue this task again.
+        model.objects.filter(pk=pk).update(
+            renditions={**instance.renditions, **rendered}
+        )
+    return rendered
+
+
+@task()
+def transcode_sound(sound_id):
+    """Write a sound's web and player variants and peaks; see core.transcoding.
+
+    Audio soundfile can't decode, or longer than transcoding.MAX_SECONDS, is
+    recorded with no variants, so it's served as uploaded and not retried
+    until the file is replaced.
+    """
+    sound = Sound.objects.only("pk", "file", "variants").filter(pk=sound_id).first()
+    if sound is None or not sound.stale_variants():
+        return {}
+    try:
+        files = transcode(sound.file)
+    except TooLong as e:
+        logger.info("Not transcoding sound %s: %s", sound_id, e)
+        files = {}
+    except RuntimeError:  # soundfile.LibsndfileError
+        logger.warning("Transcoding sound %s failed", sound_id, exc_info=True)
+        files = {}
+    # update() rather than save(): save() would queue this task again.
+    Sound.objects.filter(pk=sound_id).update(
+        variants={
+            "source": sound.file.name,
+            "version": TRANSCODE_VERSION,
+            "files": files,
+        }
+    )
+    return files
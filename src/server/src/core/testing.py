@@ -0,0 +1,175 @@
+"""Shared fixtures for the tests in each app's tests.py.
+
+QueryBudgetTestCase gives every htmx view and API endpoint a fixed ceiling on
+the queries it may run against a catalogue seeded at venue scale. A budget is
+a plain number, not "no more than last time": at these volumes a view that
+starts issuing a query per sound, per layer or per vote overshoots it by
+dozens, so an N+1 fails the suite the day it is introduced.
+"""
+
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from taggit.models import Tag, TaggedItem
+
+from core.models import (
+    Artist,
+    Cosound,
+    Listener,
+    Manager,
+    Player,
+    Prediction,
+    Sound,
+    User,
+)
+
+
+class QueryBudgetTestCase(TestCase):
+    ARTISTS = 15
+    TAGS = 12
+    SOUNDS = 120
+    COLLECTION = 60
+    LIBRARY = 40
+    PLAYING_LAYERS = 4
+    MIXES = 15
+    VOTERS = 30
+
+    @classmethod
+    def setUpTestData(cls):
+        # Imported here so core doesn't depend on the apps that build on it.
+        from mixer.models import SoundMix
+        from vote.models import Vote
+
+        cls.user = User.objects.create_user(
+            username="listener", email="listener@example.com"
+        )
+        cls.listener = Listener.objects.create(user=cls.user)
+        cls.artist = Artist.objects.create(user=cls.user, name="Studio artist")
+
+        artists = Artist.objects.bulk_create(
+            [Artist(name=f"Artist {n}") for n in range(cls.ARTISTS)]
+        )
+        tags = Tag.objects.bulk_create(
+            [Tag(name=f"tag-{n}", slug=f"tag-{n}") for n in range(cls.TAGS)]
+        )
+        # bulk_create skips Sound.save, and with it the embedding classifier.
+        cls.sounds = Sound.objects.bulk_create(
+            [
+                Sound(
+                    file=f"sounds/budget-{n}.wav",
+                    title=f"Sound {n}",
+                    artist=artists[n % cls.ARTISTS],
+                    art=f"sound_arts/budget-{n}.png" if n % 2 else None,
+                    embeddings=[0.0] * 5,
+                )
+                for n in range(cls.SOUNDS)
+            ]
+        )
+        sound_type = ContentType.objects.get_for_model(Sound)
+        TaggedItem.objects.bulk_create(
+            [
+                TaggedItem(
+                    tag=tags[(n + offset) % cls.TAGS],
+                    content_type=sound_type,
+                    object_id=sound.pk,
+                )
+                for n, sound in enumerate(cls.sounds)
+                for offset in (0, 5)
+            ]
+        )
+        cls.listener.collection.add(*cls.sounds[: cls.COLLECTION])
+
+        manager = Manager.objects.create(user=cls.user, name="Venue")
+        playing = Prediction.new()
+        for sound in cls.sounds[: cls.PLAYING_LAYERS]:
+            playing.add_layer(sound.pk, gain=0.5)
+        cls.player = Player.objects.create(
+            manager=manager, name="Venue player", playing=playing
+        )
+        cls.player.sounds.add(*cls.sounds[: cls.LIBRARY])
+
+        cosounds = Cosound.bulk_get_or_create_from_layers(
+            [
+                [(sound.pk, 0.5) for sound in cls.sounds[n : n + 4]]
+                for n in range(cls.MIXES)
+            ]
+        )
+        SoundMix.objects.bulk_create(
+            [
+                SoundMix(creator=cls.user, cosound=cosound, title=f"Mix {n}")
+                for n, cosound in enumerate(cosounds)
+            ]
+        )
+
+        voters = Listener.objects.bulk_create(
+            [
+                Listener(
+                    user=User.objects.create_user(
+                        username=f"voter-{n}", email=f"voter-{n}@example.com"
+                    )
+                )
+                for n in range(cls.VOTERS)
+            ]
+        )
+        Vote.objects.bulk_create(
+            [
+                Vote(
+                    voter=voter,
+                    player=cls.player,
+                    cosound=cosounds[0],
+                    value=Vote.UPVOTE,
+                )
+                for voter in voters
+            ]
+        )
+
+    def assertQueryBudget(self, budget, method, path, data=None, htmx=True, **kwargs):
+        """Request `path` and fail if it runs more than `budget` queries."""
+        headers = kwargs.pop("headers", {})
+        if htmx:
+            headers["HX-Request"] = "true"
+        request = getattr(self.client, method)
+        # The periodic metrics flush lands on whichever request comes due;
+        # it isn't the view's cost.
+        with (
+            patch("config.metrics.registry.maybe_flush"),
+            CaptureQueriesContext(connection) as queries,
+        ):
+            response = request(path, data, headers=headers, **kwargs)
+        self.assertLess(response.status_code, 500)
+        self.assertLessEqual(
+            len(queries),
+            budget,
+            f"{method.upper()} {path} ran {len(queries)} queries "
+            f"(budget {budget}):\n"
+            + "\n".join(query["sql"] for query in queries.captured_queries),
+        )
+        return response
+
+
+class TempMediaMixin:
+    """Local file storage in a temp dir, in place of the S3 bucket."""
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = Path(media.name)
+        settings = self.settings(
+            MEDIA_ROOT=media.name,
+            STORAGES={
+                "default": {
+                    "BACKEND": "django.core.files.storage.FileSystemStorage"
+                },
+                "staticfiles": {
+                    "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+                },
+            },
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
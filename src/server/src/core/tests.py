@@ -1,17 +1,65 @@
 from datetime import timedelta
-from unittest.mock import patch
+import csv
+import json
+from io import BytesIO, StringIO
+from unittest.mock import Mock, patch
 
+from asgiref.sync import async_to_sync
+import numpy as np
+import soundfile
+from PIL import Image
+
+from django.conf import settings
 from django.contrib.auth.models import Permission
 from django.contrib.messages import get_messages
-from django.test import SimpleTestCase, TestCase
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.core.management.base import CommandError
+from django.test import LiveServerTestCase, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from taggit.models import Tag
 
-from core.management.commands.refresh import Command, REFRESH_INTERVAL_SECONDS
-from core.models import Cosound, Listener, Manager, Player, Prediction, Sound, User
-from core.predict import _predict_for_player
-from vote.models import Vote
+from config.cache import TieredDatabaseCache
+from config.metrics import Registry, render
+from config.timing import RequestMetrics, current_metrics
+from core import classify, transcoding, waveforms
+from core.management.commands.refresh import (
+    FAILOVER_INTERVALS,
+    REFRESH_INTERVAL_SECONDS,
+    Command,
+)
+from core.exporting import aexport_lines, export_lines
+from core.importing import run_sound_import
+from core.models import (
+    Artist,
+    Cosound,
+    Listener,
+    Manager,
+    Player,
+    Prediction,
+    Sound,
+    SoundImport,
+    User,
+)
+from core.renditions import CARD_WIDTH, COVER_WIDTH, THUMBNAIL_WIDTH, rendition_name
+from core.predict import _predict_for_player, _score_for_player
+from core.loadtest import run
+from core.replay import synthetic_votes
+from core.synthetic import Scale, generate, purge
+from core.testing import TempMediaMixin
+from core.tasks import (
+    EMAIL_MAX_ATTEMPTS,
+    EMBEDDING_MAX_ATTEMPTS,
+    export_sounds,
+    send_auth_email_task,
+)
+from vote.models import ListenerTagRollup, Vote
+from vote.rollups import roll_up_votes
 
 
 class RefreshSchedulerTests(SimpleTestCase):
@@ -19,11 +67,17 @@ class RefreshSchedulerTests(SimpleTestCase):
         "core.management.commands.refresh.time.sleep",
         side_effect=KeyboardInterrupt,
     )
-    @patch("core.management.commands.refresh.Player.objects.all", return_value=[])
+    @patch.object(Command, "due_players", return_value=[])
+    @patch("core.management.commands.refresh._take_lease", return_value=True)
+    @patch("core.management.commands.refresh.archive_expired_votes")
+    @patch("core.management.commands.refresh.roll_up_votes")
     @patch("core.management.commands.refresh._get_predictor")
     def test_waits_thirty_seconds_between_player_refreshes(
         self,
         _get_predictor,
+        roll_up_votes,
+        archive_expired_votes,
+        _take_lease,
         _players,
         sleep,
     ):
@@ -33,6 +87,77 @@ class RefreshSchedulerTests(SimpleTestCase):
         self.assertEqual(stopped.exception.code, 0)
         self.assertEqual(REFRESH_INTERVAL_SECONDS, 30)
         sleep.assert_called_once_with(30)
+        roll_up_votes.enqueue.assert_called_once_with()
+        archive_expired_votes.enqueue.assert_called_once_with()
+
+
+@patch("core.management.commands.refresh.archive_expired_votes", Mock())
+@patch("core.management.commands.refresh.roll_up_votes")
+@patch("core.management.commands.refresh.time.sleep", side_effect=KeyboardInterrupt)
+class ShardedRefreshSchedulerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @classmethod
+    def setUpTestData(cls):
+        manager = Manager.objects.create(
+            user=User.objects.create_user(username="manager", email="m@example.com"),
+            name="Venue",
+        )
+        cls.players = [
+            Player.objects.create(manager=manager, name=f"Player {n}") for n in range(6)
+        ]
+
+    def run_instance(self, shards, shard):
+        """One scheduler tick; the ids of the players it queued."""
+        with patch("core.management.commands.refresh._get_predictor") as get_predictor:
+            with self.assertRaises(SystemExit):
+                Command().handle(shards=shards, shard=shard)
+        return {
+            call.kwargs["player_id"]
+            for call in get_predictor.return_value.enqueue.call_args_list
+        }
+
+    def shard_of(self, shard):
+        return {p.pk for p in self.players if p.pk % 2 == shard}
+
+    def test_instances_split_players_without_duplicates(self, sleep, roll_up_votes):
+        self.assertEqual(self.run_instance(2, 0), self.shard_of(0))
+        self.assertEqual(self.run_instance(2, 1), self.shard_of(1))
+        # A second tick inside the interval, or a misassigned duplicate
+        # instance, finds nothing left to claim.
+        self.assertEqual(self.run_instance(2, 0), set())
+        self.assertEqual(self.run_instance(1, 0), set())
+
+    def test_a_dead_instances_players_fail_over(self, sleep, roll_up_votes):
+        self.run_instance(2, 0)
+        self.run_instance(2, 1)
+        Player.objects.update(
+            refreshed_at=timezone.now()
+            - timedelta(seconds=REFRESH_INTERVAL_SECONDS * FAILOVER_INTERVALS + 1)
+        )
+        Player.objects.filter(pk__in=self.shard_of(0)).update(refreshed_at=timezone.now())
+
+        # Shard 1 has gone quiet for three intervals; shard 0 takes its players.
+        self.assertEqual(self.run_instance(2, 0), self.shard_of(1))
+
+    def test_loads_only_the_players_it_may_claim(self, sleep, roll_up_votes):
+        now = timezone.now()
+        due = {p.pk for p in Command.due_players(2, 1, now=now, running_since=now)}
+        self.assertEqual(due, self.shard_of(1))
+
+        Player.objects.update(refreshed_at=now)
+        self.assertFalse(Command.due_players(2, 1, now=now, running_since=now))
+
+    def test_one_instance_queues_the_rollups_each_interval(self, sleep, roll_up_votes):
+        self.run_instance(2, 0)
+        self.run_instance(2, 1)
+        roll_up_votes.enqueue.assert_called_once_with()
+
+        # The lease lapses with the interval; then any live instance takes it.
+        cache.delete("refresh:rollups")
+        self.run_instance(2, 1)
+        self.assertEqual(roll_up_votes.enqueue.call_count, 2)
 
 
 class ListenerTestPointAdminTests(TestCase):
@@ -182,7 +307,930 @@ class ListenerTestPointAdminTests(TestCase):
         self.assertSetEqual(set(self.listener.collection.all()), {self.old_sound})
 
 
-class PredictorTests(TestCase):
+class AdminPanelQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from mixer.models import SoundMix
+
+        cls.admin = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="admin-password"
+        )
+        cls.quiet = Listener.objects.create(
+            user=User.objects.create_user(username="quiet", email="quiet@example.com")
+        )
+        cls.busy = Listener.objects.create(
+            user=User.objects.create_user(username="busy", email="busy@example.com")
+        )
+        cls.sounds = Sound.objects.bulk_create(
+            [
+                Sound(file=f"sounds/{n}.wav", title=f"Sound {n:03}", embeddings=[0.0] * 5)
+                for n in range(120)
+            ]
+        )
+        manager = Manager.objects.create(user=cls.admin, name="Venue")
+        cls.player = Player.objects.create(manager=manager, name="Venue player")
+        cls.player.sounds.add(*cls.sounds[:2])
+        cosound = Cosound.objects.create(hashset="hashset", hashid="hashid")
+        for listener, count in ((cls.quiet, 2), (cls.busy, 80)):
+            listener.collection.add(*cls.sounds[:count])
+            Vote.objects.bulk_create(
+                Vote(voter=listener, player=cls.player, cosound=cosound, value=Vote.UPVOTE)
+                for _ in range(count)
+            )
+            SoundMix.objects.bulk_create(
+                SoundMix(creator=listener.user, cosound=cosound, title=f"Mix {n}")
+                for n in range(count)
+            )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def change_page(self, listener, **params):
+        url = reverse("admin:core_listener_change", args=[listener.pk])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_listener_panels_cost_the_same_for_busy_listeners(self):
+        self.change_page(self.quiet)  # warm per-process caches
+        _, quiet_queries = self.change_page(self.quiet)
+        response, busy_queries = self.change_page(self.busy)
+
+        self.assertEqual(busy_queries, quiet_queries)
+        self.assertContains(response, "Page 1 of 4 &middot; 80 total", count=3)
+        self.assertContains(response, "Sound 024")
+        self.assertNotContains(response, "Sound 025")
+
+    def test_panels_page_independently(self):
+        response, _ = self.change_page(self.busy, collection_page=4)
+
+        self.assertContains(response, "Sound 079")
+        self.assertNotContains(response, "Sound 024")
+        self.assertContains(response, "Page 4 of 4 &middot; 80 total")
+        self.assertContains(response, "collection_page=3")
+
+    def test_panels_leave_no_request_on_the_shared_admin(self):
+        from django.contrib import admin
+
+        self.change_page(self.busy, collection_page=4)
+
+        self.assertIsNone(admin.site.get_model_admin(Listener).request)
+
+    def test_player_sound_picker_does_not_list_the_catalogue(self):
+        response = self.client.get(
+            reverse("admin:core_player_change", args=[self.player.pk])
+        )
+
+        self.assertContains(response, "Sound 001")
+        self.assertNotContains(response, "Sound 119")
+
+
+@override_settings(
+    TASKS={"default": {"BACKEND": "django_tasks.backends.immediate.ImmediateBackend"}}
+)
+class SoundEmbeddingTaskTests(TestCase):
+    @staticmethod
+    def create_sound(title, **kwargs):
+        file = f"sounds/{title}.wav"
+        # Already transcoded, so only embed_sound is queued.
+        variants = {"source": file, "version": transcoding.VERSION, "files": {}}
+        return Sound.objects.create(file=file, title=title, variants=variants, **kwargs)
+
+    @patch("core.tasks._get_sound_classifier")
+    def test_upload_is_saved_before_the_classifier_runs(self, get_classifier):
+        classifier = get_classifier.return_value
+        classifier.return_value = [0.1] * 5
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            sound = self.create_sound("upload")
+
+        classifier.assert_not_called()
+        self.assertEqual(sound.embedding_status, Sound.EmbeddingStatus.PENDING)
+
+        for callback in callbacks:
+            callback()
+        classifier.assert_called_once_with(sound.pk)
+        sound.refresh_from_db()
+        self.assertEqual(sound.embedding_status, Sound.EmbeddingStatus.READY)
+        self.assertEqual(list(sound.embeddings), [0.1] * 5)
+
+    @patch("core.tasks._get_sound_classifier")
+    def test_sound_with_embeddings_is_not_queued(self, get_classifier):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            sound = self.create_sound("imported", embeddings=[0.0] * 5)
+
+        self.assertEqual(callbacks, [])
+        self.assertEqual(sound.embedding_status, Sound.EmbeddingStatus.READY)
+        get_classifier.assert_not_called()
+
+    def test_only_a_new_file_queues_another_embedding(self):
+        with self.captureOnCommitCallbacks():  # queued, never run
+            sound = self.create_sound("pending")
+        sound = Sound.objects.get(pk=sound.pk)
+
+        sound.title = "Renamed"
+        with self.captureOnCommitCallbacks() as callbacks:
+            sound.save()
+        self.assertEqual(callbacks, [])
+
+        sound.file = "sounds/replaced.wav"
+        with patch("core.tasks.embed_sound") as embed_sound, patch(
+            "core.tasks.transcode_sound"
+        ) as transcode_sound:
+            with self.captureOnCommitCallbacks(execute=True):
+                sound.save()
+        embed_sound.enqueue.assert_called_once_with(sound.pk, force=False)
+        transcode_sound.enqueue.assert_called_once_with(sound.pk)
+
+    @patch("core.tasks._get_sound_classifier")
+    def test_failing_classifier_is_retried_then_marked_failed(self, get_classifier):
+        classifier = get_classifier.return_value
+        classifier.side_effect = RuntimeError("decoder crashed")
+
+        with (
+            self.assertLogs("django_tasks", "ERROR"),
+            self.assertLogs("core.tasks", "WARNING"),
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            sound = self.create_sound("broken")
+
+        self.assertEqual(classifier.call_count, EMBEDDING_MAX_ATTEMPTS)
+        sound.refresh_from_db()
+        self.assertIsNone(sound.embeddings)
+        self.assertEqual(sound.embedding_status, Sound.EmbeddingStatus.FAILED)
+
+    @patch("core.tasks._get_sound_classifier")
+    def test_backfill_command_embeds_missing_sounds_in_batches(self, get_classifier):
+        get_classifier.return_value.return_value = [0.5] * 5
+        # Queued on commit, which a TestCase never reaches.
+        missing = [self.create_sound(f"missing-{n}") for n in range(3)]
+        failed = self.create_sound("failed")
+        Sound.objects.filter(pk=failed.pk).update(
+            embedding_status=Sound.EmbeddingStatus.FAILED
+        )
+        ready = self.create_sound("ready", embeddings=[0.0] * 5)
+
+        call_command("embed_sounds", "--batch-size", "2", stdout=StringIO())
+
+        self.assertEqual(
+            set(
+                Sound.objects.filter(
+                    embedding_status=Sound.EmbeddingStatus.READY
+                ).values_list("pk", flat=True)
+            ),
+            {sound.pk for sound in missing} | {ready.pk},
+        )
+
+        call_command("embed_sounds", "--failed", stdout=StringIO())
+        failed.refresh_from_db()
+        self.assertEqual(failed.embedding_status, Sound.EmbeddingStatus.READY)
+        ready.refresh_from_db()
+        self.assertEqual(list(ready.embeddings), [0.0] * 5)
+
+
+@override_settings(
+    TASKS={"default": {"BACKEND": "django_tasks.backends.immediate.ImmediateBackend"}}
+)
+class AuthEmailTaskTests(SimpleTestCase):
+    def send(self):
+        send_auth_email_task.enqueue(
+            subject="Your code",
+            body="123456",
+            to_email="listener@example.com",
+            html_content="<b>123456</b>",
+        )
+
+    def test_email_is_sent_with_its_html_part(self):
+        self.send()
+
+        (email,) = mail.outbox
+        self.assertEqual(email.to, ["listener@example.com"])
+        self.assertEqual(email.alternatives[0][0], "<b>123456</b>")
+
+    def test_failed_send_is_retried(self):
+        with (
+            patch(
+                "core.tasks.EmailMultiAlternatives.send",
+                side_effect=[ConnectionError("SES unavailable"), 1],
+            ) as send,
+            self.assertLogs("django_tasks", "ERROR"),
+            self.assertLogs("core.tasks", "WARNING"),
+        ):
+            self.send()
+
+        self.assertEqual(send.call_count, 2)
+
+    def test_retries_stop_after_the_last_attempt(self):
+        with (
+            patch(
+                "core.tasks.EmailMultiAlternatives.send",
+                side_effect=ConnectionError("SES unavailable"),
+            ) as send,
+            self.assertLogs("django_tasks", "ERROR"),
+            self.assertLogs("core.tasks", "WARNING"),
+        ):
+            self.send()
+
+        self.assertEqual(send.call_count, EMAIL_MAX_ATTEMPTS)
+
+
+class AudioFeatureClassifierTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Model tags deliberately omit "wind" and add one Sound doesn't store.
+        model_path = self.media_root / "model.npz"
+        np.savez_compressed(
+            model_path,
+            mean=np.zeros(3, dtype=np.float32),
+            scale=np.ones(3, dtype=np.float32),
+            W=np.eye(3, 4, dtype=np.float32),
+            tags=np.array(["rain", "thunderstorm", "dog", "sea_waves"], dtype=object),
+        )
+        settings = self.settings(COSOUND_SOUND_MODEL=str(model_path))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        classify._load_model.cache_clear()
+        self.addCleanup(classify._load_model.cache_clear)
+        cache.clear()
+
+    def create_sound(self, title, audio):
+        sound = Sound(title=title, embeddings=[0.0] * 5)
+        sound.file.save(f"{title}.wav", ContentFile(audio), save=False)
+        sound.save()
+        return sound
+
+    @patch("core.classify.extract_features")
+    def test_maps_model_tags_onto_the_stored_tag_order(self, extract_features):
+        extract_features.return_value = np.array([0.25, 2.0, -1.0], dtype=np.float32)
+        sound = self.create_sound("storm", b"storm audio")
+
+        embeddings = classify.audio_feature_classifier(sound.pk)
+
+        # rain, sea_waves (unused model column), thunderstorm (clipped to 1),
+        # wind (not in the model), crackling_fire (not in the model).
+        self.assertEqual(embeddings, [0.25, 0.0, 1.0, 0.0, 0.0])
+
+    @patch("core.classify.extract_features")
+    def test_features_are_cached_by_file_content(self, extract_features):
+        extract_features.return_value = np.array([0.5, 0.5, 0.5], dtype=np.float32)
+        first = self.create_sound("first", b"same audio")
+        copy = self.create_sound("copy", b"same audio")
+        other = self.create_sound("other", b"other audio")
+
+        embeddings = classify.audio_feature_batch_classifier(
+            [first.pk, copy.pk], processes=1
+        )
+        self.assertEqual(embeddings[first.pk], embeddings[copy.pk])
+        self.assertEqual(extract_features.call_count, 1)
+
+        classify.audio_feature_classifier(other.pk)
+        classify.audio_feature_classifier(first.pk)
+        self.assertEqual(extract_features.call_count, 2)
+
+
+class SoundImportTests(TempMediaMixin, TestCase):
+    HEADER = "id,title,artist,tags,embeddings,flavor,file"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="admin-password"
+        )
+        cls.artist = Artist.objects.create(name="Known artist")
+        cls.existing = Sound.objects.create(
+            file="sounds/old.wav",
+            title="Old title",
+            artist=cls.artist,
+            embeddings=[0.0] * 5,
+        )
+        cls.existing.tags.add("stale")
+
+    def create_import(self, lines, name="catalogue.csv", header=HEADER):
+        sound_import = SoundImport(created_by=self.admin)
+        sound_import.file.save(
+            name, ContentFile("\n".join([header, *lines]).encode())
+        )
+        return sound_import
+
+    def new_rows(self, count):
+        return [
+            f',Sound {n},Artist {n % 3},"rain, wind",,,sounds/{n}.wav'
+            for n in range(count)
+        ]
+
+    def test_creates_and_updates_sounds_and_defers_embeddings(self):
+        sound_import = self.create_import(
+            [
+                f'{self.existing.pk},New title,Known artist,"rain, rain",,,',
+                ',Fresh,Known artist,wind,"[0.1 0.2 0.3 0.4 0.5]",Breezy,sounds/fresh.wav',
+                ",Unembedded,New artist,,,,sounds/later.wav",
+                ",No file,,,,,",
+                "999999,Missing,,,,,",
+            ]
+        )
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            progress = run_sound_import(sound_import, chunk_size=2)
+
+        sound_import.refresh_from_db()
+        self.assertEqual(sound_import.status, SoundImport.Status.DONE)
+        self.assertEqual(
+            (
+                sound_import.total_rows,
+                sound_import.processed_rows,
+                sound_import.created_count,
+                sound_import.updated_count,
+            ),
+            (5, 5, 2, 1),
+        )
+        self.assertEqual(
+            [error["row"] for error in sound_import.errors], [5, 6]
+        )
+
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.title, "New title")
+        self.assertEqual(self.existing.file.name, "sounds/old.wav")
+        self.assertEqual(self.existing.tag_names, ["rain"])
+        self.assertEqual(list(self.existing.embeddings), [0.0] * 5)
+
+        fresh = Sound.objects.get(title="Fresh")
+        self.assertEqual(fresh.artist, self.artist)
+        self.assertEqual(fresh.embedding_status, Sound.EmbeddingStatus.READY)
+        later = Sound.objects.get(title="Unembedded")
+        self.assertEqual(later.artist.name, "New artist")
+        self.assertEqual(later.embedding_status, Sound.EmbeddingStatus.PENDING)
+        self.assertIsNone(later.embeddings)
+
+        # Embeddings are queued per chunk once it commits, never computed inline.
+        with patch("core.importing.embed_sound") as embed_sound:
+            for callback in callbacks:
+                callback()
+        embed_sound.enqueue.assert_called_once_with(later.pk)
+        self.assertEqual(progress.error_count, 2)
+
+    def test_unknown_ids_create_sounds_with_those_ids(self):
+        Tag.objects.create(name="Rain", slug="rain")
+        sound_import = self.create_import(
+            [
+                "900,Exported,Known artist,wind,,,sounds/900.wav",
+                "900,Exported twice,,,,,",
+                "950,Clashing,,rain,,,sounds/950.wav",
+                ",Newer,,,,,sounds/newer.wav",
+            ]
+        )
+
+        run_sound_import(sound_import)
+
+        sound_import.refresh_from_db()
+        self.assertEqual(
+            (sound_import.created_count, sound_import.updated_count), (2, 0)
+        )
+        self.assertEqual(
+            sound_import.errors,
+            [{"row": 4, "error": "slug taken by another tag: rain"}],
+        )
+        exported = Sound.objects.get(pk=900)
+        self.assertEqual(exported.title, "Exported twice")
+        self.assertEqual(exported.tag_names, ["wind"])
+        self.assertFalse(Sound.objects.filter(pk=950).exists())
+        self.assertGreater(Sound.objects.get(title="Newer").pk, 900)
+        # The id sequence has moved on too.
+        self.assertGreater(
+            Sound.objects.create(title="Later", file="sounds/later.wav").pk, 900
+        )
+
+    def test_new_art_is_queued_for_rendering(self):
+        header = "id,title,file,art"
+        sound_import = self.create_import(
+            [
+                f"{self.existing.pk},,,sound_arts/new.png",
+                ",Fresh,sounds/fresh.wav,sound_arts/fresh.png",
+                ",Bare,sounds/bare.wav,",
+            ],
+            header=header,
+        )
+        renamed = self.create_import([f"{self.existing.pk},Renamed,,"], header=header)
+
+        with patch("core.importing.render_images") as render_images:
+            with self.captureOnCommitCallbacks(execute=True):
+                run_sound_import(sound_import)
+            with self.captureOnCommitCallbacks(execute=True):
+                run_sound_import(renamed)
+
+        fresh = Sound.objects.get(title="Fresh")
+        self.assertEqual(
+            sorted(call.args for call in render_images.enqueue.call_args_list),
+            [("core.Sound", self.existing.pk), ("core.Sound", fresh.pk)],
+        )
+
+    def test_queries_do_not_grow_with_rows_in_a_chunk(self):
+        run_sound_import(self.create_import(self.new_rows(3), "warm.csv"))
+
+        def count_queries(rows):
+            sound_import = self.create_import(rows)
+            with CaptureQueriesContext(connection) as queries:
+                run_sound_import(sound_import)
+            return len(queries)
+
+        self.assertEqual(count_queries(self.new_rows(5)), count_queries(self.new_rows(50)))
+        self.assertEqual(Sound.objects.filter(title="Sound 49").count(), 1)
+
+    @override_settings(
+        TASKS={"default": {"BACKEND": "django_tasks.backends.immediate.ImmediateBackend"}}
+    )
+    @patch("core.tasks.transcode", return_value={})
+    def test_admin_upload_runs_the_import_in_a_task(self, transcode):
+        self.client.force_login(self.admin)
+        upload = ContentFile(
+            "\n".join([self.HEADER, *self.new_rows(4)]).encode(), name="upload.csv"
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("admin:core_soundimport_add"), {"file": upload}
+            )
+
+        self.assertEqual(response.status_code, 302)
+        sound_import = SoundImport.objects.get()
+        self.assertEqual(sound_import.created_by, self.admin)
+        self.assertEqual(sound_import.status, SoundImport.Status.DONE)
+        self.assertEqual(sound_import.created_count, 4)
+
+        response = self.client.get(
+            reverse("admin:core_soundimport_change", args=[sound_import.pk])
+        )
+        self.assertContains(response, "4/4 rows")
+
+
+class SoundExportTests(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="admin-password"
+        )
+        artist = Artist.objects.create(name="Field recorder")
+        cls.sounds = [
+            Sound.objects.create(
+                file=f"sounds/{n}.wav",
+                title=f"Sound {n}",
+                artist=artist,
+                embeddings=[n / 10] * 5,
+            )
+            for n in range(5)
+        ]
+        cls.sounds[0].tags.add("rain", "wind")
+        Sound.objects.filter(pk=cls.sounds[4].pk).update(embeddings=None)
+
+    def test_csv_export_reimports_cleanly(self):
+        out = StringIO()
+        call_command("export_sounds", stdout=out)
+
+        rows = list(csv.DictReader(StringIO(out.getvalue())))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]["tags"], "rain, wind")
+        self.assertEqual(rows[1]["embeddings"], "[0.1 0.1 0.1 0.1 0.1]")
+        self.assertEqual(rows[4]["embeddings"], "")
+
+        sound_import = SoundImport()
+        sound_import.file.save("roundtrip.csv", ContentFile(out.getvalue().encode()))
+        progress = run_sound_import(sound_import)
+        self.assertEqual((progress.updated, progress.error_count), (5, 0))
+        self.assertEqual(self.sounds[0].tag_names, ["rain", "wind"])
+
+    def test_jsonl_export_reads_in_chunks(self):
+        # One cursor over the sounds plus one tag prefetch per chunk of two.
+        with self.assertNumQueries(4):
+            lines = list(export_lines("jsonl", chunk_size=2))
+
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row["id"] for row in rows], [s.pk for s in self.sounds])
+        self.assertEqual(rows[0]["embeddings"], [0.0] * 5)
+        self.assertEqual(rows[0]["artist"], "Field recorder")
+        self.assertIsNone(rows[4]["embeddings"])
+
+    def test_admin_actions_stream_or_queue_the_selection(self):
+        self.client.force_login(self.admin)
+        selected = [self.sounds[1].pk, self.sounds[2].pk]
+        url = reverse("admin:core_sound_changelist")
+
+        response = self.client.post(
+            url, {"action": "stream_jsonl_export", "_selected_action": selected}
+        )
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)["id"] for line in lines], selected)
+
+        with patch("core.admin.export_sounds") as task:
+            self.client.post(
+                url, {"action": "background_csv_export", "_selected_action": selected}
+            )
+            # Every page of a search: the task gets the filter, not the pks.
+            self.client.post(
+                f"{url}?q=3",
+                {
+                    "action": "background_csv_export",
+                    "_selected_action": selected,
+                    "select_across": "1",
+                },
+            )
+
+        exported = []
+        for args, kwargs in task.enqueue.call_args_list:
+            # Plain data only: the task table never holds anything executable.
+            self.assertEqual(json.loads(json.dumps(kwargs)), kwargs)
+            stored = export_sounds.call(*args, **kwargs)
+            rows = csv.DictReader(StringIO((self.media_root / stored).read_text()))
+            exported.append([int(row["id"]) for row in rows])
+        self.assertEqual(exported, [selected, [self.sounds[3].pk]])
+
+    def test_pieces_are_read_a_chunk_at_a_time_for_asgi(self):
+        async def pieces():
+            return [piece async for piece in aexport_lines("jsonl", chunk_size=2)]
+
+        pieces = async_to_sync(pieces)()
+
+        self.assertEqual([piece.count("\n") for piece in pieces], [2, 2, 1])
+        self.assertEqual("".join(pieces), "".join(export_lines("jsonl")))
+
+    async def test_admin_streams_asynchronously_under_asgi(self):
+        await self.async_client.aforce_login(self.admin)
+        selected = [self.sounds[1].pk, self.sounds[2].pk]
+
+        response = await self.async_client.post(
+            reverse("admin:core_sound_changelist"),
+            {"action": "stream_jsonl_export", "_selected_action": selected},
+        )
+
+        self.assertTrue(response.is_async)
+        lines = b"".join([part async for part in response]).decode().splitlines()
+        self.assertEqual([json.loads(line)["id"] for line in lines], selected)
+
+
+@override_settings(
+    TASKS={"default": {"BACKEND": "django_tasks.backends.immediate.ImmediateBackend"}}
+)
+class ImageRenditionTests(TempMediaMixin, TestCase):
+    @staticmethod
+    def png(width, height, mode="RGB"):
+        buffer = BytesIO()
+        Image.new(mode, (width, height), "teal").save(buffer, format="PNG")
+        return ContentFile(buffer.getvalue())
+
+    def create_sound(self, art):
+        sound = Sound(
+            title="rain",
+            file="sounds/rain.wav",
+            embeddings=[0.0] * 5,
+            variants={
+                "source": "sounds/rain.wav",
+                "version": transcoding.VERSION,
+                "files": {},
+            },
+        )
+        sound.art.save("rain.png", art, save=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            sound.save()
+        sound.refresh_from_db()
+        return sound
+
+    def test_upload_is_rendered_at_each_narrower_width(self):
+        sound = self.create_sound(self.png(800, 400))
+
+        self.assertEqual(
+            sound.renditions,
+            {"art": {"source": sound.art.name, "widths": [THUMBNAIL_WIDTH, CARD_WIDTH]}},
+        )
+        for width in (THUMBNAIL_WIDTH, CARD_WIDTH):
+            for fmt in ("webp", "avif"):
+                name = rendition_name(sound.art.name, width, fmt)
+                with Image.open(self.media_root / name) as image:
+                    self.assertEqual(image.format, fmt.upper())
+                    self.assertEqual(image.size, (width, width // 2))
+
+    def test_url_picks_the_smallest_rendition_that_fits(self):
+        sound = self.create_sound(self.png(800, 400))
+
+        self.assertEqual(
+            sound.image_url("art", 100),
+            sound.art.storage.url(f"renditions/{sound.art.name[:-4]}-160w.webp"),
+        )
+        self.assertTrue(sound.image_url("art", CARD_WIDTH, "avif").endswith("-640w.avif"))
+        # Wider than any rendition: the original is the closer fit.
+        self.assertEqual(sound.image_url("art", COVER_WIDTH), sound.art.url)
+        self.assertEqual(sound.image_url("art", COVER_WIDTH, "avif", False), "")
+
+    def test_original_is_served_until_renditions_exist(self):
+        sound = Sound(title="rain", file="sounds/rain.wav", embeddings=[0.0] * 5)
+        sound.art.save("rain.png", self.png(800, 400))
+
+        self.assertEqual(sound.image_url("art", CARD_WIDTH), sound.art.url)
+        self.assertEqual(sound.image_url("art", CARD_WIDTH, "avif", False), "")
+        self.assertEqual(Sound(title="bare").image_url("art", CARD_WIDTH), "")
+
+    def test_small_and_unreadable_images_are_not_retried(self):
+        small = self.create_sound(self.png(120, 120, "RGBA"))
+        with self.assertLogs("core.tasks", "WARNING"):
+            broken = self.create_sound(ContentFile(b"not an image"))
+
+        self.assertEqual(small.renditions["art"]["widths"], [])
+        self.assertEqual(broken.renditions["art"]["widths"], [])
+        self.assertEqual(small.stale_renditions(), [])
+        self.assertEqual(broken.image_url("art", CARD_WIDTH), broken.art.url)
+
+    def test_only_saves_touching_an_image_queue_rendering(self):
+        manager = Manager.objects.create(
+            user=User.objects.create(username="venue", email="venue@example.com"),
+            name="Venue",
+        )
+        player = Player(manager=manager, name="Hall")
+        player.photo.save("hall.png", self.png(700, 700), save=False)
+        with self.captureOnCommitCallbacks() as callbacks:
+            player.save()
+        self.assertEqual(len(callbacks), 1)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            player.save(update_fields=["name"])
+        self.assertEqual(callbacks, [])
+
+        # Still unrendered, but Player.update's full saves don't queue it again.
+        player = Player.objects.get(pk=player.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            player.save()
+            player.save()
+        self.assertEqual(callbacks, [])
+
+    def test_command_queues_images_without_renditions(self):
+        sound = Sound(title="rain", file="sounds/rain.wav", embeddings=[0.0] * 5)
+        sound.art.save("rain.png", self.png(800, 400), save=False)
+        Sound.objects.bulk_create([sound])  # skips save(), like an old upload
+        Artist.objects.create(name="No pictures")
+
+        out = StringIO()
+        call_command("render_images", "--dry-run", stdout=out)
+        self.assertIn("Would queue 1 rendition jobs.", out.getvalue())
+        self.assertEqual(Sound.objects.get().renditions, {})
+
+        call_command("render_images", stdout=StringIO())
+        self.assertEqual(
+            Sound.objects.get().renditions["art"]["widths"],
+            [THUMBNAIL_WIDTH, CARD_WIDTH],
+        )
+
+
+@override_settings(
+    TASKS={"default": {"BACKEND": "django_tasks.backends.immediate.ImmediateBackend"}}
+)
+class SoundTranscodingTests(TempMediaMixin, TestCase):
+    FILES = {
+        "opus-64": "variants/sounds/rain-opus-64.ogg",
+        "opus-128": "variants/sounds/rain-opus-128.ogg",
+        "flac-44100": "variants/sounds/rain-flac-44100.flac",
+        "flac-48000": "variants/sounds/rain-flac-48000.flac",
+        "peaks": "variants/sounds/rain-peaks.bin",
+    }
+
+    def create_sound(self, file="sounds/rain.wav"):
+        with self.captureOnCommitCallbacks(execute=True):
+            sound = Sound.objects.create(
+                title="rain", file=file, embeddings=[0.0] * 5
+            )
+        sound.refresh_from_db()
+        return sound
+
+    def upload_tone(self, seconds=1.0, sr=22050):
+        t = np.arange(int(seconds * sr)) / sr
+        tone = (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+        buffer = BytesIO()
+        soundfile.write(buffer, np.stack([tone, tone], axis=1), sr, format="WAV")
+        sound = Sound(title="tone", embeddings=[0.0] * 5)
+        sound.file.save("tone.wav", ContentFile(buffer.getvalue()), save=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            sound.save()
+        sound.refresh_from_db()
+        return sound
+
+    def read_variant(self, sound, key):
+        with sound.file.storage.open(sound.variants["files"][key]) as f:
+            return soundfile.read(f, dtype="float32", always_2d=True)
+
+    def test_conditioning_loops_and_levels_at_the_player_rate(self):
+        rng = np.random.default_rng(0)
+        data = (rng.standard_normal((22050, 2)) * 0.5).astype(np.float32)
+
+        conditioned = transcoding.condition(data, 22050, 44100)
+
+        # Resampled, then shortened by the crossfade folded into its head.
+        fade = int(44100 * transcoding.LOOP_XFADE_MS / 1000)
+        self.assertEqual(conditioned.shape, (44100 - fade, 2))
+        self.assertEqual(conditioned.dtype, np.float32)
+        self.assertLessEqual(np.abs(conditioned).max(), transcoding.PEAK_CEILING + 1e-6)
+
+    def test_transcodes_an_upload(self):
+        sound = self.upload_tone()
+
+        self.assertEqual(set(sound.variants["files"]), set(self.FILES))
+        for rate in transcoding.PLAYER_RATES:
+            data, fs = self.read_variant(sound, transcoding.flac_key(rate))
+            fade = int(rate * transcoding.LOOP_XFADE_MS / 1000)
+            self.assertEqual((fs, data.shape), (rate, (rate - fade, 2)))
+        # The web mixer's streams keep the upload's length and level, since
+        # it crops and levels them against the upload.
+        for kbps in transcoding.OPUS_BITRATES:
+            data, fs = self.read_variant(sound, transcoding.opus_key(kbps))
+            self.assertEqual((fs, data.shape), (transcoding.OPUS_RATE, (48000, 2)))
+            self.assertAlmostEqual(float(np.abs(data).max()), 0.5, delta=0.05)
+        with sound.file.storage.open(sound.variants["files"]["peaks"]) as f:
+            peaks = waveforms.decode(f.read())
+        self.assertAlmostEqual(peaks["peak"], 0.5, places=3)
+
+    @patch("core.transcoding.MAX_SAMPLES", 22050)
+    def test_long_uploads_are_served_as_they_are(self):
+        with self.assertLogs("core.tasks", "INFO"):
+            sound = self.upload_tone()
+
+        self.assertEqual(sound.variants["files"], {})
+        self.assertFalse(sound.stale_variants())
+
+    @patch("core.tasks.transcode")
+    def test_upload_is_transcoded_once_it_commits(self, transcode):
+        transcode.return_value = self.FILES
+        sound = self.create_sound()
+
+        transcode.assert_called_once()
+        self.assertEqual(
+            sound.variants,
+            {
+                "source": "sounds/rain.wav",
+                "version": transcoding.VERSION,
+                "files": self.FILES,
+            },
+        )
+        layer = sound.asLayer()
+        self.assertEqual(list(layer["sound_streams"]), ["opus-64", "opus-128"])
+        self.assertEqual(
+            layer["sound_peaks_url"], sound.file.storage.url(self.FILES["peaks"])
+        )
+        self.assertEqual(
+            sound.audio_url("flac-48000"),
+            sound.file.storage.url(self.FILES["flac-48000"]),
+        )
+
+        # A replaced file is served as uploaded until it's transcoded again.
+        sound.file = "sounds/storm.wav"
+        with self.captureOnCommitCallbacks() as callbacks:
+            sound.save()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(sound.audio_url("flac-48000"), "")
+        self.assertEqual(sound.asLayer()["sound_streams"], {})
+        self.assertEqual(sound.asLayer()["sound_peaks_url"], "")
+
+    @patch("core.tasks.transcode", side_effect=RuntimeError("Format not recognised."))
+    def test_undecodable_audio_is_not_retried(self, transcode):
+        with self.assertLogs("core.tasks", "WARNING"):
+            sound = self.create_sound()
+
+        self.assertEqual(
+            sound.variants,
+            {"source": "sounds/rain.wav", "version": transcoding.VERSION, "files": {}},
+        )
+        self.assertFalse(sound.stale_variants())
+        self.assertEqual(sound.asLayer()["sound_streams"], {})
+
+    @patch("core.tasks.transcode")
+    def test_command_queues_sounds_without_variants(self, transcode):
+        transcode.return_value = self.FILES
+        Sound.objects.bulk_create(  # skips save(), like an old upload
+            [Sound(title="old", file="sounds/old.wav", embeddings=[0.0] * 5)]
+        )
+
+        out = StringIO()
+        call_command("transcode_sounds", "--dry-run", stdout=out)
+        self.assertIn("Would queue 1 transcoding jobs.", out.getvalue())
+        transcode.assert_not_called()
+
+        call_command("transcode_sounds", stdout=StringIO())
+        self.assertEqual(Sound.objects.get().variants["files"], self.FILES)
+
+    @patch("core.tasks.transcode")
+    def test_older_transcodes_play_until_they_are_redone(self, transcode):
+        transcode.return_value = self.FILES
+        opus = {"opus-64": self.FILES["opus-64"]}
+        Sound.objects.bulk_create(
+            [
+                Sound(
+                    title="old",
+                    file="sounds/rain.wav",
+                    embeddings=[0.0] * 5,
+                    variants={"source": "sounds/rain.wav", "files": opus},
+                )
+            ]
+        )
+        sound = Sound.objects.get()
+        self.assertTrue(sound.stale_variants())
+        # Saving it unchanged leaves the backfill to transcode_sounds.
+        with self.captureOnCommitCallbacks() as callbacks:
+            sound.save()
+        self.assertEqual(callbacks, [])
+        self.assertEqual(list(sound.asLayer()["sound_streams"]), ["opus-64"])
+        self.assertEqual(sound.asLayer()["sound_peaks_url"], "")
+
+        call_command("transcode_sounds", stdout=StringIO())
+        sound.refresh_from_db()
+        self.assertFalse(sound.stale_variants())
+        self.assertTrue(sound.asLayer()["sound_peaks_url"])
+
+
+class WaveformPeaksTests(SimpleTestCase):
+    def test_round_trips_every_level_within_a_step(self):
+        t = np.linspace(0.0, 20.0 * np.pi, 9000, dtype=np.float32)
+        data = np.stack([0.4 * np.sin(t), -0.2 * np.sin(t)], axis=1)
+
+        decoded = waveforms.decode(waveforms.encode(data))
+
+        self.assertAlmostEqual(decoded["peak"], 0.4, places=5)
+        self.assertEqual(
+            [len(mins) for mins, _ in decoded["levels"]], list(waveforms.LEVELS)
+        )
+        step = decoded["peak"] / 127
+        for count, (mins, maxs) in zip(waveforms.LEVELS, decoded["levels"]):
+            expected_min, expected_max = waveforms.envelope(data, count)
+            np.testing.assert_allclose(mins, expected_min, atol=step)
+            np.testing.assert_allclose(maxs, expected_max, atol=step)
+
+    def test_buckets_are_cut_like_the_browser_cuts_them(self):
+        data = np.array([[0.5], [-1.0], [0.25], [0.75]], dtype=np.float32)
+
+        mins, maxs = waveforms.envelope(data, 2)
+        np.testing.assert_array_equal(mins, [-1.0, 0.0])
+        np.testing.assert_array_equal(maxs, [0.5, 0.75])
+
+        # More buckets than samples: each one still looks at a sample.
+        mins, maxs = waveforms.envelope(data, 8)
+        np.testing.assert_array_equal(maxs, [0.5, 0.5, 0.0, 0.0, 0.25, 0.25, 0.75, 0.75])
+
+    def test_silence_and_foreign_files(self):
+        decoded = waveforms.decode(waveforms.encode(np.zeros((10, 1), np.float32)))
+        self.assertEqual(decoded["peak"], 0.0)
+        self.assertFalse(decoded["levels"][0][1].any())
+
+        with self.assertRaises(ValueError):
+            waveforms.decode(b"RIFF" + bytes(8))
+
+
+class BulkCosoundTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sounds = [
+            Sound.objects.create(
+                file=f"sounds/bulk-{number}.wav",
+                title=f"Bulk {number}",
+                embeddings=[0.0] * 5,
+            )
+            for number in range(3)
+        ]
+
+    def layer_sets(self):
+        one, two, three = (sound.pk for sound in self.sounds)
+        return [
+            [(one, 0.5), (two, 1.0)],
+            [(three, 0.25)],
+            [(two, 1.0), (one, 0.5)],
+        ]
+
+    def test_matches_the_single_layer_set_api(self):
+        existing = Cosound.get_or_create_from_layers(self.layer_sets()[1])
+
+        cosounds = Cosound.bulk_get_or_create_from_layers(self.layer_sets())
+
+        self.assertEqual(Cosound.objects.count(), 2)
+        self.assertEqual(cosounds[1], existing)
+        self.assertEqual(cosounds[0], cosounds[2])
+        for layers, cosound in zip(self.layer_sets(), cosounds):
+            self.assertEqual(cosound, Cosound.get_or_create_from_layers(layers))
+        self.assertEqual(
+            sorted((l.sound_id, float(l.gain)) for l in cosounds[0].layering()),
+            sorted(self.layer_sets()[0]),
+        )
+        self.assertEqual(existing.soundlayer_set.count(), 1)
+
+    def test_query_count_does_not_grow_with_the_number_of_layer_sets(self):
+        layer_sets = [
+            [(self.sounds[0].pk, gain / 20), (self.sounds[1].pk, 1.0)]
+            for gain in range(1, 21)
+        ]
+
+        # Lookup, savepoint, cosound insert, re-fetch, layer check, layer
+        # insert, release — however many layer sets there are.
+        with self.assertNumQueries(7):
+            cosounds = Cosound.bulk_get_or_create_from_layers(layer_sets)
+
+        self.assertEqual(len({cosound.pk for cosound in cosounds}), 20)
+        with self.assertNumQueries(1):
+            Cosound.bulk_get_or_create_from_layers(layer_sets)
+
+
+class PredictorFixtures:
     def setUp(self):
         manager_user = User.objects.create_user(
             username="manager",
@@ -226,6 +1274,9 @@ class PredictorTests(TestCase):
             Vote.objects.filter(pk=vote.pk).update(created_at=created_at)
         return vote
 
+
+
+class PredictorTests(PredictorFixtures, TestCase):
     def predict(self):
         with patch.object(Player, "announce"):
             return _predict_for_player(self.player.pk)
@@ -254,6 +1305,19 @@ class PredictorTests(TestCase):
             [rock.pk],
         )
 
+    def test_prediction_stores_the_cosound_it_hashes_to(self):
+        sound = self.make_sound("ambient", "ambient")
+        self.player.sounds.add(sound)
+        self.vote(self.make_listener(sound))
+
+        self.assertEqual(self.predict(), 1)
+
+        self.player.refresh_from_db()
+        self.assertEqual(
+            self.player.playing_cosound.hashid,
+            Cosound.compute_hashid(self.player.playing.as_layers()),
+        )
+
     def test_multiple_votes_from_one_listener_produce_one_layer(self):
         sound = self.make_sound("ambient", "ambient")
         self.player.sounds.add(sound)
@@ -439,3 +1503,545 @@ class PredictorTests(TestCase):
         )
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json()["layers"], [])
+
+
+class ScoringPredictorTests(PredictorFixtures, TestCase):
+    def predict(self):
+        with patch.object(Player, "announce"):
+            return _score_for_player(self.player.pk)
+
+    def playing(self):
+        self.player.refresh_from_db()
+        return [
+            (layer.sound_id, layer.sound_gain) for layer in self.player.playing.layers
+        ]
+
+    def test_one_layer_per_distinct_taste(self):
+        rock = self.make_sound("library-rock", "rock")
+        jazz = self.make_sound("library-jazz", "jazz")
+        self.player.sounds.add(rock, jazz)
+        self.vote(self.make_listener(self.make_sound("rock-one", "rock")))
+        self.vote(self.make_listener(self.make_sound("jazz-one", "jazz")))
+
+        self.assertEqual(self.predict(), 1)
+
+        self.assertEqual(self.playing(), [(rock.pk, 1.0), (jazz.pk, 1.0)])
+
+    def test_a_second_layer_of_the_same_taste_adds_nothing(self):
+        rock_one = self.make_sound("library-rock-one", "rock")
+        rock_two = self.make_sound("library-rock-two", "rock")
+        jazz = self.make_sound("library-jazz", "jazz")
+        self.player.sounds.add(rock_one, rock_two, jazz)
+        collected_rock = self.make_sound("collected-rock", "rock")
+        self.vote(self.make_listener(collected_rock))
+        self.vote(self.make_listener(collected_rock))
+        self.vote(self.make_listener(self.make_sound("collected-jazz", "jazz")))
+
+        self.assertEqual(self.predict(), 1)
+
+        # Two listeners want rock, one wants jazz: the jazz layer is quieter.
+        self.assertEqual(self.playing(), [(rock_one.pk, 1.0), (jazz.pk, 0.5)])
+
+    def test_rolled_up_downvotes_steer_away_from_a_tag(self):
+        # Jazz first: an even tie goes to the lower pk, so only the downvote
+        # can put rock ahead.
+        jazz = self.make_sound("library-jazz", "jazz")
+        rock = self.make_sound("library-rock", "rock")
+        self.player.sounds.add(rock, jazz)
+        listener = self.make_listener(self.make_sound("both", "rock", "jazz"))
+        self.vote(listener)
+        ListenerTagRollup.objects.create(
+            listener=listener, tag=Tag.objects.get(name="jazz"), downvotes=3
+        )
+
+        self.assertEqual(self.predict(), 1)
+
+        self.assertEqual(self.playing(), [(rock.pk, 1.0)])
+
+    def test_downvotes_not_yet_rolled_up_count_too(self):
+        jazz = self.make_sound("library-jazz", "jazz")
+        rock = self.make_sound("library-rock", "rock")
+        self.player.sounds.add(rock, jazz)
+        listener = self.make_listener(self.make_sound("both", "rock", "jazz"))
+        Vote.objects.create(
+            voter=listener,
+            player=self.player,
+            cosound=Cosound.get_or_create_from_layers([(jazz.pk, 1.0)]),
+            value=0,  # what submit_vote stores for choice=0
+        )
+
+        self.assertEqual(self.predict(), 1)
+
+        self.assertEqual(self.playing(), [(rock.pk, 1.0)])
+
+    def test_unmatched_room_leaves_prediction_unchanged(self):
+        existing = self.make_sound("existing", "existing")
+        self.player.sounds.add(self.make_sound("library", "ambient"))
+        self.player.playing = Prediction.new()
+        self.player.playing.add_layer(existing.pk, gain=0.25)
+        self.player.save()
+        self.vote(self.make_listener(self.make_sound("unmatched", "unmatched")))
+        self.vote(self.make_listener())
+
+        self.assertEqual(self.predict(), 0)
+
+        self.assertEqual(self.playing(), [(existing.pk, 0.25)])
+
+    def test_no_recent_votes_clear_the_prediction(self):
+        existing = self.make_sound("existing", "existing")
+        self.player.playing = Prediction.new()
+        self.player.playing.add_layer(existing.pk, gain=0.5)
+        self.player.save()
+
+        self.assertEqual(self.predict(), 0)
+
+        self.assertEqual(self.playing(), [])
+
+    def test_queries_do_not_grow_with_the_room(self):
+        rock = self.make_sound("library-rock", "rock")
+        self.player.sounds.add(rock, self.make_sound("library-jazz", "jazz"))
+        collected = self.make_sound("collected", "rock")
+        for _ in range(2):
+            self.vote(self.make_listener(collected))
+        self.predict()  # writes the cosound; later runs only read it
+        with CaptureQueriesContext(connection) as small_room:
+            self.predict()
+        for _ in range(20):
+            self.vote(self.make_listener(collected))
+
+        with self.assertNumQueries(len(small_room)):
+            self.predict()
+
+
+class ReplayPredictorTests(PredictorFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        rock = self.make_sound("library-rock", "rock")
+        jazz = self.make_sound("library-jazz", "jazz")
+        self.player.sounds.add(rock, jazz)
+        self.rock_fan = self.make_listener(self.make_sound("rock", "rock"))
+        self.jazz_fan = self.make_listener(self.make_sound("jazz", "jazz"))
+
+    def test_replays_recorded_votes_without_changing_the_database(self):
+        now = timezone.now()
+        for minutes in (50, 40, 39, 10):
+            self.vote(self.rock_fan, created_at=now - timedelta(minutes=minutes))
+        self.vote(self.jazz_fan, created_at=now - timedelta(minutes=9))
+        counts = (Vote.objects.count(), Player.objects.count(), Cosound.objects.count())
+        out = StringIO()
+
+        call_command(
+            "replay_predictor",
+            self.player.pk,
+            "--hours=1",
+            "--predictor=core.predict.scoring_predictor",
+            "--predictor=core.predict.random_predictor",
+            stdout=out,
+        )
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "Replaying 5 votes…")
+        scoring, random_ = lines[2].split(), lines[3].split()
+        # 30 s ticks over the three stretches with votes in the last 5 minutes:
+        # 4.5 minutes after -50, 5.5 after -40 and -39, 5.5 after -10 and -9.
+        self.assertEqual(scoring[:3], ["core.predict.scoring_predictor", "31", "31"])
+        self.assertEqual(scoring[-1], "-")
+        # With one listener per taste both predictors choose the same layers.
+        self.assertEqual(random_[-1], "1.00")
+        self.assertEqual(
+            (Vote.objects.count(), Player.objects.count(), Cosound.objects.count()),
+            counts,
+        )
+
+    def test_synthetic_stream_is_repeatable_with_a_seed(self):
+        def run():
+            with transaction.atomic():
+                votes = synthetic_votes(self.player, 40, timedelta(hours=1), seed=7)
+                transaction.set_rollback(True)
+            return votes
+
+        first, second = run(), run()
+
+        self.assertEqual(len(first), 40)
+        self.assertEqual(
+            [(v.voter_id, v.value) for v in first],
+            [(v.voter_id, v.value) for v in second],
+        )
+        self.assertEqual(
+            {v.voter_id for v in first}, {self.rock_fan.pk, self.jazz_fan.pk}
+        )
+
+
+class SyntheticDataTests(TestCase):
+    scale = Scale(
+        artists=3,
+        sounds=30,
+        players=2,
+        library=10,
+        listeners=12,
+        collection=5,
+        votes=200,
+        mixes=20,
+        days=2,
+    )
+
+    def test_generates_linked_data_and_purges_it(self):
+        created = generate(self.scale, seed=3)
+
+        self.assertEqual(
+            created,
+            {
+                "artists": 3,
+                "sounds": 30,
+                "players": 2,
+                "listeners": 12,
+                "votes": 200,
+                "mixes": created["mixes"],
+            },
+        )
+        self.assertGreater(created["mixes"], 0)
+        self.assertFalse(Sound.objects.filter(tags=None).exists())
+        player = Player.objects.get(name="Synthetic Player 0")
+        self.assertEqual(player.sounds.count(), 10)
+        oldest = Vote.objects.order_by("created_at").first().created_at
+        self.assertLess(oldest, timezone.now() - timedelta(hours=1))
+        self.assertGreater(oldest, timezone.now() - timedelta(days=2))
+        self.assertTrue(all(player.playing for player in Player.objects.all()))
+
+        purge()
+
+        self.assertFalse(Sound.objects.exists())
+        self.assertFalse(Player.objects.exists())
+        self.assertFalse(Vote.objects.exists())
+        self.assertFalse(User.objects.exists())
+
+    def test_command_refuses_to_run_without_debug(self):
+        with self.assertRaisesMessage(CommandError, "DEBUG off"):
+            call_command("generate_synthetic", stdout=StringIO())
+
+
+# A dev server (DEBUG on) sends its cookies over plain HTTP.
+@override_settings(SESSION_COOKIE_SECURE=False, CSRF_COOKIE_SECURE=False)
+class LoadTestTests(LiveServerTestCase):
+    def test_phones_and_players_exercise_every_endpoint_without_errors(self):
+        generate(
+            Scale(
+                artists=2,
+                sounds=10,
+                players=1,
+                library=5,
+                listeners=3,
+                collection=3,
+                votes=10,
+                mixes=2,
+            ),
+            seed=1,
+        )
+        player = Player.objects.get()
+        library = list(player.sounds.values_list("pk", flat=True))
+
+        with patch("core.loadtest.TIMEOUT", 10):
+            stats = run(
+                self.live_server_url,
+                [(player.token, library)],
+                phones=2,
+                duration=1,
+                think=0.1,
+                poll=0.5,
+                seed=1,
+            )
+
+        rows = {row["endpoint"]: row for row in stats.summary()}
+        self.assertEqual(
+            set(rows),
+            {
+                "api_cosound",
+                "api_manifest",
+                "api_player",
+                "home",
+                "login_anonymously",
+                "mixer_index",
+                "mixer_keep_sound",
+                "mixer_swap",
+                "submit_vote",
+                "vote_initial",
+            },
+        )
+        self.assertEqual(
+            {name: row["statuses"] for name, row in rows.items() if row["errors"]}, {}
+        )
+        self.assertEqual(rows["login_anonymously"]["statuses"], {200: 2})
+        # One vote per phone; the throttle turns the rest away.
+        self.assertEqual(
+            Vote.objects.filter(voter__user__email__endswith="@anon.cosound.ca").count(),
+            2,
+        )
+
+    def test_refuses_remote_hosts(self):
+        with self.assertRaisesMessage(CommandError, "not a local server"):
+            call_command("loadtest", "--url=https://cosound.ca", stdout=StringIO())
+
+
+class RequestTimingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        manager_user = User.objects.create_user(
+            username="manager", email="manager@example.com", password="password"
+        )
+        manager = Manager.objects.create(user=manager_user, name="Manager")
+        cls.player = Player.objects.create(manager=manager, name="Player")
+        cls.staff = User.objects.create_user(
+            username="staff",
+            email="staff@example.com",
+            password="password",
+            is_staff=True,
+        )
+
+    def metrics(self, response):
+        return dict(
+            entry.split(";", 1) for entry in response["Server-Timing"].split(", ")
+        )
+
+    def test_staff_see_server_timing_with_every_counter(self):
+        self.client.force_login(self.staff)
+        cache.set("timing-test", 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                "/vote/initial/",
+                {"player": self.player.token},
+                headers={"HX-Request": "true"},
+            )
+
+        metrics = self.metrics(response)
+        self.assertEqual(set(metrics), {"total", "db", "tpl", "cache"})
+        self.assertIn(f'desc="{len(queries)} queries"', metrics["db"])
+        self.assertNotEqual(metrics["tpl"], "dur=0.0")
+        self.assertRegex(metrics["cache"], r'desc="\d+ hits \d+ misses"')
+
+    @override_settings(DEBUG=True)
+    async def test_async_requests_count_their_queries(self):
+        response = await self.async_client.get(
+            "/api/player", headers={"X-API-Key": self.player.token}
+        )
+
+        self.assertRegex(self.metrics(response)["db"], r'desc="[1-9]\d* queries"')
+
+    def test_anonymous_requests_get_no_header(self):
+        response = self.client.get("/vote/")
+
+        self.assertNotIn("Server-Timing", response)
+
+    def test_cache_hits_and_misses_are_counted(self):
+        cache.set("present", 1)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            cache.get("present")
+            cache.get("absent")
+            cache.get_many(["present", "absent", "also-absent"])
+        finally:
+            current_metrics.reset(token)
+
+        self.assertEqual((metrics.cache_hits, metrics.cache_misses), (2, 3))
+
+    @override_settings(REQUEST_TIMING_SLOW_MS=0)
+    def test_slow_requests_log_their_queries(self):
+        with self.assertLogs("config.middleware", "WARNING") as logs:
+            self.client.get("/api/player", headers={"X-API-Key": self.player.token})
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["path"], "/api/player")
+        self.assertEqual(record["queries"], len(record["slow_queries"]))
+        self.assertIn("core_player", record["slow_queries"][0]["sql"])
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1.0)
+    def test_sampled_requests_log_without_queries(self):
+        with self.assertLogs("config.middleware", "INFO") as logs:
+            self.client.get("/vote/")
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["status"], 200)
+        self.assertNotIn("slow_queries", record)
+
+
+class TieredCacheTests(TestCase):
+    OPTIONS = {
+        "LOCAL_MAX_ENTRIES": 2,
+        "LOCAL_TIMEOUT": 60,
+        "SHARED_KEY_PREFIXES": ["throttle_"],
+    }
+
+    def worker(self):
+        # Each instance stands in for one worker process's cache.
+        return TieredDatabaseCache("django_cache", {"OPTIONS": self.OPTIONS})
+
+    def test_hot_keys_are_served_from_memory(self):
+        cache = self.worker()
+        cache.set("hot", {"layers": [1, 2]})
+
+        with self.assertNumQueries(0):
+            value = cache.get("hot")
+            value["layers"].append(3)
+            self.assertEqual(cache.get("hot"), {"layers": [1, 2]})
+
+    def test_other_workers_read_through_and_keep_a_copy(self):
+        writer, reader = self.worker(), self.worker()
+        writer.set("key", "first")
+
+        with self.assertNumQueries(1):
+            self.assertEqual(reader.get("key"), "first")
+            self.assertEqual(reader.get("key"), "first")
+
+    def test_shared_keys_always_read_the_table(self):
+        writer, reader = self.worker(), self.worker()
+        writer.set("throttle_auth_x", [1])
+        reader.get("throttle_auth_x")
+        writer.set("throttle_auth_x", [1, 2])
+
+        self.assertEqual(reader.get("throttle_auth_x"), [1, 2])
+
+    def test_chunked_upload_offsets_agree_across_workers(self):
+        # django-file-form's tus views advance an upload's offset with incr,
+        # a chunk at a time, on whichever worker the chunk reaches.
+        options = settings.CACHES["default"]["OPTIONS"]
+        one, two = (
+            TieredDatabaseCache("django_cache", {"OPTIONS": options}) for _ in range(2)
+        )
+        one.add("tus-uploads/abc/offset", 0)
+
+        self.assertEqual(one.incr("tus-uploads/abc/offset", 100), 100)
+        self.assertEqual(two.incr("tus-uploads/abc/offset", 100), 200)
+        self.assertEqual(one.get("tus-uploads/abc/offset"), 200)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = self.worker()
+        for key in ("a", "b", "c"):
+            cache.set(key, key)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.get_many(["b", "c"]), {"b": "b", "c": "c"})
+        with self.assertNumQueries(1):
+            self.assertEqual(cache.get("a"), "a")
+
+    def test_clear_reaches_other_workers_on_their_next_read(self):
+        cleared, other = self.worker(), self.worker()
+        other.set("stale", 1)
+        cleared.clear()
+
+        self.assertEqual(other.get("stale"), 1)  # still held locally
+        other.get("anything")  # a database read picks up the new generation
+        self.assertIsNone(other.get("stale"))
+
+    def test_other_key_versions_keep_their_local_copies(self):
+        cache = self.worker()
+        cache.clear()
+        cache.set("v2", "two", version=2)
+        cache.set("v1", "one")
+
+        cache.get("missing", version=2)  # a database read at version 2
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.get("v1"), "one")
+            self.assertEqual(cache.get("v2", version=2), "two")
+
+    def test_failed_add_drops_the_local_copy(self):
+        first, second = self.worker(), self.worker()
+        second.set("slot", "old")
+        first.delete("slot")
+        first.add("slot", "first")
+
+        self.assertFalse(second.add("slot", "second"))
+        self.assertEqual(second.get("slot"), "first")
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        manager_user = User.objects.create_user(
+            username="manager", email="manager@example.com", password="password"
+        )
+        manager = Manager.objects.create(user=manager_user, name="Manager")
+        cls.player = Player.objects.create(manager=manager, name='The "Loft"')
+
+    def scrape(self, **kwargs):
+        response = self.client.get("/metrics/", **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_histograms_render_cumulative_buckets(self):
+        registry = Registry()
+        with patch.object(registry, "maybe_flush"):
+            registry.observe("cosound_task_seconds", 0.02, task="t")
+            registry.observe("cosound_task_seconds", 7, task="t")
+
+        text = render(registry.snapshot())
+
+        self.assertIn("# TYPE cosound_task_seconds histogram", text)
+        self.assertIn('cosound_task_seconds_bucket{task="t",le="0.01"} 0', text)
+        self.assertIn('cosound_task_seconds_bucket{task="t",le="0.025"} 1', text)
+        self.assertIn('cosound_task_seconds_bucket{task="t",le="10.0"} 2', text)
+        self.assertIn('cosound_task_seconds_bucket{task="t",le="+Inf"} 2', text)
+        self.assertIn('cosound_task_seconds_sum{task="t"} 7.02', text)
+        self.assertIn('cosound_task_seconds_count{task="t"} 2', text)
+
+    def test_database_gauges(self):
+        self.player.update(Prediction.new())
+        listener = Listener.objects.create(
+            user=User.objects.create_user(
+                username="listener", email="listener@example.com", password="password"
+            )
+        )
+        for _ in range(3):
+            Vote.objects.create(
+                voter=listener,
+                player=self.player,
+                cosound=self.player.playing_cosound,
+                value=Vote.UPVOTE,
+            )
+
+        text = self.scrape()
+
+        self.assertRegex(
+            text,
+            rf'cosound_player_update_age_seconds{{player="{self.player.pk}",'
+            r'name="The \\"Loft\\""} \d',
+        )
+        self.assertIn('cosound_votes_per_second{window="60s"} 0.05', text)
+        self.assertIn("cosound_task_oldest_ready_age_seconds 0.0", text)
+
+    @override_settings(
+        TASKS={"default": {"BACKEND": "django_tasks.backends.immediate.ImmediateBackend"}}
+    )
+    def test_finished_tasks_are_timed(self):
+        roll_up_votes.enqueue()
+
+        text = self.scrape()
+
+        task = "vote.rollups.roll_up_votes"
+        self.assertRegex(
+            text, rf'cosound_tasks_total{{status="SUCCEEDED",task="{task}"}} \d'
+        )
+        self.assertIn(f'cosound_task_lag_seconds_count{{task="{task}"}}', text)
+
+    def test_api_latency_and_throttle_rejections(self):
+        statuses = {
+            self.client.get(
+                "/api/cosound", headers={"X-API-Key": self.player.token}
+            ).status_code
+            for _ in range(11)
+        }
+
+        text = self.scrape()
+
+        self.assertEqual(statuses, {200, 429})
+        self.assertIn('cosound_api_request_seconds_count{endpoint="get_cosound"}', text)
+        self.assertRegex(text, r'cosound_api_throttled_total{endpoint="get_cosound"} \d')
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_only_local_or_token_bearing_scrapes(self):
+        forwarded = {"headers": {"X-Forwarded-For": "203.0.113.9"}}
+        self.assertEqual(self.client.get("/metrics/", **forwarded).status_code, 403)
+        self.assertEqual(
+            self.client.get("/metrics/", REMOTE_ADDR="203.0.113.9").status_code, 403
+        )
+        self.scrape(REMOTE_ADDR="203.0.113.9", headers={"Authorization": "Bearer secret"})
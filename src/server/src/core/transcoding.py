@@ -0,0 +1,323 @@
+"""Web and player variants of each Sound's audio, made once on the worker.
+
+Uploads are served as they came in: browsers download full masters, and
+every player decodes and conditions lossy files itself before it can loop
+them (player/src/app/conditioning.py). Sound.save queues
+core.tasks.transcode_sound when the file changes; it decodes the upload once
+and writes, under variants/:
+
+- Ogg Opus at each of OPUS_BITRATES for the web mixer, which picks one from
+  the layer's ``sound_streams`` (Sound.asLayer). These are the upload only
+  resampled to OPUS_RATE: the mixer crops, crossfades and loudness-matches a
+  layer itself, in seconds of the upload, so they must keep its length and
+  level;
+- 24-bit FLAC at each of PLAYER_RATES, run through the player's conditioning
+  stages — loop-ready and loudness-matched — which /manifest?rate= hands a
+  player running at that rate. Their URLs carry the CONDITIONED_FRAGMENT
+  fragment, and the player plays them as they are rather than conditioning
+  them a second time;
+- the upload's waveform peaks (core.waveforms), as ``sound_peaks_url``.
+
+Until the task has run, for rates or browsers without a variant, and for
+uploads over MAX_SECONDS, the upload itself is served. Sounds transcoded by
+an older VERSION keep serving what they have, but count as stale, so
+`transcode_sounds` brings them up to date.
+
+The stages below mirror player/src/app/conditioning.py at CONDITION_VERSION
+2 — keep them in step. soundfile is only needed where this runs (the task
+worker), so it is imported on first use, sparing web processes libsndfile;
+soxr and pyloudnorm are optional, as on the player.
+"""
+
+import posixpath
+import tempfile
+
+import numpy as np
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.base import ContentFile
+
+from core import waveforms
+
+# Bump when the set of variants or how they're made changes.
+VERSION = 3
+
+TARGET_LUFS = -20.0
+PEAK_CEILING = 10 ** (-1.0 / 20.0)  # -1 dBFS
+HF_SHELF_DB = -3.0
+HF_SHELF_LO = 13000.0  # start of the transition
+HF_SHELF_HI = 16000.0  # full cut above here
+LOOP_XFADE_MS = 50.0
+
+# Opus only encodes at 48 kHz. Bitrates are for the whole (stereo) stream.
+OPUS_RATE = 48000
+OPUS_BITRATES = (64, 128)
+PLAYER_RATES = (44100, 48000)
+# URL fragment marking a manifest entry as already conditioned; the player's
+# app.client.CONDITIONED_FRAGMENT must match.
+CONDITIONED_FRAGMENT = "conditioned"
+
+# Longest upload transcoded, in seconds of 48 kHz stereo. The worker holds the
+# decoded upload and one conditioned copy of it, about 230 MB at this length;
+# longer ones are served as uploaded.
+MAX_SECONDS = 300
+MAX_SAMPLES = MAX_SECONDS * 48000 * 2
+
+
+class TooLong(ValueError):
+    """An upload over MAX_SECONDS, left untranscoded."""
+
+
+def opus_key(kbps):
+    return f"opus-{kbps}"
+
+
+def flac_key(rate):
+    return f"flac-{rate}"
+
+
+PEAKS_KEY = "peaks"
+EXTENSIONS = {"opus": "ogg", "flac": "flac", PEAKS_KEY: "bin"}
+
+
+# The variants the web mixer streams, smallest first.
+STREAM_VARIANTS = tuple(opus_key(kbps) for kbps in OPUS_BITRATES)
+
+
+def variant_name(name, key):
+    """Storage name of the `key` variant of the sound file `name`."""
+    stem, _ = posixpath.splitext(name)
+    return f"variants/{stem}-{key}.{EXTENSIONS[key.split('-')[0]]}"
+
+
+def _soundfile():
+    try:
+        import soundfile
+    except ImportError as e:
+        raise ImproperlyConfigured(
+            "core.tasks.transcode_sound needs soundfile installed."
+        ) from e
+    return soundfile
+
+
+# --- Conditioning stages (player/src/app/conditioning.py) ---------------------
+#
+# The same maths as the player, but worked in float32, in place and a block at
+# a time where the player makes whole-file copies, so the worker holds a
+# MAX_SECONDS upload and one conditioned copy of it, not several. The shelf on
+# long files is an FIR of the same curve, within ~-90 dB of the player's.
+
+# Frames interpolated or summed per step.
+_BLOCK = 1 << 16
+
+
+def _interp(data: np.ndarray, n_out: int) -> np.ndarray:
+    """Linear resampling onto `n_out` frames spanning the same ends."""
+    n = data.shape[0]
+    out = np.empty((n_out, data.shape[1]), np.float32)
+    step = (n - 1) / (n_out - 1) if n_out > 1 else 0.0
+    for start in range(0, n_out, _BLOCK):
+        pos = np.arange(start, min(start + _BLOCK, n_out)) * step
+        left = np.clip(pos.astype(np.intp), 0, max(n - 2, 0))
+        right = np.minimum(left + 1, n - 1)
+        frac = (pos - left).astype(np.float32)[:, None]
+        out[start : start + len(pos)] = data[left] * (1.0 - frac) + data[right] * frac
+    return out
+
+
+def _resample(data: np.ndarray, sr: int, target: int) -> np.ndarray:
+    if sr == target:
+        return data
+    try:
+        import soxr
+
+        return np.ascontiguousarray(soxr.resample(data, sr, target), dtype=np.float32)
+    except Exception:
+        n_out = int(round(data.shape[0] * target / sr))
+        if n_out <= 0:
+            return data
+        return _interp(data, n_out)
+
+
+def _shelf_gain(freqs: np.ndarray) -> np.ndarray:
+    shelf = 10 ** (HF_SHELF_DB / 20.0)
+    ramp = np.clip((freqs - HF_SHELF_LO) / (HF_SHELF_HI - HF_SHELF_LO), 0.0, 1.0)
+    # Smooth cosine transition from 1.0 down to the shelf gain.
+    return 1.0 + (shelf - 1.0) * (0.5 - 0.5 * np.cos(np.pi * ramp))
+
+
+# The shelf as a linear-phase FIR, for files too long to transform whole.
+_SHELF_TAPS = 511
+_SHELF_FFT = 1 << 16
+
+
+def _shelf_kernel(fs: int) -> np.ndarray:
+    """The shelf curve sampled finely, cut to _SHELF_TAPS and windowed."""
+    half = _SHELF_TAPS // 2
+    impulse = np.fft.irfft(_shelf_gain(np.fft.rfftfreq(_SHELF_FFT, 1.0 / fs)))
+    kernel = np.concatenate([impulse[-half:], impulse[: half + 1]])
+    return (kernel * np.kaiser(_SHELF_TAPS, 8.0)).astype(np.float32)
+
+
+def _hf_shelf(data: np.ndarray, fs: int) -> np.ndarray:
+    """Zero-phase high-shelf cut, applied in the frequency domain (offline).
+
+    Files up to _SHELF_FFT frames are transformed whole, as on the player.
+    Longer ones go through the same curve as a symmetric FIR, one block at a
+    time (overlap-save), wrapping round the ends as the whole-file transform
+    does — a whole-file rfft needs ~16 bytes a frame on top of the audio.
+    """
+    n = data.shape[0]
+    if n < 16:
+        return data
+    if n <= _SHELF_FFT:
+        gain = _shelf_gain(np.fft.rfftfreq(n, 1.0 / fs))
+        for c in range(data.shape[1]):
+            data[:, c] = np.fft.irfft(np.fft.rfft(data[:, c]) * gain, n)
+        return data
+
+    kernel = np.fft.rfft(_shelf_kernel(fs), _SHELF_FFT)
+    overlap = _SHELF_TAPS - 1
+    step = _SHELF_FFT - overlap
+    half = _SHELF_TAPS // 2
+    for c in range(data.shape[1]):
+        x = data[:, c]
+        head = x[:half].copy()
+        # Input behind the block being filtered, starting with the file's
+        # tail wrapped round before its head.
+        carry = x[-half:].copy()
+        read = 0
+        for start in range(0, n, step):
+            count = min(step, n - start)
+            need = count + overlap - len(carry)
+            taken = x[read : read + need]
+            read += len(taken)
+            chunk = np.concatenate([carry, taken, head[: need - len(taken)]])
+            # Read ahead of every write: this block only overwrites samples
+            # already consumed into `chunk`.
+            carry = chunk[-overlap:].copy()
+            filtered = np.fft.irfft(np.fft.rfft(chunk, _SHELF_FFT) * kernel, _SHELF_FFT)
+            x[start : start + count] = filtered[overlap : overlap + count]
+    return data
+
+
+def _loop_crossfade(data: np.ndarray, fs: int) -> np.ndarray:
+    """Fold the tail into the head so the loop point is seamless."""
+    n = data.shape[0]
+    x = int(fs * LOOP_XFADE_MS / 1000.0)
+    if x < 2 or n < 4 * x:
+        return data
+    fade_in = np.linspace(0.0, 1.0, x, dtype=np.float32)[:, None]
+    fade_out = 1.0 - fade_in
+    data[:x] = data[-x:] * fade_out + data[:x] * fade_in
+    return data[:-x]
+
+
+def _normalize(data: np.ndarray, fs: int, target_lufs: float) -> np.ndarray:
+    gain = None
+    try:
+        import pyloudnorm as pyln
+
+        loud = pyln.Meter(fs).integrated_loudness(data)
+        if np.isfinite(loud) and loud > -120:
+            gain = 10 ** ((target_lufs - loud) / 20.0)
+    except Exception:
+        pass
+    if gain is None:
+        flat = data.reshape(-1)
+        energy = sum(
+            float(np.dot(block, block))
+            for block in (flat[i : i + _BLOCK] for i in range(0, flat.size, _BLOCK))
+        )
+        rms = float(np.sqrt(energy / flat.size)) if flat.size else 0.0
+        gain = (10 ** (target_lufs / 20.0)) / (rms or 1e-9)
+    data *= gain
+    peak = max(float(data.max()), -float(data.min())) if data.size else 0.0
+    if peak > PEAK_CEILING:
+        data *= PEAK_CEILING / peak
+    return data
+
+
+def condition(data: np.ndarray, sr: int, target_fs: int) -> np.ndarray:
+    """Decoded float32 frames at `sr`, conditioned for looping at `target_fs`.
+
+    `data` itself is left as it was.
+    """
+    resampled = _resample(data, sr, target_fs)
+    # The stages below work in place.
+    data = resampled.copy() if resampled is data else resampled
+    data = _hf_shelf(data, target_fs)
+    data = _loop_crossfade(data, target_fs)
+    return _normalize(data, target_fs, TARGET_LUFS)
+
+
+# --- Encoding -----------------------------------------------------------------
+
+
+def _opus_compression_level(kbps, channels):
+    # libsndfile maps compression level 0-1 linearly onto 256 down to 6
+    # kbit/s per channel.
+    per_channel = kbps * 1000 / channels
+    return float(np.clip(1.0 - (per_channel - 6000) / 250000, 0.0, 1.0))
+
+
+def _encode(data, fs, key):
+    """Encode float32 frames at `fs` as the `key` variant; return a temp file."""
+    soundfile = _soundfile()
+    encoded = tempfile.TemporaryFile()
+    if key.startswith("opus-"):
+        kbps = int(key.removeprefix("opus-"))
+        soundfile.write(
+            encoded,
+            data,
+            fs,
+            format="OGG",
+            subtype="OPUS",
+            compression_level=_opus_compression_level(kbps, data.shape[1]),
+        )
+    else:
+        soundfile.write(encoded, data, fs, format="FLAC", subtype="PCM_24")
+    encoded.seek(0)
+    return encoded
+
+
+def transcode(sound_file):
+    """Write every variant of a Sound's file; return {variant key: name}.
+
+    Raises TooLong for an upload over MAX_SECONDS, and soundfile's error for
+    audio it can't decode.
+    """
+    soundfile = _soundfile()
+    with sound_file.open("rb") as source, soundfile.SoundFile(source) as audio:
+        if audio.frames * audio.channels > MAX_SAMPLES:
+            raise TooLong(
+                f"{sound_file.name} is over {MAX_SECONDS // 60} minutes of "
+                "48 kHz stereo."
+            )
+        sr = audio.samplerate
+        data = audio.read(dtype="float32", always_2d=True)
+
+    storage = sound_file.storage
+
+    def save(key, content):
+        name = variant_name(sound_file.name, key)
+        # Keep the name deterministic, so a re-run overwrites its files.
+        if storage.exists(name):
+            storage.delete(name)
+        return storage.save(name, content)
+
+    # Peaks of the upload as it is, which is what the studio crops.
+    names = {PEAKS_KEY: save(PEAKS_KEY, ContentFile(waveforms.encode(data)))}
+    stream = _resample(data, sr, OPUS_RATE)
+    for kbps in OPUS_BITRATES:
+        key = opus_key(kbps)
+        with _encode(stream, OPUS_RATE, key) as encoded:
+            names[key] = save(key, File(encoded))
+    del stream
+    # One conditioned copy at a time, so the upload and one copy are all
+    # that's ever held.
+    for rate in PLAYER_RATES:
+        key = flac_key(rate)
+        with _encode(condition(data, sr, rate), rate, key) as encoded:
+            names[key] = save(key, File(encoded))
+    return names
@@ -1,3 +1,9 @@
+from django.urls import path
+
+from core.metrics import metrics
+
 app_name = "core"
 
-urlpatterns = []
+urlpatterns = [
+    path("", metrics, name="metrics"),
+]
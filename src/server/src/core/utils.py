@@ -161,6 +161,19 @@ def _get_sound_classifier():
     return random_sound_classifier
 
 
+def _get_sound_batch_classifier():
+    batch_classifier_path = getattr(settings, "COSOUND_SOUND_BATCH_CLASSIFIER", None)
+    if batch_classifier_path:
+        try:
+            return import_string(batch_classifier_path)
+        except ImportError:
+            pass
+    # Fallback to core default
+    from core.classify import each_sound_classifier
+
+    return each_sound_classifier
+
+
 def get_random_avatar_url(seed):
     """Deterministic dicebear avatar URL keyed by user pk (or any seed)."""
     colors = ["b6e3f4", "c0aede", "ffdfbf"]
@@ -0,0 +1,88 @@
+"""Waveform peaks for each Sound, so drawing one costs a few KB, not a decode.
+
+core.tasks.transcode_sound, which decodes the upload anyway, writes the
+file's min/max envelope at each of LEVELS bucket counts into one small blob
+next to its other variants (see core.transcoding). The studio's trim track
+fetches it from the layer's ``sound_peaks_url`` instead of downloading and
+decoding the whole file; peaksFromFile in soundscape-mixer.js reads it.
+
+Buckets are cut the way peaksFromBuffer cuts them in the browser —
+bucket b spans samples floor(b * n / count) up to the next bucket's start,
+at least one sample, over every channel, and always includes zero — so a
+precomputed waveform draws the same as a decoded one.
+
+Layout, little-endian:
+
+    4s  magic b"CSPK"
+    B   format version (FORMAT_VERSION)
+    B   number of levels
+    2x  padding
+    f   peak: the largest absolute sample, the scale of everything below
+    I * levels  bucket count of each level, finest first
+    then per level: b * count  minimums, b * count  maximums
+
+Minimums and maximums are int8 fractions of the peak (127 = peak), which is
+finer than any panel is tall.
+"""
+
+import struct
+
+import numpy as np
+
+MAGIC = b"CSPK"
+FORMAT_VERSION = 1
+# The finest level matches DEFAULT_PEAK_BUCKETS in soundscape-mixer.js.
+LEVELS = (2048, 512, 128)
+
+_HEADER = struct.Struct("<4sBBxxf")
+
+
+def envelope(data: np.ndarray, count: int) -> tuple[np.ndarray, np.ndarray]:
+    """Per-bucket (min, max) of (frames, channels) float samples."""
+    frames = data.shape[0]
+    if frames == 0:
+        return np.zeros(count, np.float32), np.zeros(count, np.float32)
+    # A start at or past the next one makes reduceat take just that sample,
+    # which is the one-sample bucket peaksFromBuffer gives a short file.
+    starts = np.arange(count, dtype=np.int64) * frames // count
+    # Reduced along the file first, so nothing the length of it is copied.
+    low = np.minimum.reduceat(data, starts, axis=0).min(axis=1)
+    high = np.maximum.reduceat(data, starts, axis=0).max(axis=1)
+    mins = np.minimum(low, 0.0)
+    maxs = np.maximum(high, 0.0)
+    return mins.astype(np.float32), maxs.astype(np.float32)
+
+
+def encode(data: np.ndarray, levels=LEVELS) -> bytes:
+    """The peaks blob for (frames, channels) float samples."""
+    envelopes = [envelope(data, count) for count in levels]
+    # Every level covers every frame, so its extremes are the file's.
+    peak = max(-float(envelopes[0][0].min()), float(envelopes[0][1].max()))
+    scale = 127.0 / peak if peak > 0 else 0.0
+    counts = b"".join(struct.pack("<I", count) for count in levels)
+    body = [
+        np.round(values * scale).astype(np.int8).tobytes()
+        for pair in envelopes
+        for values in pair
+    ]
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, len(levels), peak)
+    return header + counts + b"".join(body)
+
+
+def decode(blob: bytes) -> dict:
+    """{"peak": float, "levels": [(mins, maxs), ...]}, as fractions of full scale."""
+    magic, version, level_count, peak = _HEADER.unpack_from(blob)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"Not a version {FORMAT_VERSION} peaks file.")
+    offset = _HEADER.size
+    counts = struct.unpack_from(f"<{level_count}I", blob, offset)
+    offset += 4 * level_count
+    levels = []
+    for count in counts:
+        values = []
+        for _ in range(2):
+            quantized = np.frombuffer(blob, np.int8, count, offset)
+            values.append(quantized.astype(np.float32) * (peak / 127.0))
+            offset += count
+        levels.append(tuple(values))
+    return {"peak": peak, "levels": levels}
@@ -0,0 +1,224 @@
+"""Guest identities that live in a signed cookie until they're needed.
+
+"Continue anonymously" only signs a generated username into GUEST_COOKIE;
+no User, Listener or logged-in session is created. GuestMiddleware turns the
+cookie into ``request.user`` as a Guest: authenticated to templates and
+views, with the username it will keep, but backed by no rows, so anything
+that reads the user's data finds nothing (see has_account).
+
+The first action that has to write something for the user — a vote, a kept
+sound, a saved mix — calls materialize(), which creates the account in one
+insert (plus its Listener), logs the session in and retires the cookie.
+Guests who leave without doing any of that never touch the database.
+
+Anonymous accounts that were materialized and then went quiet are removed
+by `prune_anonymous` (prune_batch), along with their sessions.
+"""
+
+import zlib
+
+from django.conf import settings
+from django.contrib.auth import login
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
+
+from core.models import Artist, Listener, Manager, User
+from core.utils import get_random_avatar_url
+from login.utils import ANON_EMAIL_DOMAIN, generate_anon_email, generate_anon_username
+
+GUEST_COOKIE = "cosound_guest"
+GUEST_COOKIE_SALT = "login.guests"
+BATCH_SIZE = 500
+
+
+class Guest:
+    """``request.user`` for a guest whose account doesn't exist yet."""
+
+    pk = id = None
+    avatar = None
+    is_active = True
+    is_anonymous = False
+    is_authenticated = True
+    is_staff = is_superuser = False
+    is_anonymous_account = True
+    is_guest = True
+
+    def __init__(self, username):
+        self.username = username
+        self.email = generate_anon_email(username)
+
+    def __str__(self):
+        return self.username
+
+    @property
+    def avatar_url(self):
+        return get_random_avatar_url(zlib.crc32(self.username.encode()))
+
+    def get_username(self):
+        return self.username
+
+    def has_perm(self, perm, obj=None):
+        return False
+
+    def has_perms(self, perm_list, obj=None):
+        return False
+
+    def has_module_perms(self, module):
+        return False
+
+
+def has_account(user):
+    """True if `user` has an account to read from: signed in and not a guest."""
+    return user is not None and user.is_authenticated and user.pk is not None
+
+
+def remember_guest(response, username):
+    response.set_signed_cookie(
+        GUEST_COOKIE,
+        username,
+        salt=GUEST_COOKIE_SALT,
+        max_age=settings.SESSION_COOKIE_AGE,
+        domain=settings.SESSION_COOKIE_DOMAIN,
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        samesite=settings.SESSION_COOKIE_SAMESITE,
+    )
+
+
+def forget_guest(response):
+    response.delete_cookie(
+        GUEST_COOKIE,
+        domain=settings.SESSION_COOKIE_DOMAIN,
+        samesite=settings.SESSION_COOKIE_SAMESITE,
+    )
+
+
+def get_guest(request):
+    """The Guest in the request's cookie, or None if it's absent or forged."""
+    username = request.get_signed_cookie(
+        GUEST_COOKIE,
+        default=None,
+        salt=GUEST_COOKIE_SALT,
+        max_age=settings.SESSION_COOKIE_AGE,
+    )
+    return Guest(username) if username else None
+
+
+class GuestMiddleware(MiddlewareMixin):
+    """Stand a Guest in for the anonymous user when the guest cookie is set.
+
+    After AuthenticationMiddleware. A signed-in session always wins, and the
+    cookie is dropped once the request ends with a real account.
+    """
+
+    def process_request(self, request):
+        if GUEST_COOKIE not in request.COOKIES:
+            return
+        user = request.user
+        request.user = SimpleLazyObject(
+            lambda: user if user.is_authenticated else get_guest(request) or user
+        )
+
+    def process_response(self, request, response):
+        if GUEST_COOKIE in request.COOKIES and has_account(
+            getattr(request, "user", None)
+        ):
+            forget_guest(response)
+        return response
+
+
+def create_anonymous_user(username):
+    """Create an anonymous account and its Listener, renaming on a clash."""
+    for _ in range(10):
+        user = User(username=username, email=generate_anon_email(username))
+        user.set_unusable_password()
+        try:
+            with transaction.atomic():
+                user.save()
+                Listener.objects.create(user=user)
+            return user
+        except IntegrityError:
+            # Another guest drew the same name and got here first.
+            username = generate_anon_username()
+    raise IntegrityError(f"No free username for an anonymous account ({username}).")
+
+
+def materialize(request):
+    """The request's user, creating and signing in the account of a guest."""
+    user = request.user
+    if not getattr(user, "is_guest", False):
+        return user
+    user = create_anonymous_user(user.username)
+    login(request, user, backend="django.contrib.auth.backends.ModelBackend")
+    return user
+
+
+def stale_anonymous_users(cutoff):
+    """Anonymous accounts unused since `cutoff` and safe to delete.
+
+    Accounts that still own votes in the Vote table are kept, so pruning never
+    takes votes the rollups and archive haven't finished with; archive_votes
+    moves them out after VOTE_RETENTION_DAYS. Saved mixes, and accounts an
+    admin has linked to an artist or venue, are kept too.
+    """
+    from mixer.models import SoundMix
+    from vote.models import Vote
+
+    return (
+        User.objects.filter(
+            email__endswith=f"@{ANON_EMAIL_DOMAIN}",
+            is_staff=False,
+            is_superuser=False,
+            date_joined__lt=cutoff,
+        )
+        .filter(Q(last_login__lt=cutoff) | Q(last_login__isnull=True))
+        .exclude(Exists(Vote.objects.filter(voter__user=OuterRef("pk"))))
+        .exclude(Exists(SoundMix.objects.filter(creator=OuterRef("pk"))))
+        .exclude(Exists(Artist.objects.filter(user=OuterRef("pk"))))
+        .exclude(Exists(Manager.objects.filter(user=OuterRef("pk"))))
+    )
+
+
+def prune_batch(cutoff, batch_size=BATCH_SIZE):
+    """Delete up to `batch_size` stale anonymous accounts; return their ids."""
+    user_ids = list(
+        stale_anonymous_users(cutoff).order_by("pk").values_list("pk", flat=True)[
+            :batch_size
+        ]
+    )
+    if user_ids:
+        User.objects.filter(pk__in=user_ids).delete()
+    return user_ids
+
+
+def prune_sessions(user_ids, batch_size=BATCH_SIZE):
+    """Delete the unexpired sessions signed in as any of `user_ids`.
+
+    Sessions can't be filtered by user in SQL, so this decodes them a batch
+    at a time; expired ones are left to `clearsessions`.
+    """
+    user_ids = {str(pk) for pk in user_ids}
+    store = SessionStore()
+    live = Session.objects.filter(expire_date__gt=timezone.now())
+    deleted = 0
+    last_key = ""
+    while True:
+        batch = list(
+            live.filter(session_key__gt=last_key)
+            .order_by("session_key")
+            .values_list("session_key", "session_data")[:batch_size]
+        )
+        if not batch:
+            return deleted
+        last_key = batch[-1][0]
+        doomed = [
+            key
+            for key, data in batch
+            if store.decode(data).get("_auth_user_id") in user_ids
+        ]
+        deleted += Session.objects.filter(session_key__in=doomed).delete()[0]
@@ -0,0 +1,69 @@
+"""Delete anonymous accounts nobody has used in a while, and their sessions.
+
+Accounts under the anonymous email domain with no sign-in for
+GUEST_RETENTION_DAYS (or --days) are deleted a batch at a time, unless they
+still own votes, saved mixes, or an artist or venue profile (see
+login.guests.stale_anonymous_users). Run it daily, after `archive_votes`.
+
+Usage:
+    uv run src/main.py prune_anonymous
+    uv run src/main.py prune_anonymous --days 7
+    uv run src/main.py prune_anonymous --dry-run
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from login.guests import BATCH_SIZE, prune_batch, prune_sessions, stale_anonymous_users
+
+
+class Command(BaseCommand):
+    help = "Delete stale anonymous accounts and their sessions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=None,
+            help="Days without use before removal (default: GUEST_RETENTION_DAYS).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help=f"Accounts deleted per transaction (default {BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report how many accounts would be removed without deleting any.",
+        )
+
+    def handle(self, *args, **options):
+        days = options["days"]
+        if days is None:
+            days = settings.GUEST_RETENTION_DAYS
+        cutoff = timezone.now() - timedelta(days=days)
+
+        if options["dry_run"]:
+            count = stale_anonymous_users(cutoff).count()
+            self.stdout.write(
+                f"Would remove {count} anonymous accounts unused since "
+                f"{cutoff:%Y-%m-%d %H:%M}."
+            )
+            return
+
+        pruned = []
+        while user_ids := prune_batch(cutoff, options["batch_size"]):
+            pruned.extend(user_ids)
+            self.stdout.write(f"  {len(pruned)} accounts removed…")
+        sessions = prune_sessions(pruned, options["batch_size"]) if pruned else 0
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done: {len(pruned)} anonymous accounts and {sessions} sessions removed."
+            )
+        )
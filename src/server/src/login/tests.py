@@ -0,0 +1,163 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from django_tasks.backends.database.models import DBTaskResult
+
+from core.models import Listener, User
+from core.testing import QueryBudgetTestCase
+from login.guests import GUEST_COOKIE, create_anonymous_user
+from vote.models import Vote
+
+
+class LoginQueryBudgetTests(QueryBudgetTestCase):
+    def test_login_card(self):
+        self.assertQueryBudget(2, "get", reverse("login:login_card"))
+
+    def test_check_email(self):
+        for email in (self.user.email, "newcomer@example.com"):
+            with self.subTest(email=email):
+                self.assertQueryBudget(
+                    13, "post", reverse("login:check_email"), {"email": email}
+                )
+
+    def test_check_email_queues_the_code_instead_of_sending_it(self):
+        self.client.post(
+            reverse("login:check_email"),
+            {"email": self.user.email},
+            headers={"HX-Request": "true"},
+        )
+
+        self.assertEqual(mail.outbox, [])
+        queued = DBTaskResult.objects.get()
+        kwargs = queued.args_kwargs["kwargs"]
+        self.assertEqual(queued.task_path, "core.tasks.send_auth_email_task")
+        self.assertEqual(kwargs["to_email"], self.user.email)
+        self.assertIn(self.client.session["login_code"], kwargs["body"])
+
+    def test_verify_code(self):
+        session = self.client.session
+        session["login_email"] = self.user.email
+        session["login_code"] = "123456"
+        session.save()
+
+        self.assertQueryBudget(
+            15, "post", reverse("login:verify_code"), {"code": "123456"}
+        )
+
+    def test_cancel_code(self):
+        self.assertQueryBudget(2, "post", reverse("login:cancel_code"))
+
+    def test_login_anonymously(self):
+        self.assertQueryBudget(1, "post", reverse("login:login_anonymously"))
+
+    def test_logout(self):
+        self.client.force_login(self.user)
+
+        self.assertQueryBudget(2, "get", reverse("login:logout_modal"))
+        self.assertQueryBudget(6, "post", reverse("login:logout"))
+
+
+class GuestTests(QueryBudgetTestCase):
+    def continue_as_guest(self):
+        response = self.client.post(
+            reverse("login:login_anonymously"), headers={"HX-Request": "true"}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def vote(self):
+        return self.client.post(
+            reverse("vote:submit_vote"),
+            headers={"HX-Request": "true"},
+            query_params={"player": self.player.token, "choice": "1"},
+        )
+
+    def test_continuing_anonymously_creates_no_account(self):
+        users = User.objects.count()
+
+        response = self.continue_as_guest()
+        username = response.wsgi_request.user.username
+        response = self.client.get(reverse("vote:vote"))
+
+        self.assertEqual(User.objects.count(), users)
+        self.assertEqual(response.wsgi_request.user.username, username)
+        self.assertTrue(response.wsgi_request.user.is_authenticated)
+
+    def test_first_vote_creates_the_account(self):
+        username = self.continue_as_guest().wsgi_request.user.username
+
+        response = self.vote()
+
+        user = User.objects.get(username=username)
+        self.assertTrue(user.is_anonymous_account)
+        self.assertFalse(user.has_usable_password())
+        self.assertEqual(Vote.objects.filter(voter__user=user).count(), 1)
+        self.assertEqual(self.client.session["_auth_user_id"], str(user.pk))
+        self.assertEqual(response.cookies[GUEST_COOKIE].value, "")
+
+        self.client.get(reverse("vote:vote"))
+        self.assertEqual(User.objects.filter(username=username).count(), 1)
+
+    def test_forged_cookie_is_ignored(self):
+        self.client.cookies[GUEST_COOKIE] = "BraveOwl42"
+
+        response = self.client.get(reverse("vote:vote"))
+
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    def test_logout_forgets_the_guest(self):
+        self.continue_as_guest()
+
+        response = self.client.post(
+            reverse("login:logout"), headers={"HX-Request": "true"}
+        )
+
+        self.assertEqual(response.cookies[GUEST_COOKIE].value, "")
+
+
+class PruneAnonymousTests(QueryBudgetTestCase):
+    def anonymous_user(self, username, days_ago):
+        user = create_anonymous_user(username)
+        then = timezone.now() - timedelta(days=days_ago)
+        User.objects.filter(pk=user.pk).update(date_joined=then, last_login=then)
+        return user
+
+    def test_stale_accounts_and_their_sessions_are_removed(self):
+        stale = self.anonymous_user("StaleOwl1", days_ago=40)
+        self.client.force_login(stale)
+        User.objects.filter(pk=stale.pk).update(
+            last_login=timezone.now() - timedelta(days=40)
+        )
+        recent = self.anonymous_user("RecentOwl2", days_ago=2)
+        voter = self.anonymous_user("VotingOwl3", days_ago=40)
+        Vote.objects.create(
+            voter=voter.listener,
+            player=self.player,
+            cosound=Vote.objects.first().cosound,
+            value=Vote.UPVOTE,
+        )
+
+        out = StringIO()
+        call_command("prune_anonymous", stdout=out)
+
+        self.assertIn("1 anonymous accounts and 1 sessions removed", out.getvalue())
+        self.assertFalse(User.objects.filter(pk=stale.pk).exists())
+        self.assertFalse(Listener.objects.filter(user_id=stale.pk).exists())
+        self.assertFalse(Session.objects.exists())
+        self.assertEqual(
+            User.objects.filter(pk__in=[recent.pk, voter.pk, self.user.pk]).count(), 3
+        )
+
+    def test_dry_run_deletes_nothing(self):
+        self.anonymous_user("StaleOwl1", days_ago=40)
+        out = StringIO()
+
+        call_command("prune_anonymous", "--dry-run", stdout=out)
+
+        self.assertIn("Would remove 1 anonymous accounts", out.getvalue())
+        self.assertTrue(User.objects.filter(username="StaleOwl1").exists())
@@ -7,9 +7,9 @@ from django.shortcuts import render
 from core.models import Listener, User
 from core.utils import add_card, close_modal, pop_card, show_modal
 from login.adapters import UnifiedRequestLoginCodeForm
+from login.guests import Guest, forget_guest, remember_guest
 from login.utils import (
     clear_login_state,
-    generate_anon_email,
     generate_anon_username,
     get_login_state,
     send_login_code,
@@ -119,29 +119,12 @@ def verify_code(request):
 
 
 def login_anonymously(request):
+    """Continue as a guest; the account is created on first use (login.guests)."""
     if not request.htmx or request.method != "POST":
         return HttpResponse("Request Denied.")
 
-    try:
-        username = generate_anon_username()
-        user = User.objects.create_user(
-            username=username,
-            email=generate_anon_email(username),
-            password=None,
-        )
-        user.set_unusable_password()
-        user.save()
-        Listener.objects.get_or_create(user=user)
-        login(request, user, backend="django.contrib.auth.backends.ModelBackend")
-    except Exception:
-        return show_modal(
-            request,
-            "core/modal_alert.html",
-            {
-                "alert_msg": "Failed to continue anonymously. Please try again later.",
-                "alert_type": "alert-warning",
-            },
-        )
+    username = generate_anon_username()
+    request.user = Guest(username)
 
     post_login_partial = request.session.pop(
         "post_login_partial", "login/index.html#post_login"
@@ -150,6 +133,7 @@ def login_anonymously(request):
     response["HX-Trigger"] = json.dumps(
         {"card:remove": True, "auth-success": True}
     )
+    remember_guest(response, username)
     return response
 
 
@@ -173,4 +157,5 @@ def perform_logout(request):
     logout(request)
     response = HttpResponse("")
     response["HX-Refresh"] = "true"
+    forget_guest(response)
     return response
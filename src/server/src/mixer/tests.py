@@ -0,0 +1,50 @@
+import json
+
+from django.urls import reverse
+
+from core.testing import QueryBudgetTestCase
+
+
+class MixerQueryBudgetTests(QueryBudgetTestCase):
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def layers_json(self, sounds):
+        return json.dumps(
+            [{"sound_id": sound.pk, "sound_gain": 0.5} for sound in sounds]
+        )
+
+    def test_index(self):
+        self.assertQueryBudget(9, "get", reverse("mixer:index"))
+
+    def test_save(self):
+        self.assertQueryBudget(
+            5,
+            "post",
+            reverse("mixer:save"),
+            {"layers": self.layers_json(self.sounds[:4])},
+        )
+
+    def test_save_confirm(self):
+        self.assertQueryBudget(
+            20,
+            "post",
+            reverse("mixer:save_confirm"),
+            {"layers": self.layers_json(self.sounds[50:58]), "title": "New mix"},
+        )
+
+    def test_keep_sound(self):
+        self.assertQueryBudget(
+            8, "post", reverse("mixer:keep_sound"), {"sound_id": self.sounds[90].pk}
+        )
+
+    def test_swap(self):
+        self.assertQueryBudget(8, "get", reverse("mixer:swap"))
+
+    def test_search(self):
+        for query in ("", "Sound 1", "Artist 3"):
+            with self.subTest(query=query):
+                self.assertQueryBudget(7, "get", reverse("mixer:search"), {"q": query})
+
+    def test_carousel(self):
+        self.assertQueryBudget(2, "get", reverse("mixer:carousel"))
@@ -1,5 +1,8 @@
 import json
 
+from core.renditions import CARD_WIDTH
+from login.guests import has_account
+
 
 def parse_layers(raw):
     """Split a posted mix into its raw form and the (sound_id, gain) pairs.
@@ -44,7 +47,7 @@ def get_random_sounds(user=None):
     from core.models import Listener, Sound
 
     saved_ids = set()
-    if user and user.is_authenticated:
+    if has_account(user):
         try:
             saved_ids = set(
                 Listener.objects.get(user=user).collection.values_list("id", flat=True)
@@ -58,20 +61,33 @@ def get_random_sounds(user=None):
     sounds = [
         {
             **sound.asLayer(with_gain=round(random.uniform(0.1, 0.9), 2)),
-            "artwork_url": sound.art.url if sound.art else "",
+            "artwork_url": sound.image_url("art", CARD_WIDTH),
+            "artwork_avif_url": sound.image_url("art", CARD_WIDTH, "avif", False),
             "mute": False,
             "saved": sound.pk in saved_ids,
             "flavor": sound.flavor or "",
-            "tags": " / ".join(sound.tags.names()) or "Unknown",
+            "tags": " / ".join(sound.tag_names) or "Unknown",
         }
-        for sound in Sound.objects.filter(id__in=sound_ids).prefetch_related("tags")
+        for sound in Sound.objects.filter(id__in=sound_ids)
+        .select_related("artist")
+        .prefetch_related("tags")
     ]
     for sound in sounds[OPENING_AUDIBLE_LAYERS:]:
         sound["mute"] = True
     return sounds
 
 
+def with_layer_relations(sounds):
+    """`sounds` with the artist and tags every serialized layer shows."""
+    return sounds.select_related("artist").prefetch_related("tags")
+
+
 def serialize_sounds(sounds):
+    """Swap-list entries for `sounds`.
+
+    Pass a queryset built with `with_layer_relations`, so the artist and tags
+    each entry shows come from a fixed number of queries.
+    """
     return [
         {
             **sound.asLayer(with_gain=0.5),
@@ -79,7 +95,7 @@ def serialize_sounds(sounds):
             "mute": False,
             "saved": True,
             "flavor": sound.flavor or "",
-            "tags": " / ".join(sound.tags.names()) or "Unknown",
+            "tags": " / ".join(sound.tag_names) or "Unknown",
             "artwork_url": generate_sound_artwork(sound),
             "id": sound.id,
             "title": sound.title,
@@ -1,13 +1,19 @@
 import json
 
-from django.db.models import Q
+from django.db.models import Q, prefetch_related_objects
 from django.http import HttpResponse
 from django.shortcuts import render
 from core.models import Cosound, Listener, Sound
 from core.utils import add_card, close_modal, show_modal
-from app.utils import serialize_mix
+from app.utils import MIX_PREFETCH, serialize_mix
+from login.guests import has_account, materialize
 from mixer.models import SoundMix
-from mixer.utils import get_random_sounds, parse_layers, serialize_sounds
+from mixer.utils import (
+    get_random_sounds,
+    parse_layers,
+    serialize_sounds,
+    with_layer_relations,
+)
 
 
 def mixer_index(request):
@@ -43,9 +49,11 @@ def mixer_save(request):
         return HttpResponse("No layers provided.", status=400)
 
     hashid = Cosound.compute_hashid(layers)
-    existing = SoundMix.objects.filter(
-        creator=request.user, cosound__hashid=hashid
-    ).first()
+    existing = None
+    if has_account(request.user):
+        existing = SoundMix.objects.filter(
+            creator=request.user, cosound__hashid=hashid
+        ).first()
 
     return show_modal(
         request,
@@ -72,7 +80,7 @@ def mixer_save_confirm(request):
 
     cosound = Cosound.get_or_create_from_layers(layers)
     sound_mix, created = SoundMix.objects.get_or_create(
-        creator=request.user, cosound=cosound
+        creator=materialize(request), cosound=cosound
     )
     sound_mix.title = title
     sound_mix.save(update_fields=["title", "updated_at"])
@@ -80,6 +88,7 @@ def mixer_save_confirm(request):
     if not created:
         return close_modal(request)
 
+    prefetch_related_objects([sound_mix], *MIX_PREFETCH)
     response = close_modal(request)
     response["HX-Trigger"] = json.dumps(
         {
@@ -107,7 +116,7 @@ def mixer_keep_sound(request):
     except Sound.DoesNotExist:
         return HttpResponse("Sound not found.", status=404)
 
-    listener, _ = Listener.objects.get_or_create(user=request.user)
+    listener, _ = Listener.objects.get_or_create(user=materialize(request))
     if listener.collection.filter(pk=sound.pk).exists():
         listener.collection.remove(sound)
         saved = False
@@ -130,11 +139,11 @@ def mixer_swap(request):
     if not request.user.is_authenticated:
         return HttpResponse("Request Denied.", status=401)
 
-    try:
-        listener = Listener.objects.get(user=request.user)
-        qs = listener.collection.all()
-    except Listener.DoesNotExist:
-        qs = Sound.objects.none()
+    qs = Sound.objects.none()
+    if has_account(request.user):
+        listener = Listener.objects.filter(user=request.user).first()
+        if listener is not None:
+            qs = with_layer_relations(listener.collection.all())
 
     collection_size = qs.count()
     sounds = serialize_sounds(qs.order_by("?")[:5])
@@ -152,11 +161,11 @@ def mixer_search(request):
     if not request.user.is_authenticated:
         return HttpResponse("Request Denied.", status=401)
 
-    try:
-        listener = Listener.objects.get(user=request.user)
-        qs = listener.collection.all()
-    except Listener.DoesNotExist:
-        qs = Sound.objects.none()
+    qs = Sound.objects.none()
+    if has_account(request.user):
+        listener = Listener.objects.filter(user=request.user).first()
+        if listener is not None:
+            qs = with_layer_relations(listener.collection.all())
 
     q = (request.GET.get("q") or "").strip()
     if q:
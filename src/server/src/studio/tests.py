@@ -0,0 +1,27 @@
+from django.urls import reverse
+
+from core.testing import QueryBudgetTestCase
+
+
+class StudioQueryBudgetTests(QueryBudgetTestCase):
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_index(self):
+        self.assertQueryBudget(2, "get", reverse("studio:index"), htmx=False)
+
+    def test_initial(self):
+        self.assertQueryBudget(6, "get", reverse("studio:initial"))
+
+    def test_library(self):
+        self.assertQueryBudget(9, "get", reverse("studio:library"))
+
+    def test_library_search(self):
+        for query in ("", "Sound 1", "Artist 3"):
+            with self.subTest(query=query):
+                self.assertQueryBudget(
+                    8, "get", reverse("studio:library_search"), {"q": query}
+                )
+
+    def test_carousel(self):
+        self.assertQueryBudget(2, "get", reverse("studio:carousel"))
@@ -7,10 +7,11 @@ def get_artist(user):
     ``Artist.user`` is a plain FK, so a user can in principle own several artist
     profiles; the studio works against the earliest one.
     """
-    if not user or not user.is_authenticated:
-        return None
-
     from core.models import Artist
+    from login.guests import has_account
+
+    if not has_account(user):
+        return None
 
     return Artist.objects.filter(user=user).order_by("pk").first()
 
@@ -3,7 +3,7 @@ from django.http import HttpResponse
 from django.shortcuts import render
 
 from core.models import Listener
-from mixer.utils import serialize_sounds
+from mixer.utils import serialize_sounds, with_layer_relations
 from studio.utils import get_artist
 
 # The studio's views. The builder is served two ways from the same partials:
@@ -53,7 +53,7 @@ def _library(user):
     uses — an artist builds with sounds they have kept, not the whole catalogue.
     """
     try:
-        return Listener.objects.get(user=user).collection.all()
+        return with_layer_relations(Listener.objects.get(user=user).collection.all())
     except Listener.DoesNotExist:
         from core.models import Sound
 
@@ -1,6 +1,10 @@
+from datetime import timedelta
+
 from django.contrib import admin
+from django.db.models import Sum
 from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 
 from unfold.admin import ModelAdmin, TabularInline
@@ -9,8 +13,9 @@ from core.models import Listener, Player
 from core.admin import (
     ListenerAdmin as CoreListenerAdmin,
     PlayerAdmin as CorePlayerAdmin,
+    paginated_panel,
 )
-from vote.models import Vote
+from vote.models import ListenerTagRollup, Vote, VoteArchive, VoteRollup
 
 
 class VoteInline(TabularInline):
@@ -23,6 +28,36 @@ class VoteAdmin(ModelAdmin):
     list_display = ["voter", "player", "value", "created_at"]
 
 
+class DerivedDataAdmin(ModelAdmin):
+    """Rollups and archives are derived from votes; view them, don't edit."""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(VoteRollup)
+class VoteRollupAdmin(DerivedDataAdmin):
+    list_display = ["player", "cosound", "bucket", "upvotes", "downvotes"]
+    list_filter = ["player"]
+    list_select_related = ["player"]
+    date_hierarchy = "bucket"
+
+
+@admin.register(ListenerTagRollup)
+class ListenerTagRollupAdmin(DerivedDataAdmin):
+    list_display = ["listener", "tag", "upvotes", "downvotes"]
+    list_select_related = ["listener__user", "tag"]
+
+
+@admin.register(VoteArchive)
+class VoteArchiveAdmin(DerivedDataAdmin):
+    list_display = ["day", "vote_count", "first_vote_id", "last_vote_id", "file"]
+    date_hierarchy = "day"
+
+
 admin.site.unregister(Player)
 
 
@@ -30,18 +65,54 @@ admin.site.unregister(Player)
 class PlayerAdmin(CorePlayerAdmin):
     readonly_fields = tuple(getattr(CorePlayerAdmin, "readonly_fields", ())) + (
         "vote_urls",
+        "vote_activity_display",
     )
     fieldsets = list(CorePlayerAdmin.fieldsets) + [
         (
             "Player Utilities",
             {"fields": ["token_display", "vote_urls"]},
         ),
+        (
+            "Vote Activity",
+            {"classes": ["tab"], "fields": ["vote_activity_display"]},
+        ),
     ]
 
+    @admin.display(description="Votes, last 24 hours")
+    def vote_activity_display(self, obj):
+        if not obj:
+            return ""
+        since = timezone.now() - timedelta(hours=24)
+        hours = (
+            VoteRollup.objects.filter(player=obj, bucket__gte=since)
+            .values("bucket")
+            .annotate(up=Sum("upvotes"), down=Sum("downvotes"))
+            .order_by("-bucket")
+        )
+        rows = [
+            f'<li class="py-2 border-b border-base-200 dark:border-base-800 last:border-0 flex items-center gap-3">'
+            f'<span class="font-medium text-font-default-light dark:text-font-default-dark">{h["bucket"]:%Y-%m-%d %H:00}</span>'
+            f'<span class="text-green-600 ml-auto">▲ {h["up"]}</span>'
+            f'<span class="text-red-600">▼ {h["down"]}</span>'
+            f"</li>"
+            for h in hours
+        ]
+        if not rows:
+            return mark_safe(
+                '<div class="text-sm text-font-subtle-light dark:text-font-subtle-dark">'
+                "No votes in the last 24 hours"
+                "</div>"
+            )
+        return mark_safe(
+            '<ul class="rounded-default border border-base-200 dark:border-base-800 px-4 bg-white dark:bg-base-900 list-none m-0">'
+            + "".join(rows)
+            + "</ul>"
+        )
+
     def vote_urls(self, obj):
         if not obj or not obj.token:
             return "—"
-        request = getattr(self, "_current_request", None)
+        request = self.request
         # Resolve against the root URLconf explicitly: on the admin subdomain
         # the active urlconf (config.urls_admin) only mounts the admin and has
         # no "vote" namespace, so a plain reverse() would raise NoReverseMatch.
@@ -62,10 +133,6 @@ class PlayerAdmin(CorePlayerAdmin):
             )
         )
 
-    def get_form(self, request, obj=None, change=False, **kwargs):
-        self._current_request = request
-        return super().get_form(request, obj, change, **kwargs)
-
     vote_urls.short_description = "NFC URLs"  # type: ignore
 
 
@@ -86,32 +153,28 @@ class ListenerAdmin(CoreListenerAdmin):
 
     @admin.display(description="Votes")
     def votes_display(self, obj):
-        votes = (
-            list(obj.vote_set.select_related("player").order_by("-created_at"))
-            if obj
-            else []
-        )
-        if not votes:
-            return mark_safe(
-                '<div class="text-sm text-font-subtle-light dark:text-font-subtle-dark">'
-                "No votes"
-                "</div>"
-            )
-        rows = []
-        for v in votes:
+        def row(v):
             url = reverse("admin:vote_vote_change", args=[v.pk])
             color = "text-green-600" if v.value > 0 else "text-red-600"
             arrow = "▲" if v.value > 0 else "▼"
             ts = v.created_at.strftime("%Y-%m-%d %H:%M")
-            rows.append(
+            return (
                 f'<li class="py-2 border-b border-base-200 dark:border-base-800 last:border-0 flex items-center gap-3">'
                 f'<span class="{color} font-bold">{arrow}</span>'
                 f'<a href="{url}" class="font-medium text-font-default-light dark:text-font-default-dark hover:underline">{v.player}</a>'
                 f'<span class="text-xs text-font-subtle-light dark:text-font-subtle-dark ml-auto">{ts}</span>'
                 f"</li>"
             )
-        return mark_safe(
-            '<ul class="rounded-default border border-base-200 dark:border-base-800 px-4 bg-white dark:bg-base-900 list-none m-0">'
-            + "".join(rows)
-            + "</ul>"
+
+        votes = (
+            obj.vote_set.select_related("player").order_by("-created_at", "-pk")
+            if obj
+            else Vote.objects.none()
+        )
+        return paginated_panel(
+            self.request,
+            votes,
+            "votes_page",
+            row,
+            "No votes",
         )
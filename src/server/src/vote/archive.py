@@ -0,0 +1,116 @@
+"""Retention for raw votes: archive old ones to storage, keep the table hot.
+
+Every hot-path read (throttle, predictor window, recent-vote feed) looks at
+minutes of history, so votes older than VOTE_RETENTION_DAYS are moved out of
+the Vote table into gzipped JSON Lines files, one VoteArchive row per file.
+The table, its indexes and its vacuum cost then stay proportional to the
+retention window rather than to all history.
+
+Only votes already folded into the rollups (pk at or below the rollup
+watermark) are archived, so aggregates never lose data; `rollup_votes
+--rebuild` replays these files before the table. The refresh scheduler
+enqueues archive_expired_votes every ARCHIVE_INTERVAL.
+
+File format: a header line {"columns": [...]} followed by one JSON array per
+vote in that column order.
+"""
+
+import gzip
+import io
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from django_tasks import task
+
+from vote.models import RollupWatermark, Vote, VoteArchive
+from vote.rollups import ARCHIVE_LOCK, WATERMARK, lock
+
+BATCH_SIZE = 5000
+ARCHIVE_INTERVAL = timedelta(hours=1)
+COLUMNS = ["id", "voter_id", "player_id", "cosound_id", "value", "section", "created_at"]
+
+
+def retention_cutoff(days=None):
+    if days is None:
+        days = settings.VOTE_RETENTION_DAYS
+    return timezone.now() - timedelta(days=days)
+
+
+def _write_archive(day, rows):
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb") as archive:
+        archive.write((json.dumps({"columns": COLUMNS}) + "\n").encode())
+        for row in rows:
+            row = [*row[:-1], row[-1].isoformat()]
+            archive.write((json.dumps(row) + "\n").encode())
+    first, last = rows[0][0], rows[-1][0]
+    vote_archive = VoteArchive(
+        day=day, first_vote_id=first, last_vote_id=last, vote_count=len(rows)
+    )
+    vote_archive.file.save(
+        f"{day:%Y/%m/%d}-{first}-{last}.jsonl.gz",
+        ContentFile(buffer.getvalue()),
+        save=False,
+    )
+    return vote_archive
+
+
+def archive_batch(cutoff, batch_size=BATCH_SIZE):
+    """Archive up to `batch_size` expired, rolled-up votes; return how many."""
+    with transaction.atomic():
+        # Two runs never archive the same votes twice, and a rollup rebuild
+        # never misses a file written while it replays.
+        lock(ARCHIVE_LOCK)
+        watermark = (
+            RollupWatermark.objects.filter(name=WATERMARK)
+            .values_list("last_vote_id", flat=True)
+            .first()
+        )
+        if not watermark:
+            return 0
+
+        rows = list(
+            Vote.objects.filter(created_at__lt=cutoff, pk__lte=watermark)
+            .order_by("pk")
+            .values_list(*COLUMNS)[:batch_size]
+        )
+        if not rows:
+            return 0
+
+        by_day = defaultdict(list)
+        for row in rows:
+            by_day[row[-1].astimezone(dt_timezone.utc).date()].append(row)
+        # Files go to storage first: a failure before the delete leaves the
+        # votes in place (and at worst an orphaned file), never a gap.
+        archives = [_write_archive(day, day_rows) for day, day_rows in by_day.items()]
+        VoteArchive.objects.bulk_create(archives)
+        Vote.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        return len(rows)
+
+
+def archive_votes(days=None, batch_size=BATCH_SIZE):
+    cutoff = retention_cutoff(days)
+    total = 0
+    while archived := archive_batch(cutoff, batch_size):
+        total += archived
+    return total
+
+
+def iter_archived_votes(vote_archive):
+    """Yield each vote in an archive file as a dict keyed by COLUMNS."""
+    with vote_archive.file.open("rb") as raw, gzip.GzipFile(fileobj=raw) as lines:
+        columns = json.loads(lines.readline())["columns"]
+        for line in lines:
+            vote = dict(zip(columns, json.loads(line)))
+            vote["created_at"] = datetime.fromisoformat(vote["created_at"])
+            yield vote
+
+
+@task()
+def archive_expired_votes():
+    return archive_votes()
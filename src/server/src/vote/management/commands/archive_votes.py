@@ -0,0 +1,74 @@
+"""Move votes past the retention window out of the Vote table.
+
+Votes older than VOTE_RETENTION_DAYS (or --days) that the rollups have
+already counted are written to gzipped JSON Lines files in media storage,
+one VoteArchive row per file, and deleted from the table. The refresh
+scheduler already does this every hour; run it by hand to catch up or to
+try a different --days.
+
+Usage:
+    uv run src/main.py archive_votes
+    uv run src/main.py archive_votes --days 30
+    uv run src/main.py archive_votes --dry-run
+"""
+
+from django.core.management.base import BaseCommand
+
+from vote.archive import BATCH_SIZE, archive_batch, retention_cutoff
+from vote.models import RollupWatermark, Vote
+from vote.rollups import WATERMARK
+
+
+class Command(BaseCommand):
+    help = "Archive votes older than the retention window to storage."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=None,
+            help="Retention in days (default: VOTE_RETENTION_DAYS).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help=f"Votes archived per transaction (default {BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report how many votes would be archived without moving any.",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = retention_cutoff(options["days"])
+        expired = Vote.objects.filter(created_at__lt=cutoff)
+        watermark = (
+            RollupWatermark.objects.filter(name=WATERMARK)
+            .values_list("last_vote_id", flat=True)
+            .first()
+            or 0
+        )
+        pending_rollup = expired.filter(pk__gt=watermark).count()
+        if pending_rollup:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{pending_rollup} expired votes aren't rolled up yet and "
+                    "will be kept; run `rollup_votes` first."
+                )
+            )
+
+        if options["dry_run"]:
+            count = expired.filter(pk__lte=watermark).count()
+            self.stdout.write(
+                f"Would archive {count} votes cast before {cutoff:%Y-%m-%d %H:%M}."
+            )
+            return
+
+        total = 0
+        while archived := archive_batch(cutoff, options["batch_size"]):
+            total += archived
+            self.stdout.write(f"  {total} votes archived…")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {total} votes archived."))
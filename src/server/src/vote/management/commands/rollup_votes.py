@@ -0,0 +1,46 @@
+"""Fold votes into VoteRollup and ListenerTagRollup.
+
+The refresh scheduler keeps the rollups current; run this to catch up after
+downtime, or with --rebuild to recompute them from every stored vote (e.g.
+after adding rollups to a database that already has votes). A rebuild
+replays the archive_votes files first, then the Vote table.
+
+Usage:
+    uv run src/main.py rollup_votes             # catch up from the watermark
+    uv run src/main.py rollup_votes --rebuild   # drop and replay all votes, archived too
+"""
+
+from django.core.management.base import BaseCommand
+
+from vote.rollups import BATCH_SIZE, reset_rollups, roll_up_batch
+
+
+class Command(BaseCommand):
+    help = "Bring the vote rollup tables up to date, or rebuild them from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Delete the rollups and replay every vote, archived ones included.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help=f"Votes folded per transaction (default {BATCH_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            reset_rollups()
+            self.stdout.write(
+                self.style.WARNING("Cleared existing rollups and replayed the archives.")
+            )
+
+        total = 0
+        while processed := roll_up_batch(options["batch_size"]):
+            total += processed
+            self.stdout.write(f"  {total} votes rolled up…")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {total} votes rolled up."))
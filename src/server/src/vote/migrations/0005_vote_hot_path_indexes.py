@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-19 05:14
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction, and building
+    # these without it would block vote inserts for the length of the build.
+    atomic = False
+
+    dependencies = [
+        ('core', '0006_player_playing_cosound'),
+        ('vote', '0004_vote_section'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='vote',
+            index=models.Index(fields=['player', 'created_at'], name='vote_player_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='vote',
+            index=models.Index(fields=['voter', 'created_at'], name='vote_voter_created_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 6.0 on 2026-10-19 05:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_sound_import'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        ('vote', '0005_vote_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('name', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('last_vote_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ListenerTagRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('upvotes', models.PositiveIntegerField(default=0)),
+                ('downvotes', models.PositiveIntegerField(default=0)),
+                ('listener', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.listener')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='taggit.tag')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('listener', 'tag'), name='listener_tag_rollup_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VoteRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('upvotes', models.PositiveIntegerField(default=0)),
+                ('downvotes', models.PositiveIntegerField(default=0)),
+                ('cosound', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.cosound')),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.player')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['player', 'bucket'], name='vote_rollup_player_bucket_idx')],
+                'constraints': [models.UniqueConstraint(fields=('player', 'cosound', 'bucket'), name='vote_rollup_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-19 05:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vote', '0006_vote_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoteArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('first_vote_id', models.BigIntegerField()),
+                ('last_vote_id', models.BigIntegerField()),
+                ('vote_count', models.PositiveIntegerField()),
+                ('file', models.FileField(upload_to='vote-archive/')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['day', 'first_vote_id'],
+            },
+        ),
+    ]
@@ -2,14 +2,16 @@ from datetime import datetime, timezone, timedelta
 from typing import Iterable, List
 
 from django.db import models as db_models
+from taggit.models import Tag
 
 from core.models import Cosound, Player, Listener
 
 
 class Vote(db_models.Model):  # Database Class
 
+    # The values submit_vote stores: the phone sends choice=1 or choice=0.
     UPVOTE = 1
-    DOWNVOTE = -1
+    DOWNVOTE = 0
 
     voter = db_models.ForeignKey(
         Listener,
@@ -28,18 +30,136 @@ class Vote(db_models.Model):  # Database Class
     created_at = db_models.DateTimeField(auto_now_add=True)
     updated_at = db_models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Vote.recent's window and serialize_recent_votes' newest-first
+            # feed (read backwards) are both ranges within one player.
+            db_models.Index(
+                fields=["player", "created_at"], name="vote_player_created_idx"
+            ),
+            # The throttle's "when did this listener last vote".
+            db_models.Index(
+                fields=["voter", "created_at"], name="vote_voter_created_idx"
+            ),
+        ]
+
     def __str__(self):
         return f"{self.voter} voted {self.value} for {self.player}"
 
     @classmethod
     def recent(cls, player: Player, minutes: int = 30) -> List["Vote"]:
         cutoff = datetime.now(timezone.utc) - timedelta(minutes=minutes)
-        return list(cls.objects.filter(player=player, created_at__gte=cutoff))
+        return list(
+            cls.objects.filter(player=player, created_at__gte=cutoff).select_related(
+                "voter"
+            )
+        )
 
     @staticmethod
     def get_listeners(votes: Iterable["Vote"]) -> List[Listener]:
         seen: dict[int, Listener] = {}
         for vote in votes:
-            if vote.voter.pk not in seen:
-                seen[vote.voter.pk] = vote.voter
+            if vote.voter_id not in seen:
+                seen[vote.voter_id] = vote.voter
         return list(seen.values())
+
+
+class VoteRollup(db_models.Model):
+    """Up/down vote counts per player, cosound and hour.
+
+    Maintained incrementally by vote.rollups.roll_up_votes; read this instead
+    of scanning Vote for anything coarser than the last few minutes.
+    """
+
+    player = db_models.ForeignKey(Player, on_delete=db_models.CASCADE)
+    cosound = db_models.ForeignKey(Cosound, on_delete=db_models.CASCADE)
+    bucket = db_models.DateTimeField()  # start of the hour, UTC
+    upvotes = db_models.PositiveIntegerField(default=0)
+    downvotes = db_models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            db_models.UniqueConstraint(
+                fields=["player", "cosound", "bucket"], name="vote_rollup_unique"
+            ),
+        ]
+        indexes = [
+            db_models.Index(
+                fields=["player", "bucket"], name="vote_rollup_player_bucket_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.player} {self.bucket:%Y-%m-%d %H:00}: +{self.upvotes}/-{self.downvotes}"
+
+    @classmethod
+    def totals(cls, player: Player, since: datetime) -> dict[int, tuple[int, int]]:
+        """{cosound_id: (upvotes, downvotes)} for a player's buckets since `since`."""
+        rows = (
+            cls.objects.filter(player=player, bucket__gte=since)
+            .values("cosound_id")
+            .annotate(up=db_models.Sum("upvotes"), down=db_models.Sum("downvotes"))
+        )
+        return {row["cosound_id"]: (row["up"], row["down"]) for row in rows}
+
+
+class ListenerTagRollup(db_models.Model):
+    """Up/down votes a listener has cast on cosounds containing each tag.
+
+    A vote counts once per distinct tag across the cosound's sounds.
+    """
+
+    listener = db_models.ForeignKey(Listener, on_delete=db_models.CASCADE)
+    tag = db_models.ForeignKey(Tag, on_delete=db_models.CASCADE, related_name="+")
+    upvotes = db_models.PositiveIntegerField(default=0)
+    downvotes = db_models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            db_models.UniqueConstraint(
+                fields=["listener", "tag"], name="listener_tag_rollup_unique"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.listener} {self.tag}: +{self.upvotes}/-{self.downvotes}"
+
+    @classmethod
+    def scores(cls, listener_ids: Iterable[int]) -> dict[int, dict[int, int]]:
+        """{listener_id: {tag_id: upvotes - downvotes}}."""
+        scores: dict[int, dict[int, int]] = {}
+        rows = cls.objects.filter(listener_id__in=list(listener_ids)).values_list(
+            "listener_id", "tag_id", "upvotes", "downvotes"
+        )
+        for listener_id, tag_id, up, down in rows:
+            scores.setdefault(listener_id, {})[tag_id] = up - down
+        return scores
+
+
+class RollupWatermark(db_models.Model):
+    """Highest Vote pk already folded into the rollups."""
+
+    name = db_models.CharField(max_length=64, primary_key=True)
+    last_vote_id = db_models.BigIntegerField(default=0)
+    updated_at = db_models.DateTimeField(auto_now=True)
+
+
+class VoteArchive(db_models.Model):
+    """One gzipped JSON Lines file of votes moved out of the Vote table.
+
+    Written by vote.archive.archive_votes once votes pass the retention
+    window and are already counted in the rollups.
+    """
+
+    day = db_models.DateField()  # UTC day every vote in the file was cast on
+    first_vote_id = db_models.BigIntegerField()
+    last_vote_id = db_models.BigIntegerField()
+    vote_count = db_models.PositiveIntegerField()
+    file = db_models.FileField(upload_to="vote-archive/")
+    created_at = db_models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["day", "first_vote_id"]
+
+    def __str__(self):
+        return f"{self.day}: votes {self.first_vote_id}–{self.last_vote_id}"
@@ -0,0 +1,197 @@
+"""Incremental vote rollups.
+
+roll_up_votes folds votes newer than the stored watermark into VoteRollup
+(player × cosound × hour) and ListenerTagRollup (listener × tag), one batch at
+a time. The refresh scheduler enqueues it every tick; `rollup_votes
+--rebuild` replays every vote from scratch, archived ones included.
+
+A batch stops at the first vote (in pk order) younger than ROLLUP_LAG and
+leaves it and everything after it for the next run, so a vote whose
+transaction commits after one with a higher pk is not skipped.
+
+core.predict.scoring_predictor reads ListenerTagRollup and tags the votes
+past the watermark itself with cosound_tags, counting them the same way.
+"""
+
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+from django_tasks import task
+from taggit.models import TaggedItem
+
+from core.models import Cosound, Listener, Player, Sound, SoundLayer
+from vote.models import (
+    ListenerTagRollup,
+    RollupWatermark,
+    Vote,
+    VoteArchive,
+    VoteRollup,
+)
+
+WATERMARK = "votes"
+# Held while archive files are written or replayed; its last_vote_id is unused.
+ARCHIVE_LOCK = "archive"
+BATCH_SIZE = 5000
+ROLLUP_LAG = timedelta(seconds=10)
+
+
+def _bucket(created_at):
+    return created_at.astimezone(dt_timezone.utc).replace(
+        minute=0, second=0, microsecond=0
+    )
+
+
+def cosound_tags(cosound_ids):
+    """{cosound_id: {tag_id, ...}} across each cosound's sounds."""
+    sounds_by_cosound = defaultdict(set)
+    for cosound_id, sound_id in SoundLayer.objects.filter(
+        mix_id__in=cosound_ids
+    ).values_list("mix_id", "sound_id"):
+        sounds_by_cosound[cosound_id].add(sound_id)
+
+    sound_ids = set().union(*sounds_by_cosound.values())
+    tags_by_sound = defaultdict(set)
+    for sound_id, tag_id in TaggedItem.objects.filter(
+        content_type=ContentType.objects.get_for_model(Sound),
+        object_id__in=sound_ids,
+    ).values_list("object_id", "tag_id"):
+        tags_by_sound[sound_id].add(tag_id)
+
+    return {
+        cosound_id: set().union(*(tags_by_sound[s] for s in sound_ids))
+        for cosound_id, sound_ids in sounds_by_cosound.items()
+    }
+
+
+def _apply(model, key_fields, counts):
+    """Add {key: [up, down]} onto `model`'s rows, creating missing ones."""
+    if not counts:
+        return
+    lookup = {
+        f"{field}__in": {key[i] for key in counts}
+        for i, field in enumerate(key_fields)
+    }
+    existing = {
+        tuple(getattr(row, field) for field in key_fields): row
+        for row in model.objects.filter(**lookup)
+    }
+    to_create, to_update = [], []
+    for key, (up, down) in counts.items():
+        row = existing.get(key)
+        if row is None:
+            to_create.append(
+                model(**dict(zip(key_fields, key)), upvotes=up, downvotes=down)
+            )
+        else:
+            row.upvotes += up
+            row.downvotes += down
+            to_update.append(row)
+    model.objects.bulk_create(to_create, batch_size=1000)
+    model.objects.bulk_update(to_update, ["upvotes", "downvotes"], batch_size=1000)
+
+
+def lock(name):
+    """Row-lock RollupWatermark `name` (created if missing) until commit."""
+    RollupWatermark.objects.get_or_create(name=name)
+    return RollupWatermark.objects.select_for_update().get(name=name)
+
+
+def _fold(votes):
+    """Add (player_id, cosound_id, voter_id, value, created_at) votes to the rollups."""
+    tags = cosound_tags({vote[1] for vote in votes})
+    player_counts = defaultdict(lambda: [0, 0])
+    tag_counts = defaultdict(lambda: [0, 0])
+    for player_id, cosound_id, voter_id, value, created_at in votes:
+        side = 0 if value > 0 else 1
+        player_counts[(player_id, cosound_id, _bucket(created_at))][side] += 1
+        for tag_id in tags.get(cosound_id, ()):
+            tag_counts[(voter_id, tag_id)][side] += 1
+
+    _apply(VoteRollup, ("player_id", "cosound_id", "bucket"), player_counts)
+    _apply(ListenerTagRollup, ("listener_id", "tag_id"), tag_counts)
+
+
+def _fold_archive(vote_archive):
+    """Fold an archive file's votes, skipping any whose player, cosound or
+    listener has since been deleted (their live votes cascade away too)."""
+    # Imported lazily: vote.archive imports this module.
+    from vote.archive import iter_archived_votes
+
+    votes = [
+        (v["player_id"], v["cosound_id"], v["voter_id"], v["value"], v["created_at"])
+        for v in iter_archived_votes(vote_archive)
+    ]
+    existing = [
+        set(
+            model.objects.filter(pk__in={vote[i] for vote in votes}).values_list(
+                "pk", flat=True
+            )
+        )
+        for i, model in enumerate((Player, Cosound, Listener))
+    ]
+    _fold(
+        [vote for vote in votes if all(vote[i] in ids for i, ids in enumerate(existing))]
+    )
+
+
+def roll_up_batch(batch_size=BATCH_SIZE, lag=ROLLUP_LAG):
+    """Fold the next batch of votes into the rollups; return how many."""
+    with transaction.atomic():
+        # Row lock: concurrent runs queue here instead of double counting.
+        watermark = lock(WATERMARK)
+        cutoff = timezone.now() - lag
+        votes = []
+        for vote in (
+            Vote.objects.filter(pk__gt=watermark.last_vote_id)
+            .order_by("pk")
+            .values_list(
+                "pk", "player_id", "cosound_id", "voter_id", "value", "created_at"
+            )[:batch_size]
+        ):
+            # created_at is set before the INSERT assigns the pk, so a lower
+            # pk can be the younger vote. Stop at the first one inside the
+            # lag rather than move the watermark past it.
+            if vote[-1] >= cutoff:
+                break
+            votes.append(vote)
+        if not votes:
+            return 0
+
+        _fold([vote[1:] for vote in votes])
+
+        watermark.last_vote_id = votes[-1][0]
+        watermark.save(update_fields=["last_vote_id", "updated_at"])
+        return len(votes)
+
+
+def roll_up_all(batch_size=BATCH_SIZE, lag=ROLLUP_LAG):
+    total = 0
+    while processed := roll_up_batch(batch_size, lag):
+        total += processed
+    return total
+
+
+def reset_rollups():
+    """Recount the rollups from the archived votes and rewind the watermark.
+
+    Archived votes are no longer in the Vote table, so replaying the files
+    here and then the table from pk 0 (roll_up_all) counts each vote once.
+    """
+    with transaction.atomic():
+        # Same order as archive_batch: no file is written while we replay.
+        lock(ARCHIVE_LOCK)
+        watermark = lock(WATERMARK)
+        VoteRollup.objects.all().delete()
+        ListenerTagRollup.objects.all().delete()
+        for vote_archive in VoteArchive.objects.order_by("first_vote_id"):
+            _fold_archive(vote_archive)
+        watermark.last_vote_id = 0
+        watermark.save(update_fields=["last_vote_id", "updated_at"])
+
+
+@task()
+def roll_up_votes():
+    return roll_up_all()
@@ -1,10 +1,28 @@
 import json
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from taggit.models import Tag
 
-from core.models import Listener, Manager, Player, Prediction, Sound, User
-from vote.models import Vote
+from core.testing import QueryBudgetTestCase, TempMediaMixin
+from core.models import Cosound, Listener, Manager, Player, Prediction, Sound, User
+from vote.archive import iter_archived_votes
+from vote.models import ListenerTagRollup, Vote, VoteArchive, VoteRollup
+from vote.rollups import roll_up_all
+from vote.utils import (
+    _last_vote_at,
+    claim_vote_slot,
+    get_throttle_seconds_left,
+    serialize_recent_votes,
+)
 
 
 class SubmitVoteTests(TestCase):
@@ -79,4 +97,398 @@ class SubmitVoteTests(TestCase):
         self.assert_vote_preserves_collection(choice="1", expected_value=1)
 
     def test_downvote_records_vote_without_changing_collection(self):
-        self.assert_vote_preserves_collection(choice="0", expected_value=0)
+        self.assert_vote_preserves_collection(
+            choice="0", expected_value=Vote.DOWNVOTE
+        )
+
+    def test_malformed_choice_is_rejected_without_using_the_slot(self):
+        self.assertEqual(self.submit_vote("up").status_code, 400)
+        self.assertEqual(self.submit_vote("-1").status_code, 400)
+        self.assertFalse(Vote.objects.exists())
+        self.assert_vote_preserves_collection(choice="1", expected_value=1)
+
+    def test_vote_references_the_players_stored_cosound(self):
+        self.player.update(self.player.playing)
+
+        with patch.object(Cosound, "get_or_create_from_layers") as resolve:
+            self.submit_vote("1")
+
+        resolve.assert_not_called()
+        self.assertEqual(Vote.objects.get().cosound_id, self.player.playing_cosound_id)
+
+    def test_vote_resolves_and_stores_a_missing_cosound(self):
+        self.submit_vote("1")
+
+        self.player.refresh_from_db()
+        self.assertEqual(Vote.objects.get().cosound_id, self.player.playing_cosound_id)
+        self.assertEqual(
+            self.player.playing_cosound.hashid,
+            Cosound.compute_hashid(self.player.playing.as_layers()),
+        )
+
+    def test_vote_inside_throttle_window_is_refused_without_recording(self):
+        self.submit_vote("1")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.submit_vote("1")
+
+        self.assertEqual(Vote.objects.count(), 1)
+        trigger = json.loads(response.headers["HX-Trigger"])
+        self.assertGreater(trigger["vote-throttled"]["seconds_left"], 0)
+        self.assertFalse(
+            any("vote_vote" in query["sql"] for query in queries.captured_queries)
+        )
+
+    def test_throttle_countdown_reads_the_last_vote_from_the_cache(self):
+        self.submit_vote("1")
+
+        with self.assertNumQueries(1):
+            seconds_left = get_throttle_seconds_left(self.listener)
+
+        self.assertGreater(seconds_left, 0)
+
+    def test_cold_cache_falls_back_to_the_vote_table(self):
+        self.submit_vote("1")
+        # Nothing reads the throttle first, as after a restart or a cull.
+        cache.clear()
+
+        response = self.submit_vote("1")
+
+        self.assertIn("vote-throttled", json.loads(response.headers["HX-Trigger"]))
+        self.assertEqual(Vote.objects.count(), 1)
+
+        cache.clear()
+        self.assertGreater(claim_vote_slot(self.listener.pk), 0)
+        cache.clear()
+        self.assertGreater(get_throttle_seconds_left(self.listener), 0)
+
+
+class VoteQueryPlanTests(TestCase):
+    """The vote hot paths stay index scans as the vote table grows.
+
+    Each test captures the SQL a hot path really runs and asks the database to
+    EXPLAIN it against a seeded table, so a query or index change that falls
+    back to scanning every vote fails here rather than at a busy venue.
+    """
+
+    PLAYERS = 20
+    LISTENERS = 50
+    VOTES_PER_PAIR = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        manager = Manager.objects.create(
+            user=User.objects.create_user(username="manager", email="m@example.com"),
+            name="Manager",
+        )
+        cls.players = Player.objects.bulk_create(
+            [
+                Player(manager=manager, name=f"Player {n}", token=f"token-{n}")
+                for n in range(cls.PLAYERS)
+            ]
+        )
+        users = User.objects.bulk_create(
+            [
+                User(username=f"voter-{n}", email=f"voter-{n}@example.com")
+                for n in range(cls.LISTENERS)
+            ]
+        )
+        cls.listeners = Listener.objects.bulk_create(
+            [Listener(user=user) for user in users]
+        )
+        cosound = Cosound.objects.create(hashid="plan", hashset="plan")
+        Vote.objects.bulk_create(
+            [
+                Vote(voter=listener, player=player, cosound=cosound, value=Vote.UPVOTE)
+                for player in cls.players
+                for listener in cls.listeners
+                for _ in range(cls.VOTES_PER_PAIR)
+            ],
+            batch_size=1000,
+        )
+        # Age the history so the recent-window queries have to skip it all.
+        Vote.objects.update(created_at=timezone.now() - timedelta(days=1))
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def plan(self, run):
+        """EXPLAIN output for every vote_vote query `run` executes."""
+        with CaptureQueriesContext(connection) as queries:
+            run()
+        prefix = "EXPLAIN " if connection.vendor == "postgresql" else "EXPLAIN QUERY PLAN "
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                if "vote_vote" not in query["sql"]:
+                    continue
+                cursor.execute(prefix + query["sql"])
+                plans.append("\n".join(str(row) for row in cursor.fetchall()))
+        self.assertTrue(plans, "no vote query was executed")
+        return plans
+
+    def assertUsesIndex(self, run, index_name):
+        plans = self.plan(run)
+        for plan in plans:
+            self.assertIn(index_name, plan)
+            # Only the vote_vote scan matters: joined tables such as
+            # core_player are tiny and the planner may well scan them.
+            self.assertNotRegex(
+                plan,
+                r"Seq Scan on vote_vote\b|SCAN (vote_vote|\"vote_vote\")\b(?! USING)",
+            )
+        return plans
+
+    def test_recent_votes_at_a_player_use_the_player_time_index(self):
+        (plan,) = self.assertUsesIndex(
+            lambda: Vote.recent(self.players[3], minutes=5),
+            "vote_player_created_idx",
+        )
+        # The voters come from a join in the same query, not one query each.
+        self.assertIn("core_listener", plan)
+
+    def test_recent_voter_feed_uses_the_player_time_index(self):
+        self.assertUsesIndex(
+            lambda: serialize_recent_votes(self.players[3]),
+            "vote_player_created_idx",
+        )
+
+    def test_last_vote_lookup_uses_the_voter_time_index(self):
+        self.assertUsesIndex(
+            lambda: _last_vote_at(self.listeners[7]),
+            "vote_voter_created_idx",
+        )
+
+
+class VoteRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        manager = Manager.objects.create(
+            user=User.objects.create_user(username="manager", email="m@example.com"),
+            name="Manager",
+        )
+        cls.player = Player.objects.create(manager=manager, name="Player")
+        cls.alice, cls.bob = (
+            Listener.objects.create(
+                user=User.objects.create_user(username=name, email=f"{name}@example.com")
+            )
+            for name in ("alice", "bob")
+        )
+        rain, storm = (
+            Sound.objects.create(
+                file=f"sounds/{title}.wav", title=title, embeddings=[0.0] * 5
+            )
+            for title in ("Rain", "Storm")
+        )
+        rain.tags.add("rain")
+        storm.tags.add("rain", "wind")
+        cls.rain_tag, cls.wind_tag = (Tag.objects.get(name=n) for n in ("rain", "wind"))
+        cls.mix = Cosound.get_or_create_from_layers([(rain.pk, 1.0), (storm.pk, 0.5)])
+        cls.solo = Cosound.get_or_create_from_layers([(rain.pk, 1.0)])
+        cls.hour = timezone.now().replace(
+            minute=0, second=0, microsecond=0
+        ) - timedelta(hours=4)
+
+    def vote(self, voter, cosound, value, minutes=5):
+        vote = Vote.objects.create(
+            voter=voter, player=self.player, cosound=cosound, value=value
+        )
+        Vote.objects.filter(pk=vote.pk).update(
+            created_at=self.hour + timedelta(minutes=minutes)
+        )
+        return vote
+
+    def test_rollups_accumulate_across_runs(self):
+        self.vote(self.alice, self.mix, Vote.UPVOTE)
+        self.vote(self.bob, self.mix, Vote.DOWNVOTE, minutes=70)
+        self.assertEqual(roll_up_all(), 2)
+
+        self.vote(self.alice, self.mix, Vote.UPVOTE, minutes=10)
+        self.vote(self.alice, self.solo, Vote.DOWNVOTE, minutes=20)
+        self.assertEqual(roll_up_all(), 2)
+        self.assertEqual(roll_up_all(), 0)
+
+        self.assertEqual(
+            set(
+                VoteRollup.objects.values_list(
+                    "cosound_id", "bucket", "upvotes", "downvotes"
+                )
+            ),
+            {
+                (self.mix.pk, self.hour, 2, 0),
+                (self.mix.pk, self.hour + timedelta(hours=1), 0, 1),
+                (self.solo.pk, self.hour, 0, 1),
+            },
+        )
+        self.assertEqual(
+            VoteRollup.totals(self.player, since=self.hour),
+            {self.mix.pk: (2, 1), self.solo.pk: (0, 1)},
+        )
+        # Two "rain" sounds in one cosound still count the vote once.
+        self.assertEqual(
+            ListenerTagRollup.scores([self.alice.pk, self.bob.pk]),
+            {
+                self.alice.pk: {self.rain_tag.pk: 1, self.wind_tag.pk: 2},
+                self.bob.pk: {self.rain_tag.pk: -1, self.wind_tag.pk: -1},
+            },
+        )
+
+    def test_votes_inside_the_lag_wait_for_the_next_run(self):
+        Vote.objects.create(
+            voter=self.alice, player=self.player, cosound=self.mix, value=Vote.UPVOTE
+        )
+
+        self.assertEqual(roll_up_all(), 0)
+        self.assertEqual(roll_up_all(lag=timedelta(0)), 1)
+
+    def test_a_younger_lower_pk_vote_holds_the_watermark(self):
+        # Its created_at is later than the next pk's, as when two requests
+        # race between timezone.now() and the INSERT.
+        young = Vote.objects.create(
+            voter=self.alice, player=self.player, cosound=self.mix, value=Vote.UPVOTE
+        )
+        self.vote(self.bob, self.solo, Vote.DOWNVOTE)
+
+        self.assertEqual(roll_up_all(), 0)
+        Vote.objects.filter(pk=young.pk).update(created_at=self.hour)
+        self.assertEqual(roll_up_all(), 2)
+        self.assertEqual(
+            VoteRollup.totals(self.player, since=self.hour),
+            {self.mix.pk: (1, 0), self.solo.pk: (0, 1)},
+        )
+
+    def test_rebuild_command_matches_incremental_rollups(self):
+        for minutes in range(0, 180, 15):
+            self.vote(self.alice, self.mix, Vote.UPVOTE, minutes=minutes)
+            self.vote(self.bob, self.solo, Vote.DOWNVOTE, minutes=minutes)
+        roll_up_all(batch_size=5)
+        incremental = list(
+            VoteRollup.objects.order_by("bucket", "cosound").values_list(
+                "cosound_id", "bucket", "upvotes", "downvotes"
+            )
+        )
+
+        call_command("rollup_votes", "--rebuild", stdout=StringIO())
+
+        self.assertEqual(
+            list(
+                VoteRollup.objects.order_by("bucket", "cosound").values_list(
+                    "cosound_id", "bucket", "upvotes", "downvotes"
+                )
+            ),
+            incremental,
+        )
+        self.assertEqual(
+            ListenerTagRollup.objects.get(listener=self.bob, tag=self.rain_tag).downvotes,
+            12,
+        )
+
+
+class VoteArchiveTests(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        manager = Manager.objects.create(
+            user=User.objects.create_user(username="manager", email="m@example.com"),
+            name="Manager",
+        )
+        cls.player = Player.objects.create(manager=manager, name="Player")
+        cls.listener = Listener.objects.create(
+            user=User.objects.create_user(username="alice", email="a@example.com")
+        )
+        cls.cosound = Cosound.objects.create(hashset="hashset", hashid="hashid")
+
+    def vote(self, days_ago, value=Vote.UPVOTE):
+        vote = Vote.objects.create(
+            voter=self.listener,
+            player=self.player,
+            cosound=self.cosound,
+            value=value,
+            section="archive-test",
+        )
+        Vote.objects.filter(pk=vote.pk).update(
+            created_at=timezone.now() - timedelta(days=days_ago)
+        )
+        return vote
+
+    @override_settings(VOTE_RETENTION_DAYS=30)
+    def test_expired_rolled_up_votes_move_to_archive_files(self):
+        old = [self.vote(40), self.vote(40, Vote.DOWNVOTE), self.vote(35)]
+        recent = self.vote(1)
+        roll_up_all()
+        not_rolled_up = self.vote(50)
+
+        call_command("archive_votes", "--batch-size", "2", stdout=StringIO())
+
+        self.assertEqual(
+            set(Vote.objects.values_list("pk", flat=True)),
+            {recent.pk, not_rolled_up.pk},
+        )
+        archives = list(VoteArchive.objects.all())
+        self.assertEqual([a.vote_count for a in archives], [2, 1])
+        archived = [vote for a in archives for vote in iter_archived_votes(a)]
+        self.assertEqual([vote["id"] for vote in archived], [v.pk for v in old])
+        self.assertEqual(archived[1]["value"], Vote.DOWNVOTE)
+        self.assertEqual(archived[0]["section"], "archive-test")
+        # The rollups still count the archived votes.
+        self.assertEqual(
+            VoteRollup.totals(self.player, since=timezone.now() - timedelta(days=60)),
+            {self.cosound.pk: (3, 1)},
+        )
+
+    @override_settings(VOTE_RETENTION_DAYS=30)
+    def test_rebuild_replays_archived_votes(self):
+        self.vote(40)
+        self.vote(40, Vote.DOWNVOTE)
+        self.vote(1)
+        roll_up_all()
+        call_command("archive_votes", stdout=StringIO())
+        since = timezone.now() - timedelta(days=60)
+
+        call_command("rollup_votes", "--rebuild", stdout=StringIO())
+
+        self.assertEqual(Vote.objects.count(), 1)
+        self.assertEqual(
+            VoteRollup.totals(self.player, since=since), {self.cosound.pk: (2, 1)}
+        )
+        # Archiving again after the rebuild doesn't lose or repeat anything.
+        call_command("archive_votes", stdout=StringIO())
+        call_command("rollup_votes", "--rebuild", stdout=StringIO())
+        self.assertEqual(
+            VoteRollup.totals(self.player, since=since), {self.cosound.pk: (2, 1)}
+        )
+
+    def test_dry_run_leaves_votes_in_place(self):
+        self.vote(400)
+        roll_up_all()
+        out = StringIO()
+
+        call_command("archive_votes", "--dry-run", stdout=out)
+
+        self.assertIn("Would archive 1 votes", out.getvalue())
+        self.assertEqual(Vote.objects.count(), 1)
+        self.assertFalse(VoteArchive.objects.exists())
+
+
+class VoteQueryBudgetTests(QueryBudgetTestCase):
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def vote_params(self):
+        return {"player": self.player.token, "choice": "1", "section": "bar"}
+
+    def test_voter_index(self):
+        self.assertQueryBudget(
+            2, "get", reverse("vote:vote"), self.vote_params(), htmx=False
+        )
+
+    def test_vote_initial(self):
+        self.assertQueryBudget(
+            12, "get", reverse("vote:vote_initial"), self.vote_params()
+        )
+
+    def test_submit_vote(self):
+        self.assertQueryBudget(
+            17,
+            "post",
+            reverse("vote:submit_vote"),
+            query_params=self.vote_params(),
+        )
@@ -2,10 +2,12 @@ import math
 from datetime import timedelta
 
 from django.conf import settings
-from django.db.models import Max
+from django.core.cache import cache
 from django.utils import timezone
 
 from core.models import Listener, Player, Sound
+from core.renditions import CARD_WIDTH
+from login.guests import has_account
 
 VOTE_THROTTLE_WINDOW = timedelta(seconds=getattr(settings, "VOTE_THROTTLE_SECONDS", 60))
 
@@ -24,7 +26,7 @@ def build_vote_context(request):
     layers = serialize_player_for_carousel(player, request.user, choice) if player else []
 
     throttle_seconds_left = 0
-    if request.user.is_authenticated:
+    if has_account(request.user):
         listener = Listener.objects.filter(user=request.user).first()
         if listener:
             throttle_seconds_left = get_throttle_seconds_left(listener)
@@ -49,7 +51,8 @@ def serialize_player_for_carousel(player, user=None, choice=None):
             "sound_gain": None,
             "sound_title": player.name,
             "sound_artist": player.manager.name if player.manager else "",
-            "artwork_url": player.photo.url if player.photo else "",
+            "artwork_url": player.image_url("photo", CARD_WIDTH),
+            "artwork_avif_url": player.image_url("photo", CARD_WIDTH, "avif", False),
             "bio": player.bio or "",
             "gain": None,
             "flavor": "",
@@ -64,11 +67,13 @@ def serialize_player_for_carousel(player, user=None, choice=None):
     sound_ids = [l.sound_id for l in layer_objs]
     sounds = {
         s.pk: s
-        for s in Sound.objects.filter(pk__in=sound_ids).prefetch_related("tags")
+        for s in Sound.objects.filter(pk__in=sound_ids)
+        .select_related("artist")
+        .prefetch_related("tags")
     }
 
     saved_ids = set()
-    if user is not None and user.is_authenticated:
+    if has_account(user):
         listener = Listener.objects.filter(user=user).first()
         if listener is not None:
             saved_ids = set(
@@ -90,10 +95,11 @@ def serialize_player_for_carousel(player, user=None, choice=None):
             {
                 "kind": "layer",
                 **sound.asLayer(with_gain=l.sound_gain),
-                "artwork_url": sound.art.url if sound.art else "",
+                "artwork_url": sound.image_url("art", CARD_WIDTH),
+                "artwork_avif_url": sound.image_url("art", CARD_WIDTH, "avif", False),
                 "gain": int(round(l.sound_gain * 100)),
                 "flavor": sound.flavor or "",
-                "tags": " / ".join(sound.tags.names()) or "Unknown",
+                "tags": " / ".join(sound.tag_names) or "Unknown",
                 "bio": "",
                 "location": "",
                 "player_name": player.name,
@@ -103,15 +109,47 @@ def serialize_player_for_carousel(player, user=None, choice=None):
     return items
 
 
+def get_vote_player(token):
+    """The player a vote is cast at, loading only what recording a vote needs."""
+    if not token:
+        return None
+    return Player.objects.only("pk", "playing", "playing_cosound").filter(token=token).first()
+
+
 def get_throttle_seconds_left(listener, window: timedelta = VOTE_THROTTLE_WINDOW):
     """Seconds remaining before this listener can vote again (0 if not throttled)."""
-    last_vote_at = _last_vote_at(listener)
+    now = timezone.now()
+    last_vote_at = cache.get(_throttle_key(listener.pk))
     if last_vote_at is None:
-        return 0
+        # Cold cache (first visit, or the cache was cleared): ask the vote table
+        # once and warm the cache with the answer.
+        last_vote_at = _last_vote_at(listener)
+        if last_vote_at is not None:
+            _remember_vote_at(listener.pk, last_vote_at, window, now)
+    return _seconds_left(last_vote_at, window, now)
+
+
+def claim_vote_slot(listener_id, window: timedelta = VOTE_THROTTLE_WINDOW):
+    """Reserve the listener's next vote, or say how long until they can cast it.
+
+    Returns 0 once the vote is claimed; the caller then records it. Two taps
+    racing on different workers can't both win, because the claim is a single
+    atomic cache write rather than a read of the vote table.
+    """
     now = timezone.now()
-    if now - last_vote_at >= window:
+    if cache.get(_throttle_key(listener_id)) is None:
+        # A missing entry isn't a missing vote: the cache may be cold, or have
+        # culled it. Put back what the vote table knows before claiming, so a
+        # vote inside the window still refuses this one.
+        last_vote_at = _last_vote_at(listener_id)
+        if last_vote_at is not None:
+            _remember_vote_at(listener_id, last_vote_at, window, now)
+    if _remember_vote_at(listener_id, now, window, now):
         return 0
-    return math.ceil((last_vote_at + window - now).total_seconds())
+    last_vote_at = cache.get(_throttle_key(listener_id))
+    # The entry can expire between the failed claim and this read; the listener
+    # is still refused this time, so never report 0.
+    return max(_seconds_left(last_vote_at, window, now), 1)
 
 
 def serialize_recent_votes(player, limit=10):
@@ -142,8 +180,37 @@ def serialize_recent_votes(player, limit=10):
     return out
 
 
+def _throttle_key(listener_id):
+    return f"vote:last_vote_at:{listener_id}"
+
+
+def _seconds_left(last_vote_at, window, now):
+    if last_vote_at is None or now - last_vote_at >= window:
+        return 0
+    return math.ceil((last_vote_at + window - now).total_seconds())
+
+
+def _remember_vote_at(listener_id, voted_at, window, now):
+    """Cache `voted_at` as the listener's last vote unless a newer one is held.
+
+    Each entry expires when the throttle window it opened closes, so any entry
+    still present is a vote inside the window and newer than `voted_at` could
+    usefully replace. That makes cache.add — which only writes an absent or
+    expired key — an atomic set-if-newer across workers.
+    """
+    timeout = math.ceil((voted_at + window - now).total_seconds())
+    if timeout <= 0:
+        return False
+    return cache.add(_throttle_key(listener_id), voted_at, timeout=timeout)
+
+
 def _last_vote_at(listener):
     # Imported lazily to avoid a circular import (vote.models -> vote.utils).
     from vote.models import Vote
 
-    return Vote.objects.filter(voter=listener).aggregate(last=Max("created_at"))["last"]
+    return (
+        Vote.objects.filter(voter=listener)
+        .order_by("-created_at")
+        .values_list("created_at", flat=True)
+        .first()
+    )
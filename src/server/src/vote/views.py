@@ -1,12 +1,19 @@
 import json
 
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseBadRequest
 from django.shortcuts import render
 
-from core.models import Cosound, Listener
+from config.metrics import registry
+from core.models import Listener
 from core.utils import add_card
+from login.guests import materialize
 from vote.models import Vote
-from vote.utils import build_vote_context, get_throttle_seconds_left, serialize_recent_votes
+from vote.utils import (
+    build_vote_context,
+    claim_vote_slot,
+    get_vote_player,
+    serialize_recent_votes,
+)
 
 
 def voter_index(request):
@@ -23,9 +30,9 @@ def submit_vote(request):
     if not request.htmx:
         return HttpResponse("Request Denied.")
 
-    context = build_vote_context(request)
-    player = context["player"]
-    choice = context["choice"]
+    # Only what recording a vote needs: no carousel, no throttle aggregate.
+    player = get_vote_player(request.GET.get("player"))
+    choice = request.GET.get("choice")
 
     if player is None or choice is None:
         response = HttpResponse("")
@@ -45,24 +52,30 @@ def submit_vote(request):
         response["HX-Trigger"] = "auth-required"
         return response
 
-    listener, _ = Listener.objects.get_or_create(user=request.user)
-    seconds_left = get_throttle_seconds_left(listener)
+    # Before claiming: a malformed vote mustn't use up the listener's slot.
+    try:
+        value = int(choice)
+    except ValueError:
+        value = None
+    if value not in (Vote.UPVOTE, Vote.DOWNVOTE):
+        return HttpResponseBadRequest("Invalid choice.")
+
+    listener, _ = Listener.objects.get_or_create(user=materialize(request))
+    seconds_left = claim_vote_slot(listener.pk)
     if seconds_left > 0:
+        registry.inc("cosound_vote_throttled_total")
         response = HttpResponse("")
         response["HX-Trigger"] = json.dumps(
             {"vote-throttled": {"seconds_left": seconds_left}}
         )
         return response
 
-    layers = [(layer.sound_id, layer.sound_gain) for layer in player.playing.layers]
-    cosound = Cosound.get_or_create_from_layers(layers)
-    value = int(choice)
     Vote.objects.create(
         voter=listener,
         player=player,
-        cosound=cosound,
+        cosound_id=player.playing_cosound_pk(),
         value=value,
-        section=context.get("section") or "",
+        section=request.GET.get("section") or "",
     )
 
     response = HttpResponse("")
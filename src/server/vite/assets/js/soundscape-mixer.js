@@ -114,8 +114,33 @@ export function timingForBuffers(durationA, durationB, {
     };
 }
 
+let opusSupport;
+
+function browserDecodesOpus() {
+    if (opusSupport === undefined) {
+        opusSupport = typeof Audio !== "undefined"
+            && new Audio().canPlayType('audio/ogg; codecs="opus"') !== "";
+    }
+    return opusSupport;
+}
+
+/**
+ * The Opus stream the server transcoded a layer's upload to, or undefined
+ * where there is none or the browser cannot decode Ogg Opus. Behind a data
+ * saver it is the smallest stream; otherwise the largest, which is still a
+ * fraction of the upload. `sound_streams` is ordered smallest first.
+ */
+export function streamUrl(
+    layer,
+    { opus = browserDecodesOpus(), saveData = globalThis.navigator?.connection?.saveData } = {},
+) {
+    const streams = Object.values(layer.sound_streams ?? {});
+    if (!opus || streams.length === 0) return undefined;
+    return saveData ? streams[0] : streams[streams.length - 1];
+}
+
 function normalizeLayer(layer, index) {
-    const fallbackUrl = layer.sound_file ?? layer.url ?? "";
+    const fallbackUrl = streamUrl(layer) ?? layer.sound_file ?? layer.url ?? "";
     return {
         id: layer.sound_id ?? layer.id ?? index,
         urlA: layer.urlA ?? layer.sound_file_a ?? fallbackUrl,
@@ -378,6 +403,48 @@ export function peaksFromBuffer(buffer, buckets = DEFAULT_PEAK_BUCKETS) {
     return { min, max, peak, length };
 }
 
+// The envelope the server precomputes for each sound (core/waveforms.py), so a
+// waveform can be drawn from a few kilobytes instead of the whole file. The
+// same buckets at a few resolutions, finest first, as int8 fractions of `peak`.
+const PEAKS_FILE_MAGIC = "CSPK";
+const PEAKS_FILE_VERSION = 1;
+const PEAKS_FILE_HEADER = 12;
+
+/**
+ * The envelope from a peaks file, in the shape peaksFromBuffer returns. Takes
+ * the coarsest level that still has `buckets` columns, or the finest when none
+ * does — the renderer folds it down either way.
+ *
+ * @param   {ArrayBuffer} data
+ * @param   {number}      [buckets]
+ * @returns {{min: Float32Array, max: Float32Array, peak: number, length: number}}
+ */
+export function peaksFromFile(data, buckets = DEFAULT_PEAK_BUCKETS) {
+    const view = new DataView(data);
+    const magic = String.fromCharCode(...new Uint8Array(data, 0, Math.min(4, data.byteLength)));
+    if (magic !== PEAKS_FILE_MAGIC || view.getUint8(4) !== PEAKS_FILE_VERSION) {
+        throw new Error("Not a peaks file this page can read.");
+    }
+    const levels = view.getUint8(5);
+    const peak = view.getFloat32(8, true);
+    let offset = PEAKS_FILE_HEADER + 4 * levels;
+    let chosen = null;
+    for (let level = 0; level < levels; level += 1) {
+        const length = view.getUint32(PEAKS_FILE_HEADER + 4 * level, true);
+        if (chosen === null || length >= buckets) chosen = { length, offset };
+        offset += 2 * length;
+    }
+    if (chosen === null || offset > data.byteLength) {
+        throw new Error("This peaks file is cut short.");
+    }
+
+    const { length } = chosen;
+    const scale = peak / 127;
+    const min = Float32Array.from(new Int8Array(data, chosen.offset, length), (q) => q * scale);
+    const max = Float32Array.from(new Int8Array(data, chosen.offset + length, length), (q) => q * scale);
+    return { min, max, peak, length };
+}
+
 // ---------------------------------------------------------------------------
 // Loop crossfade curves.
 //
@@ -7,7 +7,9 @@ import {
     gainFromSlider,
     loudnessGainDb,
     measureLoudness,
+    peaksFromFile,
     roundToEighth,
+    streamUrl,
     timingForBuffers,
 } from "./soundscape-mixer.js";
 
@@ -131,6 +133,60 @@ test("rounds decoded durations to eighths of a second", () => {
     assert.equal(roundToEighth(24), 24);
 });
 
+test("a transcoded layer streams Opus where the browser decodes it", () => {
+    const layer = {
+        sound_file: "/media/sounds/rain.wav",
+        sound_streams: {
+            "opus-64": "/media/variants/sounds/rain-opus-64.ogg",
+            "opus-128": "/media/variants/sounds/rain-opus-128.ogg",
+        },
+    };
+    assert.equal(streamUrl(layer, { opus: true }), layer.sound_streams["opus-128"]);
+    assert.equal(
+        streamUrl(layer, { opus: true, saveData: true }),
+        layer.sound_streams["opus-64"],
+    );
+    assert.equal(streamUrl(layer, { opus: false }), undefined);
+    // Not transcoded yet: the upload plays instead.
+    assert.equal(streamUrl({ ...layer, sound_streams: {} }, { opus: true }), undefined);
+});
+
+// A peaks file as core/waveforms.py writes it: header, level counts, then each
+// level's minimums and maximums.
+function peaksFile(peak, levels) {
+    const size = 12 + 4 * levels.length + levels.reduce((sum, [mins]) => sum + 2 * mins.length, 0);
+    const data = new ArrayBuffer(size);
+    const view = new DataView(data);
+    [..."CSPK"].forEach((c, i) => view.setUint8(i, c.charCodeAt(0)));
+    view.setUint8(4, 1);
+    view.setUint8(5, levels.length);
+    view.setFloat32(8, peak, true);
+    let offset = 12 + 4 * levels.length;
+    levels.forEach(([mins, maxs], level) => {
+        view.setUint32(12 + 4 * level, mins.length, true);
+        for (const q of [...mins, ...maxs]) view.setInt8(offset++, q);
+    });
+    return data;
+}
+
+test("reads the precomputed peaks at the coarsest level that is fine enough", () => {
+    const data = peaksFile(0.5, [
+        [[-127, -64, 0, -1], [127, 64, 0, 1]],
+        [[-127, -1], [127, 64]],
+    ]);
+
+    const coarse = peaksFromFile(data, 2);
+    assert.equal(coarse.length, 2);
+    assert.equal(coarse.peak, 0.5);
+    assert.deepEqual([...coarse.min], [-0.5, Math.fround(-0.5 / 127)]);
+    assert.deepEqual([...coarse.max], [0.5, Math.fround(64 * 0.5 / 127)]);
+
+    assert.equal(peaksFromFile(data, 3).length, 4);
+    // More columns than any level has: the finest, for the renderer to stretch.
+    assert.equal(peaksFromFile(data, 2048).length, 4);
+    assert.throws(() => peaksFromFile(new ArrayBuffer(16)), /peaks file/);
+});
+
 test("computes the myNoise-style A/B period and offset", () => {
     const timing = timingForBuffers(23.619, 60, {
         stretch: 1.75,
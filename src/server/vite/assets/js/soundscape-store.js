@@ -496,6 +496,11 @@ export function createSoundLayersStore(rawLayers, {
                 duration: 0,
                 loudness: null,
                 loudness_gain_db: 0,
+                // The server's transcodes and peaks are of the old file. A
+                // source that brings none (a local file) plays its own
+                // sound_file and has its waveform read from it.
+                sound_streams: source.sound_streams ?? {},
+                sound_peaks_url: source.sound_peaks_url ?? "",
             });
             this.loadError = "";
             try {
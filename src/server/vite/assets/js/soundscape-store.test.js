@@ -281,6 +281,24 @@ test("a new file clears the crop the old one was cut to", async () => {
     assert.equal(store.layers[0].trim_end, 12);
 });
 
+test("a new file does not keep streaming the old one's transcodes", async () => {
+    const store = await startedStore([
+        soundLayer({
+            sound_streams: { "opus-128": "/media/variants/sounds/rain-opus-128.ogg" },
+            sound_peaks_url: "/media/variants/sounds/rain-peaks.bin",
+        }),
+    ]);
+
+    await store.setLayerSource(0, {
+        sound_file: "blob:local-wind",
+        sound_title: "Wind",
+        is_local: true,
+    });
+
+    assert.deepEqual(store.layers[0].sound_streams, {});
+    assert.equal(store.layers[0].sound_peaks_url, "");
+});
+
 test("loudness matching reads the layer and reports its make-up gain", async () => {
     const store = await startedStore([soundLayer()]);
     assert.equal(store.layers[0].loudness_target, null, "off until asked for");
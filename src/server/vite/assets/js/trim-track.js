@@ -2,6 +2,7 @@ import {
     DEFAULT_PEAK_BUCKETS,
     MIN_REGION_SECONDS,
     peaksFromBuffer,
+    peaksFromFile,
 } from "./soundscape-mixer.js";
 
 /**
@@ -13,7 +14,7 @@ import {
  * and a sweep are one widget, not markup a template should have to keep in step:
  *
  *   <div x-data="trimTrack()"
- *        x-effect="load({ src, duration, start, end, index, gainDb })"
+ *        x-effect="load({ src, peaks, duration, start, end, index, gainDb })"
  *        @trim-commit="retime($event.detail)"></div>
  *
  * `load` is the whole input and `trim-commit` the whole output. Driving it from
@@ -33,12 +34,17 @@ import {
  *
  * ## Where the waveform comes from
  *
- * No library. The envelope is min/max over the decoded samples, which is what
- * `peaksFromBuffer` in the engine does, and the engine is also where the decoded
- * buffers already are: `cosoundMixer.peaksFor(url)` reads the buffer the layer
- * is playing out of the same cache the voice loaded it from, so drawing a layer
- * costs neither a fetch nor a decode. Only a src the engine has never seen falls
- * back to fetching and decoding here.
+ * No library. The envelope is min/max over the samples, and the server works it
+ * out once per sound when it transcodes the upload: `peaks` is the URL of that
+ * file (a layer's `sound_peaks_url`), a few kilobytes that `peaksFromFile` reads
+ * in place of downloading and decoding the whole upload. The mixer streams a
+ * compressed copy, not the upload the crop is measured against, so its cache
+ * rarely holds this src anyway.
+ *
+ * A sound the server has not got to yet has no `peaks`, and a peaks file that
+ * fails to load is skipped. Then `peaksFromBuffer` does the same sums here:
+ * `cosoundMixer.peaksFor(url)` decodes through the engine's cache, and only a
+ * page without the engine fetches and decodes on its own.
  *
  * ## The playheads
  *
@@ -139,7 +145,20 @@ async function decodeStandalone(url) {
     return fallbackContext.decodeAudioData(await response.arrayBuffer());
 }
 
-async function peaksForSource(src, buckets) {
+async function peaksFromUrl(url, buckets) {
+    const response = await fetch(url, { credentials: "same-origin" });
+    if (!response.ok) throw new Error(`Could not load ${url} (${response.status}).`);
+    return peaksFromFile(await response.arrayBuffer(), buckets);
+}
+
+async function peaksForSource(src, buckets, peaksUrl) {
+    if (peaksUrl) {
+        try {
+            return await peaksFromUrl(peaksUrl, buckets);
+        } catch {
+            // Fall back to working it out from the audio itself.
+        }
+    }
     const engine = globalThis.cosoundMixer;
     if (typeof engine?.peaksFor === "function") return engine.peaksFor(src, buckets);
     return peaksFromBuffer(await decodeStandalone(src), buckets);
@@ -148,6 +167,7 @@ async function peaksForSource(src, buckets) {
 export function trimTrack({ buckets = DEFAULT_PEAK_BUCKETS } = {}) {
     // Everything the panel knows, kept out of Alpine's reactivity on purpose.
     let src = "";
+    let peaksUrl = "";
     let duration = 0;
     let start = 0;
     let end = 0;
@@ -331,7 +351,7 @@ export function trimTrack({ buckets = DEFAULT_PEAK_BUCKETS } = {}) {
         const token = (request += 1);
         if (!src) return;
         try {
-            const result = await peaksForSource(src, buckets);
+            const result = await peaksForSource(src, buckets, peaksUrl);
             // A tab switched during the fetch already asked for something else;
             // that request owns the panel now.
             if (token !== request) return;
@@ -418,6 +438,7 @@ export function trimTrack({ buckets = DEFAULT_PEAK_BUCKETS } = {}) {
             const changed = nextSrc !== src || !loaded;
             loaded = true;
             src = nextSrc;
+            peaksUrl = String(next.peaks || "");
             duration = Math.max(0, Number(next.duration) || 0);
             voiceIndex = Number.isInteger(next.index) ? next.index : null;
             // The make-up gain is a vertical scale, so a new one is a redraw and